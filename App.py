@@ -1,14 +1,18 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, time, date, timedelta
-import requests
-import uuid
-import holidays
-from streamlit_calendar import calendar
-import extra_streamlit_components as stx
 import time as tm
+import os
+import functools
+
+import core
+from core import (DATE_FMT, TIME_FMT, STATUS_PENDING, STATUS_APPROVED, STATUS_REJECTED, STATUS_ACTIVE,
+                  STATUS_EDIT_PENDING, STATUS_CANCELLED, WEEKDAYS_HE, HEATMAP_DAYS, RECUR_DATES, RECUR_RANGE,
+                  RECUR_WEEKLY, MAX_OCCURRENCES, EXPORT_STATUSES, send_telegram, login_user, register_user, update_status_safe,
+                  update_user_details_admin, delete_user_fully_admin, add_booking, add_bookings_batch,
+                  find_free_slots, expand_recurrence, to_minutes, from_minutes, edit_existing_booking,
+                  request_edit_booking, approve_edit_request, set_booking_status, get_stats_data,
+                  get_utilization_heatmap, get_calendar_events, export_sheet, get_resources, resource_label,
+                  with_resource)
 
 # --- פונקציה לטעינת ה-CSS ---
 def load_css(file_name):
@@ -17,501 +21,130 @@ def load_css(file_name):
             st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
     except: pass
 
-# --- הגדרות ---
-SHEET_ID = '1Uf_bLdIKz8aJAc1BV1OZvQwNP5Rzn4LqnQSuhL9htjg' 
-DATE_FMT = '%Y-%m-%d'
-TIME_FMT = '%H:%M'
-STATUS_PENDING = "pending"
-STATUS_APPROVED = "approved"
-STATUS_REJECTED = "rejected"
-STATUS_ACTIVE = "active"
-STATUS_EDIT_PENDING = "pending_edit"
-
-# @st.cache_resource
-def get_cookie_manager():
-    return stx.CookieManager(key="auth_cookie_v4")
-
-cookie_manager = get_cookie_manager()
+# --- חיבור הליבה לסודות של Streamlit ---
+core.configure(secrets=st.secrets)
+
+# --- בחירת בניין: לפי ?b= בכתובת, או לפי מה שנבחר במסך הכניסה ---
+tenants = core.get_tenants()
+tenant_slug = st.query_params.get("b") or st.session_state.get('tenant')
+if tenant_slug not in tenants: tenant_slug = next(iter(tenants))
+st.session_state.tenant = tenant_slug
+core.use_tenant(tenant_slug) # כל הקריאות לליבה בריצה הזו הולכות לגיליון ולמטמון של הבניין
+tenant = core.get_tenant()
+
+# משתמש מחובר שייך לבניין שבו התחבר - מעבר בניין מנתק אותו
+if st.session_state.get('user') and st.session_state.get('user_tenant', tenant_slug) != tenant_slug:
+    st.session_state.user = None
+if not st.session_state.get('user'):
+    st.session_state.user_tenant = tenant_slug
+
+# --- מצב פרופיילינג (אדמין בלבד): ?profile=1 בכתובת או general.profile בסודות ---
+# הסקריפט כולו מורץ שוב בתוך cProfile, והתוצאה נשמרת לקובץ - ראו לשונית "ביצועים" בניהול מתקדם.
+# בריצה הראשונה אחרי טעינת הדף המשתמש עוד לא שוחזר, ולכן ההרשאה נבדקת מול הטוקן החתום שבעוגייה
+# שהדפדפן שלח (st.context.cookies - בלי לצייר את רכיב העוגיות פעמיים). מבקר בלי טוקן תקין של מנהל
+# לא מורץ תחת הפרופיילר בכלל. בסוף הריצה נבדק שוב המשתמש אחרי שחזור ההתחברות, לפני השמירה
+def can_profile(u):
+    return (u or {}).get('Role') in ['admin', 'committee']
+
+def profile_user():
+    if st.session_state.get('user'): return st.session_state.user
+    payload = core.verify_token(st.context.cookies.get(core.session_cookie_name()))
+    return core.user_from_token(payload) if payload else None
+
+if not core.profiling_active() and core.profiling_requested(st.query_params, can_profile(profile_user())):
+    if core.run_profiled(__file__, globals(), keep=lambda: can_profile(st.session_state.get('user'))):
+        st.stop()
 
-# --- אבטחה (השוואת טקסט רגיל) ---
-def verify_password(input_pass, stored_pass):
-    # הפיכה לסטרינג מונעת את השגיאה שקיבלת (AttributeError על encode)
-    return str(input_pass).strip() == str(stored_pass).strip()
+# --- שרת פיד ה-iCalendar (פעם אחת לתהליך, ברקע) ---
+@st.cache_resource
+def start_feed_server():
+    return core.start_feed_server()
 
-# --- חיבור לגוגל שיטס ---
+# --- תזכורות טלגרם לפני שיריון (ת'רד אחד לתהליך, סריקה אחת לכל בניין) ---
 @st.cache_resource
-def get_gspread_client():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    try:
-        if "gcp_service_account" in st.secrets:
-            creds_dict = dict(st.secrets["gcp_service_account"])
-            # הזרקת התיקון: מבטיח שהמפתח הפרטי יפורמט נכון ב-Streamlit Cloud
-            if "private_key" in creds_dict:
-                creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        else:
-            creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"שגיאה בחיבור לגוגל: {e}")
-        st.stop()
+def start_reminders(slug):
+    return core.start_reminders(slug)
 
+start_reminders(tenant_slug)
+
+if core.feeds_enabled(): # בלי כתובת ציבורית ומפתח קבוע אין שרת ואין קישורים
+    start_feed_server()
 
-# --- פונקציה לשליחת הודעות לטלגרם ---
-def send_telegram(message):
-    try:
-        # בדיקה שהמפתחות קיימים ב-Secrets של Streamlit
-        if "general" in st.secrets:
-            token = st.secrets["general"]["telegram_token"]
-            chat_id = st.secrets["general"]["telegram_chat_id"]
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            # שליחה עם Timeout כדי שהאפליקציה לא תיתקע אם אין אינטרנט
-            requests.post(url, json={"chat_id": chat_id, "text": message}, timeout=5)
-    except Exception: 
-        pass # מונע קריסה של כל האפליקציה אם יש תקלה בטלגרם
-
-def get_worksheet(name):
-    client = get_gspread_client()
-    sh = client.open_by_key(SHEET_ID)
-    return sh.worksheet(name)
-
-
-@st.cache_data(ttl=300) # TTL=300 אומר שגוגל ייקרא רק פעם ב-5 דקות
 def get_data(sheet_name):
-    try:
-        ws = get_worksheet(sheet_name)
-        # שימוש ב-values כדי להתגבר על בעיות כותרות/הקפאה
-        all_values = ws.get_all_values()
-        if not all_values: return pd.DataFrame()
-        
-        # ניקוי רווחים מהכותרות בשורה הראשונה
-        headers = [str(h).strip() for h in all_values[0]]
-        df = pd.DataFrame(all_values[1:], columns=headers)
-        return df
-    except Exception as e:
-        # אם יש חסימה מגוגל, האפליקציה לא תקרוס אלא תציג שגיאה ידידותית
+    # עטיפה לליבה - מציגה הודעה ידידותית אם גוגל חסם/לא זמין
+    df = core.get_data(sheet_name)
+    if core.fetch_failed(sheet_name):
         st.error("השרת עמוס זמנית, אנא נסה שוב בעוד דקה.")
-        return pd.DataFrame()
-
-
-
-# --- לוגיקה ---
-def login_user(phone, password):
-    users = get_data("Users")
-    if users.empty: return None
-    
-    clean_phone = str(phone).strip().replace("-", "").replace(" ", "")
-    users['CleanPhone'] = users['Phone'].astype(str).str.replace("'", "").str.replace(" ", "")
-    
-    user_row = users[users['CleanPhone'] == clean_phone]
-    if user_row.empty: return None
-    
-    # שימוש בפונקציה החדשה ללא bcrypt
-    if verify_password(password, user_row.iloc[0]['Password']):
-        return user_row.iloc[0].to_dict()
-    return None
-
-def update_status_safe(sheet_name, id_col, item_id, status_col_idx, new_status):
-    ws = get_worksheet(sheet_name)
-    df = get_data(sheet_name)
-    try:
-        row_idx = df[df[id_col].astype(str) == str(item_id)].index[0] + 2
-        ws.update_cell(row_idx, status_col_idx, new_status)
-        st.cache_data.clear()
-        return True
-    except: return False
-
-
-def register_user(full_name, phone, apt, role, password):
-    try:
-        ws = get_worksheet("Users")
-        users = get_data("Users")
-        clean_phone = str(phone).strip().replace("-", "").replace(" ", "").replace("'", "")
-        
-        # 1. בדיקת כפילות משודרגת
-        if not users.empty:
-            users['CleanCheck'] = users['Phone'].astype(str).str.replace("'", "").str.replace("-", "").str.replace(" ", "")
-            if clean_phone in users['CleanCheck'].values:
-                error_msg = "⚠️ מספר הטלפון הזה כבר רשום במערכת. יש ליצור קשר עם ועד הבית לקבלת הסיסמה או לצורך איפוס המשתמש."
-                st.error(error_msg) # הודעה אדומה קבועה על המסך
-                st.toast(error_msg, icon="🚫") # הודעה קופצת
-                
-                # השהייה של 5 שניות כדי שהמשתמש יספיק לקרוא
-                tm.sleep(7) 
-                return False, error_msg
-
-        # 2. הוספת השורה (כולל עמודת Is_New החדשה להתראה לאדמין)
-        # שם, טלפון, דירה, סוג, סיסמה, סטטוס, תפקיד, Is_New
-        new_row = [full_name, f"'{clean_phone}", str(apt), role, password, STATUS_ACTIVE, "user", "TRUE"]
-        
-        # שימוש ב-table_range='A1' מבטיח שהנתון יתווסף בדיוק בסוף הרשימה הקיימת
-        ws.append_row(new_row, value_input_option='USER_ENTERED', table_range='A1')
-        
-        # 3. ניקוי מטמון ועדכון אדמין
-        st.cache_data.clear()
-        send_telegram(f"🔔 דייר חדש נרשם בשיטס: {full_name}\nדירה: {apt}")
-        
-        return True, "נרשמת בהצלחה! ניתן להתחבר כעת."
-        
-    except Exception as e:
-        return False, f"שגיאה טכנית בתקשורת עם בסיס הנתונים: {e}"
-
-
-def login_user(phone, password):
-    users = get_data("Users")
-    if users.empty: return None
-    
-    clean_input = str(phone).strip().replace("-", "").replace(" ", "")
-    users['CleanPhone'] = users['Phone'].astype(str).str.replace("'", "").str.replace("-", "").str.replace(" ", "")
-    
-    user_row = users[users['CleanPhone'] == clean_input]
-    
-    if user_row.empty: return None
-    
-    # שליפת הסיסמה מהשיטס (עמודה Password)
-    stored_password = user_row.iloc[0]['Password']
-    
-    # כאן מתבצעת הקריאה לפונקציה שתיקנו למעלה
-    if verify_password(password, stored_password):
-        return user_row.iloc[0].to_dict()
-    return None
-
-def reset_new_users_notifications():
-    try:
-        ws = get_worksheet("Users")
-        df = get_data("Users")
-        if 'Is_New' in df.columns:
-            # מוצאים את כל השורות שבהן Is_New הוא TRUE
-            # +2 כי אינדקס מתחיל מ-0 ושורה ראשונה היא כותרת
-            for idx, row in df.iterrows():
-                if str(row['Is_New']).upper() == 'TRUE':
-                    ws.update_cell(idx + 2, 8, "FALSE") # עמודה 8 היא Is_New
-            st.cache_data.clear()
-            return True
-    except: return False
-
-
-def check_overlap(date_str, start_str, end_str):
-    bookings = get_data("Bookings")
-    if bookings.empty: return False
-    
-    active = bookings[(bookings['Date'] == date_str) & (bookings['Status'].isin([STATUS_APPROVED, STATUS_PENDING]))]
-    if active.empty: return False
-    
-    new_start = datetime.strptime(start_str, TIME_FMT).time()
-    new_end = datetime.strptime(end_str, TIME_FMT).time()
-    
-    for _, row in active.iterrows():
-        ex_start = datetime.strptime(row['Start Time'], TIME_FMT).time()
-        ex_end = datetime.strptime(row['End Time'], TIME_FMT).time()
-        if new_start < ex_end and new_end > ex_start:
-            return True
-    return False
-
-# --- פונקציה מעודכנת: הוספת שיריון עם בדיקת כפילות חכמה (Race Condition Fix) ---
-def add_booking(user_data, date_obj, start, end, is_maintenance=False):
-    # 1. בדיקות מקדימות
-    if start >= end: return False, "שעת הסיום חייבת להיות אחרי שעת ההתחלה"
-    
-    date_str = date_obj.strftime(DATE_FMT)
-    start_str = start.strftime(TIME_FMT)
-    end_str = end.strftime(TIME_FMT)
-    
-    # בדיקה ראשונית בזיכרון (מהירה)
-    if check_overlap(date_str, start_str, end_str):
-        return False, "החדר תפוס (או ממתין לאישור) בשעות אלו"
-        
-    ws = get_worksheet("Bookings")
-    b_id = str(uuid.uuid4())[:8]
-    
-    # הגדרת פרטים לפי סוג (תחזוקה או רגיל)
-    name = "⛔ תחזוקה/חסום" if is_maintenance else user_data['Full Name']
-    status = "approved" if is_maintenance else STATUS_PENDING
-    apt = "0" if is_maintenance else str(user_data.get('Apt', '0'))
-    phone = "admin" if is_maintenance else str(user_data['Phone'])
-
-    # 2. כתיבה לגוגל שיטס
-    row_data = [b_id, f"'{phone}", name, date_str, start_str, end_str, status, apt]
-    ws.append_row(row_data)
-    
-    # 3. בדיקה חוזרת (Double Check) למניעת התנגשות בזמן אמת
-    # אנחנו מנקים את הזיכרון, מושכים נתונים מחדש ובודקים אם נוצרה חפיפה כרגע
-    st.cache_data.clear()
-    tm.sleep(1) # נותנים לגוגל שנייה להתעדכן
-    
-    # בדיקה האם יש שיריון *אחר* (לא שלי) שחופף לשלי
-    all_bookings = get_data("Bookings")
-    current_booking = all_bookings[all_bookings['Booking ID'] == b_id]
-    
-    if current_booking.empty:
-        return False, "שגיאה בכתיבת הנתונים"
-
-    # בודקים שוב חפיפה מול כל השאר
-    is_overlapping = False
-    new_start_dt = datetime.strptime(start_str, TIME_FMT).time()
-    new_end_dt = datetime.strptime(end_str, TIME_FMT).time()
-    
-    relevant = all_bookings[
-        (all_bookings['Date'] == date_str) & 
-        (all_bookings['Status'].isin([STATUS_APPROVED, STATUS_PENDING])) &
-        (all_bookings['Booking ID'] != b_id) # מתעלמים מהשורה שאנחנו הרגע יצרנו
-    ]
-    
-    for _, row in relevant.iterrows():
-        ex_start = datetime.strptime(row['Start Time'], TIME_FMT).time()
-        ex_end = datetime.strptime(row['End Time'], TIME_FMT).time()
-        if new_start_dt < ex_end and new_end_dt > ex_start:
-            is_overlapping = True
-            break
-    
-    # 4. אם גילינו חפיפה בדיעבד - מוחקים את הבקשה שלנו!
-    if is_overlapping:
-        # מוצאים את השורה ומוחקים/מסמנים כדחוי
-        cell = ws.find(b_id)
-        if cell:
-            ws.update_cell(cell.row, 7, STATUS_REJECTED) # עמודה 7 היא סטטוס
-        return False, "⚠️ מצטערים, מישהו אחר הקדים אותך בשבריר שנייה. נסה שעה אחרת."
-
-    if not is_maintenance:
-        send_telegram(f"📅 *בקשה לשיריון*\nדייר: {name}\nתאריך: {date_str}\nשעות: {start_str}-{end_str}")
-        return True, "הבקשה נשלחה למנהל המערכת לאישור."
-    else:
-        return True, "הזמן נחסם בהצלחה."
-
-# --- פונקציה חדשה: עדכון פרטי דייר ---
-# --- פונקציה מעודכנת: עדכון פרטי דייר כולל סיסמה ---
-def update_user_details_admin(original_phone, new_name, new_phone, new_apt, new_type, new_password):
-    ws = get_worksheet("Users")
-    cell = ws.find(f"'{original_phone}") # חיפוש לפי הטלפון הישן
-    if not cell:
-        cell = ws.find(original_phone)
-    
-    if cell:
-        row = cell.row
-        # עדכון תאים לפי הסדר (שם, טלפון, דירה, סוג, סיסמה)
-        ws.update_cell(row, 1, new_name)
-        ws.update_cell(row, 2, f"'{new_phone}")
-        ws.update_cell(row, 3, str(new_apt))
-        ws.update_cell(row, 4, new_type)
-        ws.update_cell(row, 5, new_password) # עמודה 5 היא הסיסמה
-        st.cache_data.clear()
-        return True
-    return False
-
-# --- פונקציה חדשה: חישוב סטטיסטיקות ---
-def get_stats_data():
-    df = get_data("Bookings")
-    if df.empty: return None, None
-    
-    # סינון רק למאושרים
-    df = df[df['Status'] == STATUS_APPROVED]
-    
-    # 1. סטטיסטיקה לפי דירה
-    if 'Apt' in df.columns:
-        apt_counts = df['Apt'].value_counts().reset_index()
-        apt_counts.columns = ['דירה', 'הזמנות']
-    else:
-        apt_counts = pd.DataFrame()
+    return df
 
-    # 2. סטטיסטיקה לפי יום בשבוע
-    # המרת תאריך ליום בשבוע
-    df['Datetime'] = pd.to_datetime(df['Date'], format=DATE_FMT, errors='coerce')
-    df = df.dropna(subset=['Datetime']) # מחיקת תאריכים לא תקינים
-    
-    # תרגום ימים לעברית
-    days_map = {0:'שני', 1:'שלישי', 2:'רביעי', 3:'חמישי', 4:'שישי', 5:'שבת', 6:'ראשון'}
-    df['Day'] = df['Datetime'].dt.dayofweek.map(days_map)
-    
-    day_counts = df['Day'].value_counts().reset_index()
-    day_counts.columns = ['יום', 'הזמנות']
-    
-    return apt_counts, day_counts
-
-def get_calendar_events():
-    events = []
-    apt_colors = { "13": "#FF5733", "1": "#33FF57", "5": "#3357FF" }
-    default_color = "#3E3080"
+# @st.cache_resource
+def get_cookie_manager():
+    import extra_streamlit_components as stx # ייבוא עצל - לא נדרש בסקריפטים
+    return stx.CookieManager(key="auth_cookie_v4")
 
-    try:
-        for date_obj, name in holidays.IL(years=datetime.now().year).items():
-            events.append({
-                "title": f"🇮🇱 {name}", "start": str(date_obj), "end": str(date_obj),
-                "allDay": True, "backgroundColor": "#FFEB3B", "textColor": "#000000", "borderColor": "#FBC02D"
-            })
-    except: pass
+cookie_manager = get_cookie_manager()
 
-    df = get_data("Bookings")
-    if not df.empty:
-        approved = df[df['Status'] == STATUS_APPROVED]
-        for _, row in approved.iterrows():
-            current_apt = str(row.get('Apt', '?'))
-            chosen_dot_color = apt_colors.get(current_apt, default_color)
-            event_title = f"דירה {current_apt}\n{row['Start Time']}-{row['End Time']}"
-            
-            events.append({
-                "title": event_title,
-                "start": f"{row['Date']}T{row['Start Time']}",
-                "end": f"{row['Date']}T{row['End Time']}",
-                "backgroundColor": "#FFFFFF", 
-                "borderColor": chosen_dot_color, 
-                "textColor": "#080808"
-            })
-    return events
-
-# --- פונקציה משודרגת: בדיקת חפיפה שמתעלמת משיריון ספציפי (לצורך עריכה) ---
-def check_overlap_for_update(date_str, start_str, end_str, ignore_booking_id):
-    bookings = get_data("Bookings")
-    if bookings.empty: return False
-    
-    # מסננים: רק שיריונים פעילים, באותו תאריך, ולא השיריון שאנחנו עורכים כרגע!
-    active = bookings[
-        (bookings['Date'] == date_str) & 
-        (bookings['Status'].isin([STATUS_APPROVED, STATUS_PENDING])) & 
-        (bookings['Booking ID'] != ignore_booking_id) # זה החלק הקריטי
-    ]
-    
-    if active.empty: return False
-    
-    new_start = datetime.strptime(start_str, TIME_FMT).time()
-    new_end = datetime.strptime(end_str, TIME_FMT).time()
-    
-    for _, row in active.iterrows():
-        ex_start = datetime.strptime(row['Start Time'], TIME_FMT).time()
-        ex_end = datetime.strptime(row['End Time'], TIME_FMT).time()
-        if new_start < ex_end and new_end > ex_start:
-            return True
-    return False
-
-# --- פונקציה חדשה: עדכון שיריון קיים (עריכה) ---
-def edit_existing_booking(booking_id, new_date, new_start, new_end):
-    if new_start >= new_end: return False, "שעת הסיום חייבת להיות אחרי ההתחלה"
-    
-    d_str = new_date.strftime(DATE_FMT)
-    s_str = new_start.strftime(TIME_FMT)
-    e_str = new_end.strftime(TIME_FMT)
-    
-    # בדיקת חפיפה (שמתעלמת מעצמי)
-    if check_overlap_for_update(d_str, s_str, e_str, booking_id):
-        return False, "הזמן החדש שבחרת תפוס על ידי מישהו אחר"
-    
-    ws = get_worksheet("Bookings")
-    cell = ws.find(booking_id)
-    
-    if cell:
-        r = cell.row
-        # עדכון תאריך, התחלה, סיום (עמודות 4, 5, 6)
-        ws.update_cell(r, 4, d_str)
-        ws.update_cell(r, 5, s_str)
-        ws.update_cell(r, 6, e_str)
-        # מחזירים לסטטוס "ממתין" אחרי עריכה? לשיקולך. כאן השארתי את הסטטוס המקורי או שאפשר לשנות.
-        # ws.update_cell(r, 7, STATUS_PENDING) 
-        st.cache_data.clear()
-        return True, "השיריון עודכן בהצלחה!"
-    return False, "שיריון לא נמצא"
-
-# --- פונקציה חדשה: מחיקת משתמש וכל השיריונים שלו ---
-def delete_user_fully_admin(phone_to_delete):
+# --- רכיב בחירת מועדים חוזרים (משותף לדייר ולאדמין) ---
+def recurrence_picker(key_prefix):
+    # מחזיר רשימת תאריכים, או None אם הקלט לא תקין
+    def expand(rule):
+        dates, truncated = expand_recurrence(rule)
+        if truncated:
+            st.warning(f"אפשר לשריין עד {MAX_OCCURRENCES} מועדים בבת אחת - נלקחו רק {MAX_OCCURRENCES} הראשונים")
+        return dates
+
+    modes = {"תאריך בודד": None, "טווח תאריכים": RECUR_RANGE, "שבועי": RECUR_WEEKLY, "רשימת תאריכים": RECUR_DATES}
+    mode = modes[st.radio("סוג", list(modes), horizontal=True, key=f"{key_prefix}_mode")]
+    today = date.today()
+
+    if mode is None:
+        return [st.date_input("תאריך", today, min_value=today, key=f"{key_prefix}_date")]
+
+    if mode == RECUR_DATES:
+        raw = st.text_area("תאריכים (אחד בכל שורה, YYYY-MM-DD)", key=f"{key_prefix}_dates")
+        try:
+            dates = [datetime.strptime(x.strip(), DATE_FMT).date() for x in raw.splitlines() if x.strip()]
+        except ValueError:
+            st.error("יש תאריך בפורמט לא תקין")
+            return None
+        return expand({"type": RECUR_DATES, "dates": dates})
+
+    c1, c2 = st.columns(2)
+    start = c1.date_input("מתאריך", today, min_value=today, key=f"{key_prefix}_from")
+    until = c2.date_input("עד תאריך", today + timedelta(days=28), min_value=today, key=f"{key_prefix}_until")
+    rule = {"type": mode, "start": start, "until": until}
+    if mode == RECUR_WEEKLY:
+        # סדר תצוגה מיום ראשון
+        order = [6, 0, 1, 2, 3, 4, 5]
+        rule["weekdays"] = st.multiselect("ימים בשבוע", order, default=[start.weekday()],
+                                          format_func=WEEKDAYS_HE.get, key=f"{key_prefix}_days")
+    return expand(rule)
+
+def fragment(func):
+    # st.fragment שקובע מחדש את הבניין ואת המשתמש (ליומן השינויים) בכל ריצה שלו: ריצה של fragment לבד
+    # מתחילה לפעמים בת'רד חדש, בלי החלק של הסקריפט שקבע אותם
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        core.use_tenant(st.session_state.tenant)
+        core.set_actor(core.actor_label(st.session_state.user) if st.session_state.get('user') else None)
+        return func(*args, **kwargs)
+    return st.fragment(run)
+
+def rerun_fragment():
+    # אחרי פעולה בתוך fragment מריצים מחדש רק אותו. אם הלחיצה נקלטה בריצה מלאה (למשל כשריצה אחרת
+    # של הדף התחילה באותו רגע) Streamlit לא מאפשר scope="fragment" - ואז פשוט מריצים הכל
+    from streamlit.errors import StreamlitAPIException
     try:
-        # 1. מחיקת המשתמש
-        ws_users = get_worksheet("Users")
-        
-        # חיפוש תא הטלפון (עם ובלי גרש)
-        cell = ws_users.find(f"'{phone_to_delete}")
-        if not cell: cell = ws_users.find(phone_to_delete)
-        
-        if cell:
-            ws_users.delete_rows(cell.row)
-        else:
-            return False, "משתמש לא נמצא"
-
-        # 2. מחיקת כל השיריונים של המשתמש
-        ws_books = get_worksheet("Bookings")
-        # אנו מוצאים את כל התאים שמכילים את הטלפון הזה
-        # הערה: זה עלול לקחת זמן אם יש המון שיריונים. 
-        # כדי לא להסתבך עם אינדקסים שזזים, נמחק אחד אחד בלולאה עד שאין יותר
-        
-        while True:
-            # מחפשים מחדש בכל איטרציה כי השורות זזו
-            try:
-                b_cell = ws_books.find(f"'{phone_to_delete}")
-                if not b_cell: b_cell = ws_books.find(phone_to_delete)
-                
-                if b_cell:
-                    ws_books.delete_rows(b_cell.row)
-                    tm.sleep(0.5) # השהייה למנוע עומס על ה-API
-                else:
-                    break # לא נמצאו עוד שיריונים
-            except:
-                break
-        
-        st.cache_data.clear()
-        return True, "המשתמש וכל השיריונים שלו נמחקו בהצלחה"
-        
-    except Exception as e:
-        return False, f"שגיאה במחיקה: {str(e)}"
-    
-# --- הגדרה קבועה לסטטוס חדש ---
-STATUS_EDIT_PENDING = "pending_edit"
-
-# --- פונקציה: דייר מבקש שינוי (יוצרת בקשה חדשה המקושרת לישנה) ---
-def request_edit_booking(user_data, original_booking_id, new_date, new_start, new_end):
-    # 1. בדיקות תקינות
-    if new_start >= new_end: return False, "שעת הסיום חייבת להיות אחרי ההתחלה"
-    
-    d_str = new_date.strftime(DATE_FMT)
-    s_str = new_start.strftime(TIME_FMT)
-    e_str = new_end.strftime(TIME_FMT)
-    
-    # 2. בדיקת חפיפה (אנחנו בודקים אם *הזמן החדש* פנוי)
-    # שימו לב: אנחנו לא מתעלמים מהשיריון המקורי כי הוא בזמן אחר, 
-    # אבל אנחנו כן צריכים לוודא שהזמן החדש פנוי.
-    if check_overlap(d_str, s_str, e_str):
-        return False, "הזמן החדש שבחרת תפוס"
-
-    # 3. יצירת רשומה חדשה בסטטוס "ממתין לעריכה"
-    ws = get_worksheet("Bookings")
-    new_id = str(uuid.uuid4())[:8]
-    
-    # מבנה השורה: ID, Phone, Name, Date, Start, End, Status, Apt, LinkedID
-    # LinkedID הוא המזהה של השיריון הישן שאותו אנחנו רוצים להחליף
-    row_data = [
-        new_id, 
-        f"'{user_data['Phone']}", 
-        user_data['Full Name'], 
-        d_str, 
-        s_str, 
-        e_str, 
-        STATUS_EDIT_PENDING,     # סטטוס מיוחד
-        str(user_data.get('Apt', '0')),
-        original_booking_id      # הקישור לשיריון המקורי
-    ]
-    
-    ws.append_row(row_data)
-    st.cache_data.clear()
-    
-    send_telegram(f"✏️ *בקשת עריכה*\nדייר: {user_data['Full Name']}\nרוצה לשנות לתאריך: {d_str}\nשעות: {s_str}-{e_str}")
-    return True, "בקשת השינוי נשלחה לאישור המנהל."
-
-# --- פונקציה: אדמין מאשר שינוי (מחליף בין הישן לחדש) ---
-def approve_edit_request(new_booking_id, original_booking_id):
-    ws = get_worksheet("Bookings")
-    
-    # 1. מוצאים את השורות
-    cell_new = ws.find(new_booking_id)
-    cell_old = ws.find(original_booking_id)
-    
-    if cell_new and cell_old:
-        # 2. מאשרים את החדש
-        ws.update_cell(cell_new.row, 7, STATUS_APPROVED)
-        
-        # 3. מבטלים את הישן (סטטוס "הוחלף")
-        ws.update_cell(cell_old.row, 7, "replaced")
-        
-        st.cache_data.clear()
-        return True, "השינוי בוצע בהצלחה"
-    
-    return False, "שגיאה במציאת השיריונים"
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
+def show_batch_results(results):
+    if results:
+        import pandas as pd
+        st.dataframe(pd.DataFrame([
+            {"תאריך": r["date"].strftime(DATE_FMT), "תוצאה": "✅" if r["ok"] else f"❌ {r['msg']}"} for r in results
+        ]), hide_index=True, use_container_width=True)
 
 
 # --- האפליקציה הראשית ---
@@ -519,6 +152,9 @@ st.set_page_config(page_title="ניהול חדר דיירים", layout="wide")
 
 load_css("style.css")
 
+# מקום שמור לראש העמוד - ממולא בסוף הריצה אם הנתונים הוגשו מעותק ישן
+status_banner = st.empty()
+
 
 if 'user' not in st.session_state: st.session_state.user = None
 
@@ -528,41 +164,32 @@ if st.session_state.user is None:
     if st.session_state.get('logout_clicked', False):
         st.session_state.logout_clicked = False # אפס את הדגל לפעם הבאה
     else:
-        # קריאת העוגיה
-        cookie_phone = cookie_manager.get(cookie="logged_user_phone")
-        
-        # מוודאים שהעוגיה קיימת ושיש בה תוכן אמיתי (לא ריקה)
-        if cookie_phone and str(cookie_phone).strip() != "":
-            users_db = get_data("Users")
-            if not users_db.empty:
-                # ניקוי הטלפון מהעוגיה כדי להשוות לדאטה בייס
-                users_db['CleanPhone'] = users_db['Phone'].astype(str).str.replace("'", "").str.replace("-", "").str.replace(" ", "")
-                found_user = users_db[users_db['CleanPhone'] == str(cookie_phone)]
-                
-                if not found_user.empty:
-                    # מצאנו משתמש תואם לעוגיה - מחברים אותו
-                    st.session_state.user = found_user.iloc[0].to_dict()
-                    st.rerun()
-
-if st.session_state.user is None:
-    if st.session_state.get('logout_clicked', False):
-        pass 
-    else:
-        cookie_phone = cookie_manager.get(cookie="logged_user_phone")
-        if cookie_phone and len(str(cookie_phone)) > 5:
-            users_db = get_data("Users")
-            if not users_db.empty:
-                users_db['CleanPhone'] = users_db['Phone'].astype(str).str.replace("'", "").str.replace(" ", "")
-                found_user = users_db[users_db['CleanPhone'] == str(cookie_phone)]
-                if not found_user.empty:
-                    u_data = found_user.iloc[0].to_dict()
-                    if u_data.get('Status') == STATUS_ACTIVE:
-                        st.session_state.user = u_data
-                        st.rerun()
+        # העוגיה מכילה טוקן חתום עם פרטי המשתמש - אין צורך לסרוק את גיליון המשתמשים
+        payload = core.verify_token(cookie_manager.get(cookie=core.session_cookie_name()))
+        if payload:
+            if core.needs_revalidation(payload):
+                # בדיקה תקופתית מול אינדקס המשתמשים (משתמש שנחסם/נמחק מנותק)
+                u_data, token = core.revalidate_session(payload)
+                if u_data and token:
+                    cookie_manager.set(core.session_cookie_name(), token, expires_at=datetime.now() + timedelta(days=7))
+                    tm.sleep(0.5)
+                elif not u_data: # רק משתמש שבאמת לא קיים או לא פעיל - לא תקלה בגוגל
+                    cookie_manager.delete(core.session_cookie_name())
+            else:
+                u_data = core.user_from_token(payload)
+            if u_data:
+                st.session_state.user = u_data
+                st.rerun()
 
 # --- מסך התחברות / הרשמה ---
 if not st.session_state.user:
     st.title("🏡 מערכת לניהול חדר דיירים (v2)")
+    if len(tenants) > 1:
+        # בחירת בניין בכניסה - נשמרת בכתובת כדי שריענון יחזור לאותו בניין
+        def switch_tenant():
+            st.query_params["b"] = st.session_state.tenant_pick
+        st.selectbox("בניין", list(tenants), index=list(tenants).index(tenant_slug), key="tenant_pick",
+                     format_func=lambda t: tenants[t]['name'], on_change=switch_tenant)
     tab1, tab2 = st.tabs(["כניסה", "הרשמה"])
     
     with tab1:
@@ -578,12 +205,9 @@ if not st.session_state.user:
                 if user['Status'] == STATUS_ACTIVE:
                     st.session_state.user = user
                     
-                    # === שמירת עוגיה תקינה ===
-                    clean_phone_cookie = str(l_phone).strip().replace("-", "").replace(" ", "")
-                    # התיקון: שימוש ב-timedelta
+                    # === שמירת עוגיה עם טוקן חתום ===
                     expires = datetime.now() + timedelta(days=7)
-                    
-                    cookie_manager.set("logged_user_phone", clean_phone_cookie, expires_at=expires)
+                    cookie_manager.set(core.session_cookie_name(), core.issue_token(user), expires_at=expires)
                     
                     tm.sleep(0.5) 
                     st.rerun()
@@ -609,6 +233,9 @@ if not st.session_state.user:
             
             # בדיקת תקינות
             if name and phone and password:
+                # callback רץ לפני הסקריפט עצמו - קובעים כאן את הבניין, וביומן השינויים ההרשמה נרשמת על שם הנרשם
+                core.use_tenant(st.session_state.tenant)
+                core.set_actor(core.actor_label({'Full Name': name, 'Phone': phone}))
                 # קריאה לפונקציית ההרשמה
                 ok, msg = register_user(name, phone, apt, user_type, password)
                 
@@ -623,8 +250,9 @@ if not st.session_state.user:
                     st.session_state.reg_type = "בעל דירה"
                     st.session_state.reg_pass = ""
                 else:
-                    # שמירת הודעת שגיאה
+                    # שמירת הודעת שגיאה + הודעה קופצת
                     st.session_state['reg_message'] = ('error', msg)
+                    st.toast(msg, icon="🚫")
             else:
                 st.session_state['reg_message'] = ('error', "נא למלא את כל השדות")
 
@@ -654,6 +282,7 @@ if not st.session_state.user:
 else:
     user = st.session_state.user
     is_admin = user.get('Role') in ['admin', 'committee']
+    core.set_actor(core.actor_label(user)) # כל שינוי בריצה הזו נרשם ביומן השינויים על שם המשתמש
     
     st.sidebar.title(f"שלום, {user['Full Name']}")
     
@@ -690,12 +319,12 @@ else:
 
     if st.sidebar.button("התנתק"):
         # 1. מחיקת העוגיה
-        cookie_manager.delete("logged_user_phone")
+        cookie_manager.delete(core.session_cookie_name())
         # 2. איפוס ה-State
         st.session_state.user = None
         st.session_state.logout_clicked = True
         # 3. ניקוי מטמון וספירה לאחור
-        st.cache_data.clear()
+        core.clear_cache()
         p = st.sidebar.empty()
         for i in range(10, 0, -1):
             p.warning(f"מתנתק בבטחה... {i}")
@@ -704,14 +333,20 @@ else:
 
     st.sidebar.markdown("---")
     st.sidebar.caption(f"© {datetime.now().year} כל הזכויות שמורות - רן לוי מוביל ועד הבית והאדמין")
-    st.sidebar.caption("פותח עבור בניין שדרות לכיש 129 🏡")
+    st.sidebar.caption(f"פותח עבור {tenant['name']} 🏡")
 
     # --- 1. לוח שנה ושיריון (ללא שינוי מהותי) ---
     if menu == "לוח שנה ושיריון":
         st.header("📅 יומן תפוסה ושיריון")
+        # בחירת המשאב (חדר דיירים / חדר כושר / גג / חניה) - משפיעה על השיריון ועל הלוח
+        resources = get_resources()
+        res = st.selectbox("משאב", list(resources), format_func=resources.get, key="resource")
         col_form, col_calendar = st.columns([1, 3], gap="small")
-        
-        with col_form:
+
+        # הטופס והלוח רצים כ-fragment: הקלדה, חיפוש זמן פנוי או דפדוף בלוח מריצים מחדש רק את החלק שלהם
+        # (בלי בדיקת העוגייה, ספירת ההתראות בסרגל והלוח כולו). שיריון שנקלט מריץ את כל הדף כדי שהלוח יתעדכן
+        @fragment
+        def booking_forms(res):
             with st.container(border=True):
                 st.subheader("➕ שיריון מהיר")
                 with st.form("new_book_flex"):
@@ -721,17 +356,64 @@ else:
                     if st.form_submit_button("שלח בקשה"):
                         apt = user.get('Apt', '0')
                         # שימוש בפונקציה המעודכנת
-                        ok, msg = add_booking(user, d, s, e, is_maintenance=False)
+                        ok, msg = add_booking(user, d, s, e, is_maintenance=False, resource=res)
                         if ok:
                             st.toast("השיריון בוצע ואושר אוטומטית! 🎉", icon='📅')
                             tm.sleep(1) # נותן למשתמש זמן לראות את הבלון
                             st.rerun()
                         else: st.error(msg)
-            
+
+            # --- חיפוש זמן פנוי (במקום לנחש שעות ולקבל "החדר תפוס") ---
+            with st.expander("🔍 חיפוש זמן פנוי"):
+                today = date.today()
+                f_range = st.date_input("טווח תאריכים", value=(today, today + timedelta(days=7)), min_value=today, key="slot_range")
+                f_dur = st.number_input("משך מינימלי (דקות)", min_value=15, max_value=24 * 60 - 1, value=120, step=15, key="slot_dur")
+                w1, w2 = st.columns(2)
+                f_from = w1.time_input("החל מ-", time(8, 0), key="slot_from")
+                f_to = w2.time_input("עד", time(23, 59), key="slot_to")
+
+                # בזמן הבחירה ב-date_input מתקבל רק תאריך אחד
+                range_start = f_range[0] if f_range else today
+                range_end = f_range[1] if len(f_range) > 1 else range_start
+                slots = find_free_slots(range_start, range_end, int(f_dur), f_from, f_to, resource=res)
+
+                if slots:
+                    slot_idx = st.selectbox(
+                        "זמנים פנויים", range(len(slots)), key="slot_pick",
+                        format_func=lambda i: f"{slots[i][0].strftime('%d/%m')} | {slots[i][1].strftime(TIME_FMT)}-{slots[i][2].strftime(TIME_FMT)}"
+                    )
+                    slot_date, slot_start, slot_end = slots[slot_idx]
+                    # משריינים מתחילת החלון לפי המשך שנבחר (ולא את כל החלון)
+                    book_end = from_minutes(min(to_minutes(slot_start) + int(f_dur), to_minutes(slot_end)))
+                    if st.button(f"שריין {slot_start.strftime(TIME_FMT)}-{book_end.strftime(TIME_FMT)}", key="slot_book"):
+                        ok, msg = add_booking(user, slot_date, slot_start, book_end, is_maintenance=False, resource=res)
+                        if ok:
+                            st.toast(msg, icon='📅')
+                            tm.sleep(1)
+                            st.rerun()
+                        else: st.error(msg)
+                else:
+                    st.info("לא נמצאו זמנים פנויים בטווח שנבחר")
+
+            # --- שיריון חוזר (למשל קבוע כל שבוע) ---
+            with st.expander("🔁 שיריון חוזר"):
+                r_dates = recurrence_picker("recur")
+                r1, r2 = st.columns(2)
+                r_start = r1.time_input("התחלה", time(18, 0), key="recur_start")
+                r_end = r2.time_input("סיום", time(20, 0), key="recur_end")
+                if r_dates:
+                    st.caption(f"{len(r_dates)} מועדים")
+                if st.button("שלח בקשות", key="recur_book", disabled=not r_dates):
+                    ok, msg, results = add_bookings_batch(user, r_dates, r_start, r_end, is_maintenance=False, resource=res)
+                    if ok: st.success(msg)
+                    else: st.error(msg)
+                    show_batch_results(results)
+
             # מקרא צבעים קטן
             st.info("💡 ירוק = שיריון רגיל | צהוב = חג | שחור/אפור = חסום")
 
-        with col_calendar:
+        @fragment
+        def booking_calendar(res):
             # הגדרות לוח שנה
             calendar_opts = {
                 "headerToolbar": {"left": "", "center": "title", "right": "prev,next"},
@@ -756,117 +438,137 @@ else:
             padding: 2px !important;
         }
     """
-            calendar(events=get_calendar_events(), options=calendar_opts, custom_css=custom_css)
-            
+            from streamlit_calendar import calendar # ייבוא עצל - נדרש רק בעמוד הזה
+            calendar(events=get_calendar_events(res), options=calendar_opts, custom_css=custom_css, key=f"cal_{res}")
+
+        with col_form:
+            booking_forms(res)
+        with col_calendar:
+            booking_calendar(res)
+
 # --- 2. השיריונים שלי (עם עריכה וביטול) ---
     elif menu == "השיריונים שלי":
         st.header(f"היסטוריית דירה {user.get('Apt', '?')}")
-        df = get_data("Bookings")
-        
-        if not df.empty:
-            user_apt = str(user.get('Apt', '')).strip()
-            if 'Apt' in df.columns:
-                df['Apt'] = df['Apt'].astype(str).str.strip()
-                # מציג שיריונים של הדירה (מאושרים, ממתינים, או ממתינים לעריכה)
-                # הוספנו את STATUS_EDIT_PENDING כדי שיראו גם בקשות עריכה של הדירה
-                my_bookings = df[(df['Apt'] == user_apt) & (df['Status'].isin([STATUS_APPROVED, STATUS_PENDING, STATUS_EDIT_PENDING]))]
+        if core.feeds_enabled():
+            with st.expander("📲 הוספת השיריונים ללוח השנה בטלפון"):
+                # קישור קבוע ללוח שנה (iCal) - הטלפון מתעדכן לבד, בלי להיכנס לאפליקציה
+                st.caption("העתיקו את הקישור והוסיפו אותו כ'לוח שנה מנוי' (Google / iPhone / Outlook)")
+                st.code(core.feed_url(user.get('Apt')), language=None)
+                if is_admin:
+                    st.caption("לוח השנה של כל הבניין:")
+                    st.code(core.feed_url(), language=None)
+        # רשימת השיריונים כ-fragment - ביטול או עריכה מריצים מחדש רק את הרשימה
+        @fragment
+        def my_bookings_list(user):
+            df = get_data("Bookings")
+        
+            if not df.empty:
+                df = with_resource(df)
+                user_apt = str(user.get('Apt', '')).strip()
+                if 'Apt' in df.columns:
+                    df['Apt'] = df['Apt'].astype(str).str.strip()
+                    # מציג שיריונים של הדירה (מאושרים, ממתינים, או ממתינים לעריכה)
+                    # הוספנו את STATUS_EDIT_PENDING כדי שיראו גם בקשות עריכה של הדירה
+                    my_bookings = df[(df['Apt'] == user_apt) & (df['Status'].isin([STATUS_APPROVED, STATUS_PENDING, STATUS_EDIT_PENDING]))]
                 
-                if not my_bookings.empty:
-                    # מיין לפי תאריך (הכי קרוב למעלה)
-                    my_bookings = my_bookings.sort_values(by='Date', ascending=False)
+                    if not my_bookings.empty:
+                        # מיין לפי תאריך (הכי קרוב למעלה)
+                        my_bookings = my_bookings.sort_values(by='Date', ascending=False)
                     
-                    for _, row in my_bookings.iterrows():
-                        with st.container(border=True):
-                            c1, c2, c3 = st.columns([3, 2, 2])
+                        for _, row in my_bookings.iterrows():
+                            with st.container(border=True):
+                                c1, c2, c3 = st.columns([3, 2, 2])
                             
-                            # פרטי השיריון
-                            if row['Status'] == STATUS_PENDING:
-                                status_icon = "⏳ ממתין"
-                            elif row['Status'] == STATUS_EDIT_PENDING:
-                                status_icon = "📝 בעריכה"
-                            else:
-                                status_icon = "✅ מאושר"
+                                # פרטי השיריון
+                                if row['Status'] == STATUS_PENDING:
+                                    status_icon = "⏳ ממתין"
+                                elif row['Status'] == STATUS_EDIT_PENDING:
+                                    status_icon = "📝 בעריכה"
+                                else:
+                                    status_icon = "✅ מאושר"
                                 
-                            c1.write(f"**{row['Date']}** | {row['Start Time']}-{row['End Time']}")
-                            c1.caption(f"{status_icon} | הוזמן ע\"י: {row['Name']}")
+                                c1.write(f"**{row['Date']}** | {row['Start Time']}-{row['End Time']}")
+                                c1.caption(f"{status_icon} | {resource_label(row['Resource'])} | הוזמן ע\"י: {row['Name']}")
                             
-                            # חישוב האם השיריון עתידי
-                            try:
-                                booking_datetime = datetime.strptime(f"{row['Date']} {row['Start Time']}", "%Y-%m-%d %H:%M")
-                                is_future = booking_datetime > datetime.now()
-                            except: is_future = False
-
-                            if is_future:
-                                c_edit, c_cancel = st.columns([1, 5])
+                                # חישוב האם השיריון עתידי
+                                try:
+                                    booking_datetime = datetime.strptime(f"{row['Date']} {row['Start Time']}", "%Y-%m-%d %H:%M")
+                                    is_future = booking_datetime > datetime.now()
+                                except: is_future = False
+
+                                if is_future:
+                                    c_edit, c_cancel = st.columns([1, 5])
                                 
-                                # --- כפתור עריכה (הלוגיקה המתוקנת) ---
-                                with c_edit:
-                                    # אם השיריון כבר בסטטוס עריכה - חוסמים עריכה נוספת
-                                    if row['Status'] == STATUS_EDIT_PENDING:
-                                        st.caption("ממתין...")
-                                    else:
-                                        with st.popover("✏️"): # כפתור קטן עם עיפרון
-                                            st.write("עריכת שיריון")
-                                            # המרת מחרוזות לאובייקטים
-                                            curr_d = datetime.strptime(row['Date'], DATE_FMT).date()
-                                            curr_s = datetime.strptime(row['Start Time'], TIME_FMT).time()
-                                            curr_e = datetime.strptime(row['End Time'], TIME_FMT).time()
+                                    # --- כפתור עריכה (הלוגיקה המתוקנת) ---
+                                    with c_edit:
+                                        # אם השיריון כבר בסטטוס עריכה - חוסמים עריכה נוספת
+                                        if row['Status'] == STATUS_EDIT_PENDING:
+                                            st.caption("ממתין...")
+                                        else:
+                                            with st.popover("✏️"): # כפתור קטן עם עיפרון
+                                                st.write("עריכת שיריון")
+                                                # המרת מחרוזות לאובייקטים
+                                                curr_d = datetime.strptime(row['Date'], DATE_FMT).date()
+                                                curr_s = datetime.strptime(row['Start Time'], TIME_FMT).time()
+                                                curr_e = datetime.strptime(row['End Time'], TIME_FMT).time()
                                             
-                                            with st.form(f"edit_form_{row['Booking ID']}"):
-                                                new_d = st.date_input("תאריך", value=curr_d)
-                                                new_s = st.time_input("התחלה", value=curr_s)
-                                                new_e = st.time_input("סיום", value=curr_e)
+                                                with st.form(f"edit_form_{row['Booking ID']}"):
+                                                    new_d = st.date_input("תאריך", value=curr_d)
+                                                    new_s = st.time_input("התחלה", value=curr_s)
+                                                    new_e = st.time_input("סיום", value=curr_e)
                                                 
-                                                if st.form_submit_button("עדכן"):
-                                                    # --- כאן התיקון שלך ---
-                                                    if is_admin:
-                                                        # אדמין: מעדכן מיד
-                                                        ok, msg = edit_existing_booking(row['Booking ID'], new_d, new_s, new_e)
-                                                    else:
-                                                        # משתמש רגיל: שולח בקשה לאישור
-                                                        ok, msg = request_edit_booking(user, row['Booking ID'], new_d, new_s, new_e)
+                                                    if st.form_submit_button("עדכן"):
+                                                        # --- כאן התיקון שלך ---
+                                                        if is_admin:
+                                                            # אדמין: מעדכן מיד
+                                                            ok, msg = edit_existing_booking(row['Booking ID'], new_d, new_s, new_e)
+                                                        else:
+                                                            # משתמש רגיל: שולח בקשה לאישור
+                                                            ok, msg = request_edit_booking(user, row['Booking ID'], new_d, new_s, new_e)
                                                     
-                                                    if ok:
-                                                        st.success(msg)
-                                                        tm.sleep(1.5)
-                                                        st.rerun()
-                                                    else:
-                                                        st.error(msg)
-
-                                # --- כפתור ביטול ---
-                                with c_cancel:
-                                    if st.button("🗑️", key=f"cncl_{row['Booking ID']}"): # כפתור קטן עם פח
-                                        if update_status_safe("Bookings", "Booking ID", row['Booking ID'], 7, "cancelled_by_user"):
-                                            st.success("בוטל!")
-                                            tm.sleep(1.5)
-                                            st.rerun()
-                            else:
-                                # שיריון עבר
-                                st.write("") 
+                                                        if ok:
+                                                            st.success(msg)
+                                                            tm.sleep(1.5)
+                                                            rerun_fragment()
+                                                        else:
+                                                            st.error(msg)
+
+                                    # --- כפתור ביטול ---
+                                    with c_cancel:
+                                        if st.button("🗑️", key=f"cncl_{row['Booking ID']}"): # כפתור קטן עם פח
+                                            if set_booking_status(row['Booking ID'], STATUS_CANCELLED):
+                                                st.success("בוטל!")
+                                                tm.sleep(1.5)
+                                                rerun_fragment()
+                                else:
+                                    # שיריון עבר
+                                    st.write("") 
+                    else:
+                        st.info("אין שיריונים פעילים לדירה זו")
                 else:
-                    st.info("אין שיריונים פעילים לדירה זו")
-            else:
-                st.error("חסרה עמודת Apt בנתונים")
+                    st.error("חסרה עמודת Apt בנתונים")
+
+        my_bookings_list(user)
 
 # --- 3. ניהול בקשות משודרג (כולל עריכות) ---
     elif "ניהול - בקשות" in menu and is_admin:
         st.header("ניהול בקשות")
-        # משיכת הנתונים (מוגן ב-TTL של 5 דקות)
-        books = get_data("Bookings")
-        
-        # הפרדה בין בקשות חדשות לבקשות עריכה
-        pending_new = books[books['Status'] == STATUS_PENDING]
-        pending_edit = books[books['Status'] == STATUS_EDIT_PENDING]
-        
+
+        # כל תור הוא fragment נפרד: אישור/דחייה מריצים מחדש רק את התור שלו וקוראים ממנו את המצב המקומי
+        # (כולל מה שעוד ממתין ביומן). המונים בסרגל הצד מתעדכנים במעבר הבא בין עמודים
         # --- א. בקשות עריכה/שינוי ---
-        if not pending_edit.empty:
+        @fragment
+        def edit_requests_queue():
+            books = with_resource(get_data("Bookings"))
+            pending_edit = books[books['Status'] == STATUS_EDIT_PENDING]
+            if pending_edit.empty: return
             st.subheader("✏️ בקשות לשינוי מועד")
             for _, row in pending_edit.iterrows():
                 orig_id = str(row.get('LinkedID', '')).strip()
                 orig_row = books[books['Booking ID'] == orig_id]
                 
                 with st.container(border=True):
-                    st.write(f"👤 **{row['Name']}** (דירה {row['Apt']}) מבקש לשנות:")
+                    st.write(f"👤 **{row['Name']}** (דירה {row['Apt']}) מבקש לשנות ({resource_label(row['Resource'])}):")
                     c_old, c_arrow, c_new = st.columns([2, 1, 2])
                     
                     if not orig_row.empty:
@@ -880,84 +582,90 @@ else:
                     
                     b1, b2 = st.columns(2)
                     if b1.button("✅ אשר שינוי", key=f"app_ed_{row['Booking ID']}"):
+                        # ההחלפה כולה נעשית בקריאה אחת לגוגל, והמטמון כבר נוקה בתוכה
                         ok, msg = approve_edit_request(row['Booking ID'], orig_id)
                         if ok: 
                             send_telegram(f"✅ בקשת השינוי של {row['Name']} אושרה!")
                             st.toast("בקשת השינוי אושרה!")
-                            tm.sleep(0.5)
-                            st.cache_data.clear() # ניקוי זיכרון כדי שהרשימה תתעדכן
-                            st.rerun()
+                            rerun_fragment()
+                        else:
+                            st.error(msg)
                             
                     if b2.button("❌ דחה שינוי", key=f"rej_ed_{row['Booking ID']}"):
-                        if update_status_safe("Bookings", "Booking ID", row['Booking ID'], 7, STATUS_REJECTED):
+                        if set_booking_status(row['Booking ID'], STATUS_REJECTED):
                             st.toast("השינוי נדחה")
-                            tm.sleep(0.5)
-                            st.cache_data.clear()
-                            st.rerun()
+                            rerun_fragment()
             st.divider()
 
         # --- ב. בקשות שיריון רגילות (חדשות) ---
-        if not pending_new.empty:
+        @fragment
+        def new_requests_queue():
+            books = with_resource(get_data("Bookings"))
+            pending_new = books[books['Status'] == STATUS_PENDING]
+            if pending_new.empty: return
             st.subheader("📅 בקשות שיריון חדשות")
             for _, row in pending_new.iterrows():
                 with st.container(border=True):
                     st.write(f"**{row['Date']}** | {row['Name']} (דירה {row['Apt']})")
-                    st.write(f"⏰ {row['Start Time']} - {row['End Time']}")
+                    st.write(f"⏰ {row['Start Time']} - {row['End Time']} | {resource_label(row['Resource'])}")
                     c1, c2 = st.columns(2)
                     
                     if c1.button("✅ אשר", key=f"adm_ok_{row['Booking ID']}"):
-                        if update_status_safe("Bookings", "Booking ID", row['Booking ID'], 7, STATUS_APPROVED):
+                        if set_booking_status(row['Booking ID'], STATUS_APPROVED):
                             send_telegram(f"✅ השיריון של {row['Name']} אושר!")
                             st.toast("השיריון אושר בהצלחה!")
-                            tm.sleep(0.5)
-                            st.cache_data.clear()
-                            st.rerun()
+                            rerun_fragment()
                             
                     if c2.button("❌ דחה", key=f"adm_no_{row['Booking ID']}"):
-                        if update_status_safe("Bookings", "Booking ID", row['Booking ID'], 7, STATUS_REJECTED):
+                        if set_booking_status(row['Booking ID'], STATUS_REJECTED):
                             st.toast("הבקשה נדחתה")
-                            tm.sleep(0.5)
-                            st.cache_data.clear()
-                            st.rerun()
-        
-        if pending_new.empty and pending_edit.empty:
+                            rerun_fragment()
+
+        # משיכת הנתונים (מוגן ב-TTL של 5 דקות)
+        books = get_data("Bookings")
+        if books.empty or not books['Status'].isin([STATUS_PENDING, STATUS_EDIT_PENDING]).any():
             st.success("אין בקשות ממתינות לאישור 🎉")
+        else:
+            edit_requests_queue()
+            new_requests_queue()
 
     # --- 4. ניהול משתמשים (כולל אישור מהיר) ---
     elif "ניהול - משתמשים" in menu and is_admin:
         st.header("ניהול משתמשים")
-        users = get_data("Users")
-        
-        pending = users[users['Status'] == STATUS_PENDING]
-        if not pending.empty:
-            st.subheader("🔔 ממתינים לאישור כניסה")
-            for _, row in pending.iterrows():
-                with st.container(border=True):
-                    c1, c2 = st.columns([3, 1])
-                    # מנקים את מספר הטלפון מכל גרש או רווח לצורך התצוגה והחיפוש
-                    display_phone = str(row['Phone']).replace("'", "").strip()
-                    c1.warning(f"**{row['Full Name']}** | דירה {row['Apt']} | {display_phone}")
+        # התור ועורך הדיירים הם fragments נפרדים - אישור דייר או בחירת דייר אחר לא בונים מחדש את כל הדף
+        # (מחיקת דייר מריצה את הכל, כי היא משנה גם את התור)
+        @fragment
+        def pending_users_queue():
+            users = get_data("Users")
+        
+            pending = users[users['Status'] == STATUS_PENDING]
+            if not pending.empty:
+                st.subheader("🔔 ממתינים לאישור כניסה")
+                for _, row in pending.iterrows():
+                    with st.container(border=True):
+                        c1, c2 = st.columns([3, 1])
+                        # מנקים את מספר הטלפון מכל גרש או רווח לצורך התצוגה והחיפוש
+                        display_phone = str(row['Phone']).replace("'", "").strip()
+                        c1.warning(f"**{row['Full Name']}** | דירה {row['Apt']} | {display_phone}")
                     
-                    if c2.button("אשר דייר", key=f"u_ok_{display_phone}"):
-                        with st.spinner("מאשר משתמש..."):
-                            # אנחנו שולחים את הטלפון הנקי לחיפוש
-                            success = update_status_safe("Users", "Phone", display_phone, 6, STATUS_ACTIVE)
+                        if c2.button("אשר דייר", key=f"u_ok_{display_phone}"):
+                            with st.spinner("מאשר משתמש..."):
+                                # אנחנו שולחים את הטלפון הנקי לחיפוש
+                                success = update_status_safe("Users", "Phone", display_phone, 6, STATUS_ACTIVE)
                             
-                            if success:
-                                st.toast(f"המשתמש {row['Full Name']} אושר!")
-                                st.cache_data.clear()
-                                tm.sleep(1)
-                                st.rerun()
-                            else:
-                                # אם נכשל, ננסה שוב עם הגרש (למקרה שגוגל מחייב אותו)
-                                success_with_tick = update_status_safe("Users", "Phone", f"'{display_phone}", 6, STATUS_ACTIVE)
-                                if success_with_tick:
+                                if success:
                                     st.toast(f"המשתמש {row['Full Name']} אושר!")
-                                    st.cache_data.clear()
-                                    tm.sleep(1)
-                                    st.rerun()
+                                    rerun_fragment()
                                 else:
-                                    st.error("לא הצלחתי למצוא את המשתמש בגיליון. בדוק אם עמודת הסטטוס היא אכן מספר 6.")
+                                    # אם נכשל, ננסה שוב עם הגרש (למקרה שגוגל מחייב אותו)
+                                    success_with_tick = update_status_safe("Users", "Phone", f"'{display_phone}", 6, STATUS_ACTIVE)
+                                    if success_with_tick:
+                                        st.toast(f"המשתמש {row['Full Name']} אושר!")
+                                        rerun_fragment()
+                                    else:
+                                        st.error("לא הצלחתי למצוא את המשתמש בגיליון. בדוק אם עמודת הסטטוס היא אכן מספר 6.")
+
+        pending_users_queue()
         # if not pending.empty:
         #     st.subheader("🔔 ממתינים לאישור כניסה")
         #     for _, row in pending.iterrows():
@@ -970,89 +678,115 @@ else:
         #                 if update_status_safe("Users", "Phone", clean_phone, 6, STATUS_ACTIVE):
         #                     st.toast(f"המשתמש {row['Full Name']} אושר!")
         #                     tm.sleep(0.5)
-        #                     st.cache_data.clear()
+        #                     core.clear_cache()
         #                     st.rerun()
         #     st.divider()
 
         # עריכה ומחיקה
-        st.subheader("✏️ עריכה / מחיקת דייר")
-        
-        # יצירת לייבל לבחירה
-        users['SelectLabel'] = users['Full Name'].astype(str) + " (" + users['Phone'].astype(str) + ")"
-        user_select = st.selectbox("בחר דייר", users['SelectLabel'].tolist())
-        
-        if user_select:
-            user_to_edit = users[users['SelectLabel'] == user_select].iloc[0]
-            orig_phone = str(user_to_edit['Phone']).replace("'","")
+        @fragment
+        def user_editor():
+            st.subheader("✏️ עריכה / מחיקת דייר")
+        
+            # חיפוש באינדקס (שם / טלפון / דירה) - רק ההתאמות הראשונות נכנסות לרשימה
+            query = st.text_input("חיפוש דייר", placeholder="שם, טלפון או מספר דירה", key="user_search")
+            matches = core.search_users(query)
+            if query and not matches:
+                st.info("לא נמצאו דיירים")
+            def user_label(phone):
+                u = core.lookup_user(phone) or {}
+                return f"{u.get('Full Name', '?')} ({phone}) | דירה {u.get('Apt', '?')}"
+            user_select = st.selectbox("בחר דייר", matches, key="user_pick", format_func=user_label)
+        
+            user_to_edit = core.lookup_user(user_select) if user_select else None
+            if user_to_edit:
+                orig_phone = str(user_to_edit['Phone']).replace("'","")
             
-            with st.form("edit_user_admin"):
-                st.write(f"משתמש: **{user_to_edit['Full Name']}**")
+                with st.form("edit_user_admin"):
+                    st.write(f"משתמש: **{user_to_edit['Full Name']}**")
                 
-                c1, c2 = st.columns(2)
-                new_n = c1.text_input("שם", value=user_to_edit['Full Name'])
-                new_p = c2.text_input("טלפון", value=orig_phone)
-                c3, c4 = st.columns(2)
-                new_a = c3.text_input("דירה", value=str(user_to_edit['Apt']))
-                new_t = c4.selectbox("סוג", ["בעל דירה", "שוכר"], index=0 if user_to_edit['Type'] == "בעל דירה" else 1)
+                    c1, c2 = st.columns(2)
+                    new_n = c1.text_input("שם", value=user_to_edit['Full Name'])
+                    new_p = c2.text_input("טלפון", value=orig_phone)
+                    c3, c4 = st.columns(2)
+                    new_a = c3.text_input("דירה", value=str(user_to_edit['Apt']))
+                    new_t = c4.selectbox("סוג", ["בעל דירה", "שוכר"], index=0 if user_to_edit['Type'] == "בעל דירה" else 1)
                 
-                new_pass = st.text_input("סיסמה", value=str(user_to_edit['Password']))
+                    new_pass = st.text_input("סיסמה", value=str(user_to_edit['Password']))
                 
-                col_save, col_del = st.columns([1, 1])
+                    col_save, col_del = st.columns([1, 1])
                 
-                # כפתור שמירה (ירוק)
-                with col_save:
-                    if st.form_submit_button("💾 שמור שינויים"):
-                        if update_user_details_admin(orig_phone, new_n, new_p, new_a, new_t, new_pass):
-                            st.success("עודכן!")
-                            tm.sleep(1)
+                    # כפתור שמירה (ירוק)
+                    with col_save:
+                        if st.form_submit_button("💾 שמור שינויים"):
+                            if update_user_details_admin(orig_phone, new_n, new_p, new_a, new_t, new_pass):
+                                st.success("עודכן!")
+                                tm.sleep(1)
+                                rerun_fragment()
+                            else:
+                                st.error("שגיאה")
+
+                # כפתור מחיקה (אדום - מחוץ לטופס כדי למנוע סגירה)
+                st.markdown("---")
+                st.write("🗑️ **אזור מסוכן**")
+                with st.expander("מחיקת משתמש לצמיתות"):
+                    st.error("פעולה זו תמחק את המשתמש וגם את כל השיריונים העתידיים וההיסטוריים שלו!")
+                    if st.button("מחק את המשתמש והנתונים שלו", type="primary"):
+                        ok, msg = delete_user_fully_admin(orig_phone)
+                        if ok:
+                            st.success(msg)
+                            tm.sleep(2)
                             st.rerun()
                         else:
-                            st.error("שגיאה")
-
-            # כפתור מחיקה (אדום - מחוץ לטופס כדי למנוע סגירה)
-            st.markdown("---")
-            st.write("🗑️ **אזור מסוכן**")
-            with st.expander("מחיקת משתמש לצמיתות"):
-                st.error("פעולה זו תמחק את המשתמש וגם את כל השיריונים העתידיים וההיסטוריים שלו!")
-                if st.button("מחק את המשתמש והנתונים שלו", type="primary"):
-                    ok, msg = delete_user_fully_admin(orig_phone)
-                    if ok:
-                        st.success(msg)
-                        tm.sleep(2)
-                        st.rerun()
-                    else:
-                        st.error(msg)
+                            st.error(msg)
+
+        user_editor()
 
     # --- 5. ניהול מתקדם (חסימות וסטטיסטיקה) ---
     elif menu == "ניהול - מתקדם" and is_admin:
         st.header("🛠️ כלים מתקדמים")
+        usage = core.tenant_usage()
+        st.caption(f"🏢 {tenant['name']} | קריאות לגוגל בדקה האחרונה: {usage['calls_last_minute']}/{usage['quota_per_minute']}"
+                   f" (כל הבניינים: {usage['account_calls_last_minute']}/{usage['account_quota_per_minute']})"
+                   f" | מטמון: {usage['cache_bytes'] / 1024 / 1024:.1f}/{usage['cache_max_bytes'] / 1024 / 1024:.0f}MB"
+                   f" | שינויים שממתינים לשליחה לגוגל: {core.pending_count()}")
         
-        tab_block, tab_stats = st.tabs(["⛔ חסימת תאריכים", "📊 סטטיסטיקות"])
+        tab_block, tab_stats, tab_export, tab_audit, tab_perf = st.tabs(["⛔ חסימת תאריכים", "📊 סטטיסטיקות",
+                                                                        "📤 ייצוא נתונים", "🧾 יומן שינויים",
+                                                                        "⏱️ ביצועים"])
         
         # --- טאב חסימה ---
         with tab_block:
             st.write("כאן ניתן לחסום תאריכים לשיפוצים או תחזוקה.")
-            with st.form("block_date_form"):
-                b_date = st.date_input("תאריך לחסימה")
-                b_start = st.time_input("התחלה", time(0,0))
-                b_end = st.time_input("סיום", time(23,59))
+            with st.container(border=True):
+                resources = get_resources()
+                b_res = st.selectbox("משאב", list(resources), format_func=resources.get, key="block_res")
+                b_dates = recurrence_picker("block")
+                b_start = st.time_input("התחלה", time(0,0), key="block_start")
+                b_end = st.time_input("סיום", time(23,59), key="block_end")
                 
-                if st.form_submit_button("חסום זמן זה"):
-                    # קריאה ל-add_booking עם דגל מיוחד
-                    ok, msg = add_booking({}, b_date, b_start, b_end, is_maintenance=True)
-                    if ok: st.success("התאריך נחסם בהצלחה")
+                if st.button("חסום זמן זה", disabled=not b_dates):
+                    # כל המועדים נבדקים ונכתבים בפעולה אחת
+                    ok, msg, results = add_bookings_batch({}, b_dates, b_start, b_end, is_maintenance=True, resource=b_res)
+                    if ok: st.success(msg)
                     else: st.error(msg)
+                    show_batch_results(results)
         
         # --- טאב סטטיסטיקות ---
-        with tab_stats:
+        # הדשבורד כ-fragment - החלפת משאב מחשבת מחדש רק את הגרפים
+        @fragment
+        def stats_dashboard():
             st.subheader("📊 דשבורד שימוש וביצועים")
-            apt_stats, day_stats = get_stats_data()
+            resources = get_resources()
+            stats_res = st.selectbox("משאב", [None] + list(resources), key="stats_res",
+                                     format_func=lambda r: "הכל" if r is None else resources[r])
+            apt_stats, day_stats = get_stats_data(stats_res)
             
             if apt_stats is not None and not apt_stats.empty:
                 # 1. חישוב נתונים ל-Metrics
                 # שליפת נתוני גלם מה-DB כדי לחשב אחוזים
-                df_all = get_data("Bookings")
+                df_all = with_resource(get_data("Bookings"))
                 df_approved = df_all[df_all['Status'] == STATUS_APPROVED]
+                if stats_res: df_approved = df_approved[df_approved['Resource'] == stats_res]
                 
                 total_bookings = len(df_approved)
                 active_users = df_approved['Apt'].nunique()
@@ -1079,6 +813,18 @@ else:
                     # שימוש בגרף אופקי (Horizontal) - נראה הרבה יותר טוב לשמות/מספרי דירה
                     st.bar_chart(apt_stats.set_index('דירה'), horizontal=True, color="#3E3080")
 
+                # מפת חום: כמה מהזמן המשאב תפוס בכל יום ושעה (בסיס לכללי שימוש הוגן)
+                st.markdown("#### 🔥 ניצולת לפי יום ושעה")
+                heat = get_utilization_heatmap(stats_res)
+                import altair as alt # ייבוא עצל - מגיע עם Streamlit
+                st.altair_chart(alt.Chart(heat).mark_rect().encode(
+                    x=alt.X('שעה:O', sort=None),
+                    y=alt.Y('יום:O', sort=[WEEKDAYS_HE[d] for d in HEATMAP_DAYS]),
+                    color=alt.Color('תפוסה %:Q', scale=alt.Scale(scheme="greens")),
+                    tooltip=['יום', 'שעה', 'תפוסה %', 'דקות'],
+                ), use_container_width=True)
+                st.caption("תפוסה % = הדקות שהמשאב היה משוריין בשעה הזו, מתוך כל הפעמים שהיום הזה הופיע בתקופת הנתונים")
+
                 # 4. תוספת הנדסית: טבלת הצרכנים הכבדים (Pareto)
                 with st.expander("👁️ צפה בנתוני גלם ופילוח אחוזי"):
                     st.write("פילוח שימוש יחסי לפי דירות:")
@@ -1087,3 +833,93 @@ else:
 
             else:
                 st.info("עדיין אין מספיק נתונים מאושרים להצגת סטטיסטיקה.")
+
+        with tab_stats:
+            stats_dashboard()
+
+        # --- טאב ייצוא ---
+        with tab_export:
+            st.write("ייצוא היסטוריית שיריונים ומשתמשים לניתוח מחוץ למערכת.")
+            x_sheet = st.selectbox("גיליון", ["Bookings", "Users"], key="exp_sheet")
+            x_fmt = st.radio("פורמט", ["csv", "parquet"], horizontal=True, key="exp_fmt")
+
+            x_from = x_to = None
+            if x_sheet == "Bookings":
+                x_range = st.date_input("טווח תאריכים", value=(), key="exp_range")
+                if x_range:
+                    x_from = x_range[0]
+                    x_to = x_range[1] if len(x_range) > 1 else x_range[0]
+            x_statuses = st.multiselect("סטטוס", EXPORT_STATUSES, key="exp_status")
+            x_apt = st.text_input("דירה (ריק = הכל)", key="exp_apt")
+
+            if st.button("הכן קובץ", key="exp_run"):
+                st.session_state.pop('export_file', None)
+                with st.spinner("מייצא..."):
+                    try:
+                        path, total = export_sheet(x_sheet, x_fmt, x_from, x_to, x_statuses, x_apt)
+                        # הקובץ (שמות וטלפונים) לא נשאר בתיקייה הזמנית של השרת - רק בסשן של המנהל
+                        try:
+                            with open(path, "rb") as f: data = f.read()
+                        finally:
+                            os.remove(path)
+                        st.session_state['export_file'] = (data, f"{x_sheet}_{date.today():%Y%m%d}.{x_fmt}", total)
+                    except Exception as e:
+                        st.error(f"שגיאה בייצוא: {e}")
+
+            if 'export_file' in st.session_state:
+                data, file_name, total = st.session_state['export_file']
+                st.caption(f"{total} שורות")
+                st.download_button("⬇️ הורדה", data, file_name=file_name, key="exp_download")
+
+        # --- טאב יומן שינויים ---
+        with tab_audit:
+            st.write("כל שינוי במערכת: מי ביצע, מתי, ומה היה לפני ואחרי. היומן נשמר בשרת ולא ניתן לעריכה.")
+            a1, a2, a3 = st.columns(3)
+            q_booking = a1.text_input("מזהה שיריון", key="audit_booking")
+            q_apt = a2.text_input("דירה", key="audit_apt")
+            q_actor = a3.text_input("מבצע (שם/טלפון)", key="audit_actor")
+            q_range = st.date_input("טווח תאריכים", value=(), key="audit_range")
+            q_since = q_until = None
+            if q_range:
+                q_since = datetime.combine(q_range[0], time(0, 0)).timestamp()
+                q_until = datetime.combine((q_range[1] if len(q_range) > 1 else q_range[0]) + timedelta(days=1),
+                                           time(0, 0)).timestamp()
+
+            log_df = core.query_audit(q_booking.strip(), q_apt.strip(), q_since, q_until, q_actor.strip())
+            if log_df.empty:
+                st.info("אין שינויים שמתאימים לחיפוש")
+            else:
+                st.caption(f"{len(log_df)} שינויים אחרונים")
+                fmt_values = lambda v: ", ".join(f"{k}: {x}" for k, x in v.items()) if v else ""
+                st.dataframe(log_df.assign(
+                    ts=log_df['ts'].map(lambda t: datetime.fromtimestamp(t).strftime("%d/%m/%Y %H:%M:%S")),
+                    before=log_df['before'].map(fmt_values), after=log_df['after'].map(fmt_values),
+                ).rename(columns={'ts': 'זמן', 'actor': 'מבצע', 'sheet': 'גיליון', 'action': 'פעולה', 'item': 'מזהה',
+                                  'booking_id': 'שיריון', 'apt': 'דירה', 'before': 'לפני', 'after': 'אחרי'}),
+                    hide_index=True, use_container_width=True)
+
+        # --- טאב ביצועים (פרופיילינג) ---
+        with tab_perf:
+            st.write("הוסיפו `?profile=1` לכתובת כדי למדוד כל ריצה של הדף (רק לאדמין). כל ריצה נשמרת כקובץ pstats.")
+            profiles = core.list_profiles()
+            if not profiles:
+                st.info("עדיין אין מדידות")
+            else:
+                p_idx = st.selectbox("ריצה", range(len(profiles)), key="perf_pick", format_func=lambda i: (
+                    f"{datetime.fromtimestamp(profiles[i]['ts']):%d/%m %H:%M:%S} | {profiles[i]['page']}"
+                    f" | {profiles[i]['seconds'] * 1000:.0f}ms"))
+                p_sort = st.radio("מיון", ["cumulative", "tottime"], horizontal=True, key="perf_sort",
+                                  format_func={"cumulative": "זמן מצטבר", "tottime": "זמן עצמי"}.get)
+                prof = profiles[p_idx]
+                st.dataframe(core.hot_spots(prof['path'], p_sort).drop(columns=['module']).rename(columns={
+                    'function': 'פונקציה', 'where': 'מיקום', 'calls': 'קריאות', 'tottime': 'זמן עצמי (שניות)',
+                    'cumtime': 'זמן מצטבר (שניות)'}), hide_index=True, use_container_width=True)
+                with open(prof['path'], "rb") as f:
+                    st.download_button("⬇️ קובץ pstats (לגרף להבה ב-snakeviz)", f,
+                                       file_name=os.path.basename(prof['path']), key="perf_download")
+
+# --- באנר מצב קריאה בלבד (גוגל לא זמין - הנתונים מהעותק האחרון שנשמר) ---
+stale_at = core.stale_since()
+if stale_at:
+    status_banner.warning(f"⚠️ אין כרגע חיבור לגוגל שיטס. מוצגים נתונים מ-{datetime.fromtimestamp(stale_at):%d/%m %H:%M} "
+                          "- המערכת במצב קריאה בלבד.")
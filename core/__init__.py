@@ -0,0 +1,30 @@
+# --- ליבת המערכת: לוגיקת שיריונים ומשתמשים ללא תלות ב-Streamlit ---
+# ניתן לייבא מסקריפטים ומעבודות אצווה. תלויות כבדות (gspread, pandas, holidays...)
+# נטענות רק בפונקציות שבאמת צריכות אותן.
+from .config import (DATE_FMT, TIME_FMT, STATUS_ACTIVE, STATUS_APPROVED, STATUS_CANCELLED,
+                     STATUS_EDIT_PENDING, STATUS_PENDING, STATUS_REJECTED, STATUS_REPLACED,
+                     DEFAULT_RESOURCE, configure, get_resources, get_secret)
+from .tenants import DEFAULT_TENANT, current_tenant, get_tenant, get_tenants, use_tenant
+from .snapshots import SNAPSHOT_DIR, load_snapshot, save_snapshot
+from .sheets import (READ_ONLY_MSG, clear_cache, derived, fetch_failed, get_data, get_gspread_client,
+                     get_partition, get_worksheet, install_worksheet, read_only, stale_since, tenant_usage,
+                     update_status_safe, write_lock)
+from .notify import send_telegram
+from .journal import pending_count, tenant_lock
+from .users import (clean_phone, delete_user_fully_admin, get_user_index, login_user, register_user,
+                    reset_new_users_notifications, update_user_details_admin, verify_password)
+from .session import (SESSION_COOKIE, issue_token, needs_revalidation, revalidate_session, session_cookie_name,
+                      user_from_token, verify_token)
+from .bookings import (DAY_END_MIN, HEATMAP_DAYS, MAX_OCCURRENCES, RECUR_DATES, RECUR_RANGE, RECUR_WEEKLY,
+                       WEEKDAYS_HE, add_booking, add_bookings_batch, approve_edit_request, booking_resource,
+                       check_overlap, check_overlap_for_update, edit_existing_booking, expand_recurrence,
+                       find_free_slots, from_minutes, get_availability_index, get_booking, get_calendar_events,
+                       get_day_intervals, get_stats_data, get_utilization_heatmap, parse_minutes,
+                       request_edit_booking, resource_label, set_booking_status, to_minutes, with_resource)
+from .search import get_search_index, lookup_user, search_users
+from .export import EXPORT_STATUSES, export_sheet, filter_export_chunk, iter_sheet_chunks
+from .ical import feed_token, feed_url, feeds_enabled, get_feed, start_feed_server, verify_feed_token
+from .reminders import booking_changed, pending_reminders, start_reminders
+from .audit import AUDIT_DIR, actor_label, current_actor, query_audit, set_actor
+from .profiling import (PROFILE_DIR, hot_spots, list_profiles, profiling_active, profiling_requested,
+                        run_profiled)
@@ -0,0 +1,168 @@
+# --- יומן שינויים (audit) - רק הוספה, אף פעם לא עדכון או מחיקה ---
+# כל פעולה שנרשמת ביומן הכתיבה (שיריון, שינוי סטטוס, עריכת דייר, מחיקה) נשמרת גם כאן: מי, מתי,
+# ומה היה לפני ואחרי - רק העמודות שהשתנו. הקובץ הוא SQLite לכל בניין, עם אינדקסים לפי מזהה שיריון,
+# דירה וזמן, כך שבירור מחלוקת לא דורש סריקה של היומן או של הגיליונות.
+# טריגרים במסד חוסמים UPDATE ו-DELETE - גם מי שפותח את הקובץ ידנית לא יכול לשכתב היסטוריה.
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time as tm
+
+from .tenants import current_tenant
+
+log = logging.getLogger(__name__)
+
+AUDIT_DIR = os.environ.get("BUILDINGAPP_AUDIT", ".audit")
+SYSTEM_ACTOR = "system"
+DEFAULT_LIMIT = 200
+
+ACTION_CREATE = "create"
+ACTION_UPDATE = "update"
+ACTION_DELETE = "delete"
+REDACTED = ("Password",) # נרשם רק שהשדה השתנה, בלי הערך
+
+# מי מבצע את הפעולות בריצה הנוכחית (נקבע בתחילת כל ריצה של הסקריפט, כמו הבניין)
+_actor = contextvars.ContextVar("actor", default=None)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    actor TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    action TEXT NOT NULL,
+    item TEXT,
+    booking_id TEXT,
+    apt TEXT,
+    before TEXT,
+    after TEXT
+);
+CREATE INDEX IF NOT EXISTS audit_booking ON audit (booking_id, ts);
+CREATE INDEX IF NOT EXISTS audit_apt ON audit (apt, ts);
+CREATE INDEX IF NOT EXISTS audit_ts ON audit (ts);
+CREATE TRIGGER IF NOT EXISTS audit_no_update BEFORE UPDATE ON audit
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS audit_no_delete BEFORE DELETE ON audit
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+"""
+
+_conns = {}
+_conns_lock = threading.Lock()
+
+
+def set_actor(actor):
+    _actor.set(str(actor) if actor else None)
+
+def current_actor():
+    return _actor.get() or SYSTEM_ACTOR
+
+def actor_label(user):
+    # "שם (טלפון)" של המשתמש המחובר
+    return f"{user.get('Full Name', '?')} ({_clean(user.get('Phone', ''))})"
+
+
+def _connect(slug):
+    # חיבור אחד לכל בניין, משותף לכל הת'רדים (הכתיבות מוגנות במנעול)
+    with _conns_lock:
+        hit = _conns.get(slug)
+        if hit: return hit
+        os.makedirs(AUDIT_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(AUDIT_DIR, f"{slug}.sqlite3"), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _conns[slug] = hit = (conn, threading.Lock())
+        return hit
+
+
+def _compact(values):
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":")) if values is not None else None
+
+def _clean(value):
+    return str(value).strip().lstrip("'")
+
+def _values(pairs):
+    return {c: "***" if c in REDACTED else _clean(v) for c, v in pairs}
+
+def _changes(sheet_name, entry, df):
+    # מתרגם רשומה של יומן הכתיבה לשורות audit: (פעולה, מזהה, לפני, אחרי). df הוא המצב לפני הפעולה
+    from .journal import OP_APPEND, OP_DELETE, OP_SET
+    columns = list(df.columns)
+    k = entry["key_col"] - 1
+    key_name = columns[k] if k < len(columns) else None
+    keys = df[key_name].map(_clean) if key_name else None
+
+    def rows_for(item_id):
+        if keys is None: return []
+        return df[keys == _clean(item_id)].to_dict('records')
+
+    out = []
+    if entry["op"] == OP_APPEND:
+        for row in entry["rows"]:
+            after = _values(zip(columns, row))
+            out.append((ACTION_CREATE, row[k] if k < len(row) else None, None, after))
+    elif entry["op"] == OP_SET:
+        for item_id, cells in entry["updates"]:
+            for row in rows_for(item_id):
+                before, after = {}, {}
+                for c, v in cells:
+                    if c > len(columns): continue
+                    name = columns[c - 1]
+                    if _clean(row.get(name, "")) != _clean(v):
+                        before.update(_values([(name, row.get(name))]))
+                        after.update(_values([(name, v)]))
+                if after:
+                    # מזהה השיריון והדירה נשמרים גם כשהם לא השתנו, כדי שהאינדקס ימצא את השורה
+                    for name in ('Booking ID', 'Apt'):
+                        if name in row: before.setdefault(name, _clean(row[name]))
+                    out.append((ACTION_UPDATE, item_id, before, after))
+    elif entry["op"] == OP_DELETE:
+        for item_id in entry["ids"]:
+            for row in rows_for(item_id):
+                out.append((ACTION_DELETE, item_id, _values(row.items()), None))
+    return out
+
+def record_entry(sheet_name, entry, slug=None):
+    # נקרא מיומן הכתיבה לפני שהפעולה נכנסת לשכבה המקומית - כדי שערכי ה"לפני" יהיו נכונים
+    from .sheets import get_data
+    slug = slug or current_tenant()
+    try:
+        changes = _changes(sheet_name, entry, get_data(sheet_name))
+        if not changes: return 0
+        ts, actor = entry.get("ts") or tm.time(), current_actor()
+        rows = []
+        for action, item, before, after in changes:
+            ref = {**(before or {}), **(after or {})}
+            booking_id = _clean(ref['Booking ID']) if sheet_name == "Bookings" and ref.get('Booking ID') else None
+            apt = _clean(ref['Apt']) if ref.get('Apt') not in (None, "") else None
+            rows.append((ts, actor, sheet_name, action, _clean(item) if item is not None else None,
+                         booking_id, apt, _compact(before), _compact(after)))
+        conn, lock = _connect(slug)
+        with lock, conn:
+            conn.executemany("INSERT INTO audit (ts, actor, sheet, action, item, booking_id, apt, before, after)"
+                             " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+    except Exception as e:
+        log.warning("audit record failed for %s/%s: %s", slug, sheet_name, e)
+        return 0
+
+
+def query_audit(booking_id=None, apt=None, since=None, until=None, actor=None, limit=DEFAULT_LIMIT, slug=None):
+    # השינויים האחרונים (החדש ראשון) לפי מזהה שיריון / דירה / טווח זמנים (epoch) - כל סינון דרך אינדקס
+    import pandas as pd
+    where, args = [], []
+    if booking_id: where.append("booking_id = ?"); args.append(_clean(booking_id))
+    if apt: where.append("apt = ?"); args.append(_clean(apt))
+    if since is not None: where.append("ts >= ?"); args.append(float(since))
+    if until is not None: where.append("ts < ?"); args.append(float(until))
+    if actor: where.append("actor LIKE ?"); args.append(f"%{actor}%")
+    sql = ("SELECT ts, actor, sheet, action, item, booking_id, apt, before, after FROM audit"
+           + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ts DESC, id DESC LIMIT ?")
+    conn, lock = _connect(slug or current_tenant())
+    with lock:
+        rows = conn.execute(sql, args + [int(limit)]).fetchall()
+    rows = [r[:-2] + tuple(json.loads(v) if v else None for v in r[-2:]) for r in rows]
+    return pd.DataFrame(rows, columns=['ts', 'actor', 'sheet', 'action', 'item', 'booking_id', 'apt', 'before', 'after'])
@@ -0,0 +1,494 @@
+# --- לוגיקת שיריונים (חפיפות, שיריון, עריכה, לוח שנה וסטטיסטיקה) ---
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from . import journal, reminders
+from .config import (DATE_FMT, TIME_FMT, DEFAULT_RESOURCE, STATUS_APPROVED, STATUS_EDIT_PENDING,
+                     STATUS_PENDING, STATUS_REJECTED, STATUS_REPLACED, get_resources)
+from .notify import send_telegram
+from .sheets import READ_ONLY_MSG, derived, get_data, read_only, update_status_safe, write_lock
+
+
+# --- אינדקס זמינות לכל משאב ---
+DAY_END_MIN = 23 * 60 + 59 # 23:59 - השעה האחרונה שאפשר לבחור ב-time_input
+
+def to_minutes(t):
+    return t.hour * 60 + t.minute
+
+def from_minutes(m):
+    return time(m // 60, m % 60)
+
+def parse_minutes(time_str):
+    return to_minutes(datetime.strptime(str(time_str), TIME_FMT).time())
+
+def booking_resource(value):
+    # שורות ישנות (לפני עמודת Resource) שייכות לחדר הדיירים
+    value = str(value or "").strip()
+    return value or DEFAULT_RESOURCE
+
+def resource_label(resource):
+    return get_resources().get(resource, resource)
+
+def with_resource(df):
+    # מוסיף/מנרמל את עמודת Resource כדי שסינון לפי משאב יעבוד גם בגיליון ישן
+    df['Resource'] = df['Resource'].map(booking_resource) if 'Resource' in df.columns else DEFAULT_RESOURCE
+    return df
+
+def _build_availability_index(df):
+    index = {}
+    if df.empty: return index
+
+    active = df[df['Status'].isin([STATUS_APPROVED, STATUS_PENDING])]
+    resources = active['Resource'] if 'Resource' in active.columns else [DEFAULT_RESOURCE] * len(active)
+    for b_id, d_str, s_str, e_str, res in zip(active['Booking ID'], active['Date'], active['Start Time'],
+                                               active['End Time'], resources):
+        try:
+            s_min, e_min = parse_minutes(s_str), parse_minutes(e_str)
+        except (TypeError, ValueError):
+            continue # שורה עם שעה לא תקינה
+        index.setdefault(booking_resource(res), {}).setdefault(str(d_str), []).append((s_min, e_min, str(b_id)))
+
+    for days in index.values():
+        for intervals in days.values():
+            intervals.sort()
+    return index
+
+def get_availability_index():
+    # {משאב: {תאריך: [(התחלה, סיום, מזהה), ...]}} בדקות, ממוין לפי התחלה - רק מאושרים וממתינים
+    # נבנה פעם אחת לכל טעינה של הגיליון, כך שבדיקת חפיפה עוברת רק על אותו משאב ואותו יום
+    return derived("Bookings", "availability", _build_availability_index)
+
+def get_day_intervals(date_str, resource=DEFAULT_RESOURCE):
+    return get_availability_index().get(resource, {}).get(date_str, [])
+
+def _conflicts(intervals, new_s, new_e, ignore=()):
+    for ex_s, ex_e, b_id in intervals:
+        if ex_s >= new_e: break # ממוין לפי התחלה - אין טעם להמשיך
+        if new_s < ex_e and b_id not in ignore:
+            return True
+    return False
+
+def check_overlap(date_str, start_str, end_str, resource=DEFAULT_RESOURCE, ignore_booking_id=None):
+    ignore = {ignore_booking_id} if ignore_booking_id else ()
+    return _conflicts(get_day_intervals(date_str, resource), parse_minutes(start_str), parse_minutes(end_str), ignore)
+
+def _reject_late_overlaps(values, ids):
+    # נקרא מיומן הכתיבה אחרי ששיריונים חדשים נשלחו לגוגל, מול הגיליון העדכני. שרת אחר עם יומן משלו
+    # יכול היה לקלוט את אותה שעה - השורה שנכתבה קודם (גבוהה יותר בגיליון) מנצחת, והשיריון שלנו נדחה.
+    # כל תהליך קורא אחרי הכתיבה שלו, כך שהמאוחר מבין השניים תמיד רואה את הקודם
+    if len(values) < 2: return []
+    col = {str(h).strip(): i for i, h in enumerate(values[0])}
+    if not {'Booking ID', 'Date', 'Start Time', 'End Time', 'Status'} <= col.keys(): return []
+    def get(row, name):
+        i = col.get(name)
+        return str(row[i]).strip() if i is not None and i < len(row) else ""
+
+    taken, fixes = {}, []
+    for row in values[1:]:
+        if get(row, 'Status') not in (STATUS_APPROVED, STATUS_PENDING): continue
+        try:
+            s_min, e_min = parse_minutes(get(row, 'Start Time')), parse_minutes(get(row, 'End Time'))
+        except (TypeError, ValueError):
+            continue
+        day = taken.setdefault((booking_resource(get(row, 'Resource')), get(row, 'Date')), [])
+        b_id = get(row, 'Booking ID')
+        if b_id in ids and any(s_min < ex_e and ex_s < e_min for ex_s, ex_e in day):
+            fixes.append((b_id, {7: STATUS_REJECTED}))
+            send_telegram(f"⚠️ *שיריון נדחה - התנגשות*\nדייר: {get(row, 'Name')}\n"
+                          f"{resource_label(booking_resource(get(row, 'Resource')))}\n"
+                          f"תאריך: {get(row, 'Date')}\nשעות: {get(row, 'Start Time')}-{get(row, 'End Time')}")
+            continue
+        day.append((s_min, e_min))
+    return fixes
+
+journal.register_check("Bookings", _reject_late_overlaps)
+
+# --- איתור זמנים פנויים (לטופס השיריון המהיר) ---
+def find_free_slots(date_from, date_to, min_minutes, window_start=None, window_end=None, max_slots=50,
+                    resource=DEFAULT_RESOURCE):
+    # מחזיר רשימת (תאריך, התחלה, סיום) של חלונות פנויים באורך min_minutes לפחות
+    # מעבר אחד על השיריונים הממוינים של כל יום במשאב המבוקש
+    days_index = get_availability_index().get(resource, {})
+    win_s = to_minutes(window_start) if window_start else 0
+    win_e = to_minutes(window_end) if window_end else DAY_END_MIN
+
+    now = datetime.now()
+    slots = []
+    day = date_from
+    while day <= date_to and len(slots) < max_slots:
+        d_str = day.strftime(DATE_FMT)
+        cursor = win_s
+        if day == now.date():
+            # היום - מתחילים מהרבע שעה הקרובה
+            cursor = max(cursor, -(-(now.hour * 60 + now.minute) // 15) * 15)
+
+        for b_start, b_end, _ in days_index.get(d_str, []):
+            gap_end = min(b_start, win_e)
+            if gap_end - cursor >= min_minutes:
+                slots.append((day, from_minutes(cursor), from_minutes(gap_end)))
+            cursor = max(cursor, b_end)
+
+        if win_e - cursor >= min_minutes:
+            slots.append((day, from_minutes(cursor), from_minutes(win_e)))
+        day += timedelta(days=1)
+    return slots[:max_slots]
+
+# --- שיריונים חוזרים / מרובי תאריכים ---
+RECUR_DATES = "dates"   # רשימת תאריכים
+RECUR_RANGE = "range"   # כל יום בטווח
+RECUR_WEEKLY = "weekly" # ימים קבועים בשבוע בטווח
+MAX_OCCURRENCES = 366
+WEEKDAYS_HE = {0:'שני', 1:'שלישי', 2:'רביעי', 3:'חמישי', 4:'שישי', 5:'שבת', 6:'ראשון'}
+
+def expand_recurrence(rule):
+    # rule הוא מילון: {"type": ..., "start": date, "until": date, "weekdays": [...], "dates": [...]}
+    # מחזיר (רשימה ממוינת וללא כפילויות של תאריכים, האם נחתכה ב-MAX_OCCURRENCES)
+    kind = rule.get("type")
+    if kind == RECUR_DATES:
+        dates = set(rule.get("dates", []))
+    else:
+        start, until = rule["start"], rule.get("until", rule["start"])
+        weekdays = set(rule.get("weekdays") or [start.weekday()]) if kind == RECUR_WEEKLY else None
+        dates = set()
+        day = start
+        while day <= until and len(dates) <= MAX_OCCURRENCES: # מופע אחד מעבר לתקרה - כדי לדעת שנחתך
+            if weekdays is None or day.weekday() in weekdays:
+                dates.add(day)
+            day += timedelta(days=1)
+    return sorted(dates)[:MAX_OCCURRENCES], len(dates) > MAX_OCCURRENCES
+
+def add_bookings_batch(user_data, dates, start, end, is_maintenance=False, resource=DEFAULT_RESOURCE):
+    # שיריון של כל התאריכים בבת אחת: בדיקת חפיפה אחת ורשומה אחת ביומן הכתיבה (append_rows אחד לגוגל)
+    # מחזיר (הצלחה, הודעה, רשימת תוצאות לכל תאריך)
+    if start >= end: return False, "שעת הסיום חייבת להיות אחרי שעת ההתחלה", []
+    if not dates: return False, "לא נבחרו תאריכים", []
+
+    start_str = start.strftime(TIME_FMT)
+    end_str = end.strftime(TIME_FMT)
+    new_s, new_e = to_minutes(start), to_minutes(end)
+
+    name = "⛔ תחזוקה/חסום" if is_maintenance else user_data['Full Name']
+    status = STATUS_APPROVED if is_maintenance else STATUS_PENDING
+    apt = "0" if is_maintenance else str(user_data.get('Apt', '0'))
+    phone = "admin" if is_maintenance else str(user_data['Phone'])
+
+    # הבדיקה והרישום תחת מנעול היומן - מול המצב המקומי (כולל שיריונים שעוד לא נשלחו לגוגל),
+    # כך שאין צורך בבדיקה חוזרת ובביטול בדיעבד
+    with write_lock("Bookings"):
+        # 1. בדיקת חפיפה לכל המופעים מול אינדקס המשאב
+        days_index = get_availability_index().get(resource, {})
+        if read_only(): return False, READ_ONLY_MSG, [] # הבדיקה נעשתה מול עותק ישן
+        results, rows = [], []
+        today = date.today()
+        for d in sorted(set(dates)):
+            d_str = d.strftime(DATE_FMT)
+            if d < today:
+                results.append({"date": d, "ok": False, "msg": "התאריך כבר עבר"})
+                continue
+            if _conflicts(days_index.get(d_str, []), new_s, new_e):
+                results.append({"date": d, "ok": False, "msg": "תפוס"})
+                continue
+            b_id = str(uuid.uuid4())[:8]
+            rows.append([b_id, f"'{phone}", name, d_str, start_str, end_str, status, apt, "", resource])
+            results.append({"date": d, "ok": True, "msg": "", "id": b_id})
+
+        if not rows:
+            return False, "אף אחד מהתאריכים שנבחרו לא פנוי", results
+
+        # 2. רשומה אחת ביומן - נשלחת לגוגל ברקע
+        journal.append_rows("Bookings", rows)
+
+    ok_count = len(rows)
+    if not is_maintenance:
+        send_telegram(f"📅 *בקשה לשיריון חוזר*\nדייר: {name}\n{resource_label(resource)}\n{ok_count} תאריכים\nשעות: {start_str}-{end_str}")
+        return True, f"{ok_count} מתוך {len(results)} בקשות נשלחו למנהל המערכת לאישור.", results
+    return True, f"{ok_count} מתוך {len(results)} מועדים נחסמו בהצלחה.", results
+
+# --- פונקציה מעודכנת: הוספת שיריון עם בדיקת כפילות חכמה (Race Condition Fix) ---
+def add_booking(user_data, date_obj, start, end, is_maintenance=False, resource=DEFAULT_RESOURCE):
+    # 1. בדיקות מקדימות
+    if start >= end: return False, "שעת הסיום חייבת להיות אחרי שעת ההתחלה"
+    
+    date_str = date_obj.strftime(DATE_FMT)
+    start_str = start.strftime(TIME_FMT)
+    end_str = end.strftime(TIME_FMT)
+    
+    # הגדרת פרטים לפי סוג (תחזוקה או רגיל)
+    name = "⛔ תחזוקה/חסום" if is_maintenance else user_data['Full Name']
+    status = "approved" if is_maintenance else STATUS_PENDING
+    apt = "0" if is_maintenance else str(user_data.get('Apt', '0'))
+    phone = "admin" if is_maintenance else str(user_data['Phone'])
+
+    # 2. בדיקה ורישום תחת מנעול היומן: שני דיירים שמבקשים את אותה שעה בו-זמנית -
+    # השני כבר יראה את השיריון של הראשון, גם לפני שהגיע לגוגל
+    with write_lock("Bookings"):
+        # בדיקה בזיכרון (מהירה) - רק מול אותו משאב
+        if check_overlap(date_str, start_str, end_str, resource):
+            return False, f"{resource_label(resource)} - תפוס (או ממתין לאישור) בשעות אלו"
+        if read_only(): return False, READ_ONLY_MSG # הבדיקה נעשתה מול עותק ישן
+
+        # LinkedID ריק, ואז המשאב
+        b_id = str(uuid.uuid4())[:8]
+        row_data = [b_id, f"'{phone}", name, date_str, start_str, end_str, status, apt, "", resource]
+        journal.append_rows("Bookings", [row_data])
+
+    if not is_maintenance:
+        send_telegram(f"📅 *בקשה לשיריון*\nדייר: {name}\n{resource_label(resource)}\nתאריך: {date_str}\nשעות: {start_str}-{end_str}")
+        return True, "הבקשה נשלחה למנהל המערכת לאישור."
+    else:
+        return True, "הזמן נחסם בהצלחה."
+
+# --- פונקציה משודרגת: בדיקת חפיפה שמתעלמת משיריון ספציפי (לצורך עריכה) ---
+def check_overlap_for_update(date_str, start_str, end_str, ignore_booking_id, resource=DEFAULT_RESOURCE):
+    # מתעלמים מהשיריון שאנחנו עורכים כרגע
+    return check_overlap(date_str, start_str, end_str, resource, ignore_booking_id)
+
+def _build_booking_index(df):
+    if df.empty: return {}
+    return {str(row['Booking ID']): row for row in with_resource(df).to_dict('records')}
+
+def get_booking(booking_id):
+    # שורת שיריון לפי מזהה (אינדקס שנבנה פעם אחת לכל טעינה)
+    return derived("Bookings", "by_id", _build_booking_index).get(str(booking_id))
+
+# --- פונקציה חדשה: עדכון שיריון קיים (עריכה) ---
+def edit_existing_booking(booking_id, new_date, new_start, new_end):
+    if new_start >= new_end: return False, "שעת הסיום חייבת להיות אחרי ההתחלה"
+    
+    d_str = new_date.strftime(DATE_FMT)
+    s_str = new_start.strftime(TIME_FMT)
+    e_str = new_end.strftime(TIME_FMT)
+    
+    with write_lock("Bookings"):
+        # בדיקת חפיפה (שמתעלמת מעצמי) באותו משאב
+        booking = get_booking(booking_id)
+        if not booking: return False, "שיריון לא נמצא"
+        if check_overlap_for_update(d_str, s_str, e_str, booking_id, booking['Resource']):
+            return False, "הזמן החדש שבחרת תפוס על ידי מישהו אחר"
+        if read_only(): return False, READ_ONLY_MSG
+
+        # עדכון תאריך, התחלה, סיום (עמודות 4, 5, 6)
+        # מחזירים לסטטוס "ממתין" אחרי עריכה? לשיקולך. כאן השארתי את הסטטוס המקורי או שאפשר לשנות.
+        journal.set_cells("Bookings", [(booking_id, {4: d_str, 5: s_str, 6: e_str})])
+    reminders.booking_changed(booking_id) # השעה השתנתה - גם התזכורת
+    return True, "השיריון עודכן בהצלחה!"
+
+# --- פונקציה: דייר מבקש שינוי (יוצרת בקשה חדשה המקושרת לישנה) ---
+def request_edit_booking(user_data, original_booking_id, new_date, new_start, new_end):
+    # 1. בדיקות תקינות
+    if new_start >= new_end: return False, "שעת הסיום חייבת להיות אחרי ההתחלה"
+    
+    d_str = new_date.strftime(DATE_FMT)
+    s_str = new_start.strftime(TIME_FMT)
+    e_str = new_end.strftime(TIME_FMT)
+    
+    with write_lock("Bookings"):
+        # 2. בדיקת חפיפה (אנחנו בודקים אם *הזמן החדש* פנוי)
+        # שימו לב: אנחנו לא מתעלמים מהשיריון המקורי כי הוא בזמן אחר, 
+        # אבל אנחנו כן צריכים לוודא שהזמן החדש פנוי.
+        # המשאב נשאר כמו בשיריון המקורי
+        original = get_booking(original_booking_id)
+        resource = original['Resource'] if original else DEFAULT_RESOURCE
+        if check_overlap(d_str, s_str, e_str, resource):
+            return False, "הזמן החדש שבחרת תפוס"
+        if read_only(): return False, READ_ONLY_MSG
+
+        # 3. יצירת רשומה חדשה בסטטוס "ממתין לעריכה"
+        new_id = str(uuid.uuid4())[:8]
+        
+        # מבנה השורה: ID, Phone, Name, Date, Start, End, Status, Apt, LinkedID, Resource
+        # LinkedID הוא המזהה של השיריון הישן שאותו אנחנו רוצים להחליף
+        row_data = [
+            new_id, 
+            f"'{user_data['Phone']}", 
+            user_data['Full Name'], 
+            d_str, 
+            s_str, 
+            e_str, 
+            STATUS_EDIT_PENDING,     # סטטוס מיוחד
+            str(user_data.get('Apt', '0')),
+            original_booking_id,     # הקישור לשיריון המקורי
+            resource
+        ]
+        journal.append_rows("Bookings", [row_data])
+    
+    send_telegram(f"✏️ *בקשת עריכה*\nדייר: {user_data['Full Name']}\nרוצה לשנות לתאריך: {d_str}\nשעות: {s_str}-{e_str}")
+    return True, "בקשת השינוי נשלחה לאישור המנהל."
+
+# --- פונקציה: אדמין מאשר שינוי (מחליף בין הישן לחדש) ---
+def approve_edit_request(new_booking_id, original_booking_id):
+    # בדיקה חוזרת של הזמן החדש מול המצב המקומי, ואז רשומה אחת ביומן שמאשרת את החדש ומסמנת
+    # את הישן כ"הוחלף". הרשומה נשלחת לגוגל ב-batch_update אחד - שני השינויים יחד או אף אחד
+    with write_lock("Bookings"):
+        df = get_data("Bookings")
+        if read_only(): return False, READ_ONLY_MSG
+        if df.empty: return False, "שגיאה בטעינת השיריונים"
+        df = with_resource(df)
+
+        ids = df['Booking ID'].astype(str)
+        new_rows = df[ids == str(new_booking_id)]
+        if new_rows.empty or not (ids == str(original_booking_id)).any():
+            return False, "שגיאה במציאת השיריונים"
+        new = new_rows.iloc[0]
+        if new['Status'] != STATUS_EDIT_PENDING:
+            return False, "בקשת השינוי כבר טופלה"
+
+        # האם אושר בינתיים שיריון אחר שחופף לזמן החדש (באותו משאב, לא כולל הישן והחדש)
+        try:
+            new_s, new_e = parse_minutes(new['Start Time']), parse_minutes(new['End Time'])
+        except (TypeError, ValueError):
+            return False, "שעות לא תקינות בבקשת השינוי"
+        same_day = df[(df['Status'] == STATUS_APPROVED) & (df['Resource'] == new['Resource'])
+                      & (df['Date'] == new['Date']) & ~ids.isin([str(new_booking_id), str(original_booking_id)])]
+        for s_str, e_str in zip(same_day['Start Time'], same_day['End Time']):
+            try:
+                if new_s < parse_minutes(e_str) and parse_minutes(s_str) < new_e:
+                    return False, "הזמן החדש כבר נתפס על ידי שיריון מאושר אחר"
+            except (TypeError, ValueError):
+                continue
+
+        journal.set_cells("Bookings", [
+            (new_booking_id, {7: STATUS_APPROVED}),
+            (original_booking_id, {7: STATUS_REPLACED}),
+        ])
+    reminders.booking_changed(original_booking_id)
+    reminders.booking_changed(new_booking_id)
+    return True, "השינוי בוצע בהצלחה"
+
+# --- שינוי סטטוס של שיריון (אישור / דחייה / ביטול) ---
+def set_booking_status(booking_id, status):
+    # עמודה 7 היא הסטטוס. מעדכן גם את התזכורת (נוספת באישור, יורדת בביטול/דחייה)
+    if not update_status_safe("Bookings", "Booking ID", booking_id, 7, status):
+        return False
+    reminders.booking_changed(booking_id)
+    return True
+
+# --- פונקציה חדשה: חישוב סטטיסטיקות ---
+def get_stats_data(resource=None):
+    import pandas as pd
+    df = get_data("Bookings")
+    if df.empty: return None, None
+    
+    # סינון רק למאושרים (ולמשאב מסוים אם נבחר)
+    df = with_resource(df)
+    df = df[df['Status'] == STATUS_APPROVED]
+    if resource: df = df[df['Resource'] == resource]
+    
+    # 1. סטטיסטיקה לפי דירה
+    if 'Apt' in df.columns:
+        apt_counts = df['Apt'].value_counts().reset_index()
+        apt_counts.columns = ['דירה', 'הזמנות']
+    else:
+        apt_counts = pd.DataFrame()
+
+    # 2. סטטיסטיקה לפי יום בשבוע
+    # המרת תאריך ליום בשבוע
+    df['Datetime'] = pd.to_datetime(df['Date'], format=DATE_FMT, errors='coerce')
+    df = df.dropna(subset=['Datetime']) # מחיקת תאריכים לא תקינים
+    
+    # תרגום ימים לעברית
+    df['Day'] = df['Datetime'].dt.dayofweek.map(WEEKDAYS_HE)
+    
+    day_counts = df['Day'].value_counts().reset_index()
+    day_counts.columns = ['יום', 'הזמנות']
+    
+    return apt_counts, day_counts
+
+# --- ניצולת לפי יום בשבוע ושעה (מפת חום) ---
+HEATMAP_DAYS = [6, 0, 1, 2, 3, 4, 5] # סדר תצוגה מיום ראשון
+
+def _build_booking_minutes(df):
+    # השיריונים המאושרים כמערכים: יום בשבוע, דקת התחלה, דקת סיום ומשאב. מפוענח פעם אחת לכל טעינה
+    import numpy as np
+    import pandas as pd
+    empty = {"weekday": np.zeros(0, np.int8), "start": np.zeros(0, np.int16), "end": np.zeros(0, np.int16),
+             "resource": np.zeros(0, object), "days": pd.Series(dtype="datetime64[ns]")}
+    if df.empty: return empty
+    df = with_resource(df.copy())
+    df = df[df['Status'] == STATUS_APPROVED]
+    days = pd.to_datetime(df['Date'], format=DATE_FMT, errors='coerce')
+    start = pd.to_datetime(df['Start Time'], format=TIME_FMT, errors='coerce')
+    end = pd.to_datetime(df['End Time'], format=TIME_FMT, errors='coerce')
+    ok = (days.notna() & start.notna() & end.notna()).to_numpy()
+    if not ok.any(): return empty
+    days, start, end = days[ok], start[ok], end[ok]
+    return {
+        "weekday": days.dt.dayofweek.to_numpy(np.int8),
+        "start": (start.dt.hour * 60 + start.dt.minute).to_numpy(np.int16),
+        "end": (end.dt.hour * 60 + end.dt.minute).to_numpy(np.int16),
+        "resource": df['Resource'].to_numpy(object)[ok],
+        "days": days,
+    }
+
+def _build_utilization(df, resource):
+    import numpy as np
+    import pandas as pd
+    b = derived("Bookings", "minutes", _build_booking_minutes)
+    keep = b["resource"] == resource if resource else np.ones(len(b["start"]), bool)
+    wd, s, e = b["weekday"][keep], b["start"][keep].astype(np.int32), b["end"][keep].astype(np.int32)
+
+    # מטריצה (n, 24): כמה דקות מכל שיריון נופלות בכל שעה - חיתוך של [התחלה, סיום) עם [h, h+1)
+    hours = np.arange(24, dtype=np.int32) * 60
+    overlap = np.clip(np.minimum(e[:, None], hours + 60) - np.maximum(s[:, None], hours), 0, 60)
+    # סכום לפי (יום, שעה) בקריאה אחת ל-bincount - בלי לולאה על השורות
+    cells = (wd.astype(np.int32)[:, None] * 24 + np.arange(24)).ravel()
+    minutes = np.bincount(cells, weights=overlap.ravel(), minlength=7 * 24).astype(np.int64).reshape(7, 24)
+
+    # אחוז תפוסה: הדקות מחולקות במספר הפעמים שאותו יום בשבוע הופיע בתקופה שיש בה נתונים
+    # (ובתצוגת "הכל" - גם במספר המשאבים, כי כמה משאבים יכולים להיות תפוסים באותה שעה)
+    days = b["days"][keep]
+    if len(days):
+        span = pd.date_range(days.min(), days.max(), freq="D").dayofweek.to_numpy()
+        occurrences = np.bincount(span, minlength=7) * (1 if resource else len(set(b["resource"][keep])))
+    else:
+        occurrences = np.zeros(7, np.int64)
+    percent = np.divide(minutes * 100, occurrences[:, None] * 60, out=np.zeros((7, 24)),
+                        where=occurrences[:, None] > 0)
+
+    order = np.array(HEATMAP_DAYS)
+    return pd.DataFrame({
+        'יום': np.repeat([WEEKDAYS_HE[d] for d in HEATMAP_DAYS], 24),
+        'שעה': np.tile([f"{h:02d}:00" for h in range(24)], 7),
+        'דקות': minutes[order].ravel(),
+        'תפוסה %': percent[order].round(1).ravel(),
+    })
+
+def get_utilization_heatmap(resource=None):
+    # טבלה ארוכה (יום, שעה, דקות, תפוסה %) של השיריונים המאושרים. נבנית מחדש רק כשגיליון השיריונים משתנה
+    return derived("Bookings", ("utilization", resource), lambda df: _build_utilization(df, resource))
+
+def get_calendar_events(resource=None):
+    events = []
+    apt_colors = { "13": "#FF5733", "1": "#33FF57", "5": "#3357FF" }
+    default_color = "#3E3080"
+
+    try:
+        import holidays # ייבוא עצל - נדרש רק לבניית לוח השנה
+        for date_obj, name in holidays.IL(years=datetime.now().year).items():
+            events.append({
+                "title": f"🇮🇱 {name}", "start": str(date_obj), "end": str(date_obj),
+                "allDay": True, "backgroundColor": "#FFEB3B", "textColor": "#000000", "borderColor": "#FBC02D"
+            })
+    except: pass
+
+    df = get_data("Bookings")
+    if not df.empty:
+        df = with_resource(df)
+        approved = df[df['Status'] == STATUS_APPROVED]
+        if resource: approved = approved[approved['Resource'] == resource]
+        for _, row in approved.iterrows():
+            current_apt = str(row.get('Apt', '?'))
+            chosen_dot_color = apt_colors.get(current_apt, default_color)
+            event_title = f"דירה {current_apt}\n{row['Start Time']}-{row['End Time']}"
+            if not resource: # לוח משותף לכל המשאבים - מציינים איזה
+                event_title = f"{resource_label(row['Resource'])}\n{event_title}"
+            
+            events.append({
+                "title": event_title,
+                "start": f"{row['Date']}T{row['Start Time']}",
+                "end": f"{row['Date']}T{row['End Time']}",
+                "backgroundColor": "#FFFFFF", 
+                "borderColor": chosen_dot_color, 
+                "textColor": "#080808"
+            })
+    return events
@@ -0,0 +1,59 @@
+# --- הגדרות משותפות (ללא תלות ב-Streamlit) ---
+import os
+
+SHEET_ID = '1Uf_bLdIKz8aJAc1BV1OZvQwNP5Rzn4LqnQSuhL9htjg'
+DATE_FMT = '%Y-%m-%d'
+TIME_FMT = '%H:%M'
+STATUS_PENDING = "pending"
+STATUS_APPROVED = "approved"
+STATUS_REJECTED = "rejected"
+STATUS_ACTIVE = "active"
+STATUS_EDIT_PENDING = "pending_edit"
+STATUS_REPLACED = "replaced"
+STATUS_CANCELLED = "cancelled_by_user"
+TIMEZONE = "Asia/Jerusalem" # השעות בגיליון הן שעון ישראל, גם כשהשרת רץ ב-UTC
+
+# --- משאבים שניתן לשריין (חדר דיירים, חדר כושר, גג, חניה...) ---
+# עמודה J בגיליון Bookings (Resource). שורה בלי ערך שייכת לחדר הדיירים
+RESOURCE_COL = 10
+DEFAULT_RESOURCE = "room"
+DEFAULT_RESOURCES = {"room": "חדר דיירים", "gym": "חדר כושר", "rooftop": "גג", "parking": "חניית אורחים"}
+
+# קובץ הסודות של Streamlit - נקרא ישירות כשמריצים סקריפט בלי Streamlit
+SECRETS_PATH = os.environ.get("BUILDINGAPP_SECRETS", os.path.join(".streamlit", "secrets.toml"))
+
+_secrets = None
+
+def configure(secrets=None, sheet_id=None):
+    # האפליקציה מעבירה את st.secrets. סקריפטים יכולים להעביר מילון רגיל
+    global _secrets, SHEET_ID
+    if secrets is not None: _secrets = secrets
+    if sheet_id: SHEET_ID = sheet_id
+
+def get_secrets():
+    global _secrets
+    if _secrets is None:
+        try:
+            import tomllib
+            with open(SECRETS_PATH, "rb") as f:
+                _secrets = tomllib.load(f)
+        except (OSError, ValueError):
+            _secrets = {}
+    return _secrets
+
+def get_secret(section, key=None, default=None):
+    # st.secrets זורק חריגה כשאין קובץ סודות - מתייחסים לזה כאל "לא מוגדר"
+    try:
+        secrets = get_secrets()
+        if section not in secrets: return default
+        value = secrets[section]
+        return value if key is None else value.get(key, default)
+    except Exception:
+        return default
+
+def get_resources():
+    # ניתן להגדיר בסודות:  [resources]  room = "חדר דיירים"  gym = "חדר כושר" ...
+    # או לכל בניין בנפרד:  [tenants.<slug>.resources]
+    from .tenants import get_tenant
+    configured = get_tenant().get("resources") or get_secret("resources")
+    return dict(configured) if configured else dict(DEFAULT_RESOURCES)
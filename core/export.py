@@ -0,0 +1,90 @@
+# --- ייצוא היסטוריה (CSV / Parquet) בחלקים ---
+import os
+import tempfile
+
+from .config import (DATE_FMT, STATUS_ACTIVE, STATUS_APPROVED, STATUS_CANCELLED, STATUS_EDIT_PENDING,
+                     STATUS_PENDING, STATUS_REJECTED, STATUS_REPLACED)
+from .sheets import get_worksheet
+
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_EXCLUDE_COLS = {"Password"} # לא מייצאים סיסמאות
+EXPORT_STATUSES = [STATUS_PENDING, STATUS_APPROVED, STATUS_REJECTED, STATUS_EDIT_PENDING,
+                   STATUS_REPLACED, STATUS_CANCELLED, STATUS_ACTIVE]
+
+def iter_sheet_chunks(sheet_name, chunk_rows=EXPORT_CHUNK_ROWS):
+    # קריאה ישירה מגוגל בחלקים (ולא דרך get_data) כדי שהזיכרון יישאר חסום גם בארכיון גדול
+    import pandas as pd
+    from gspread.utils import rowcol_to_a1
+
+    ws = get_worksheet(sheet_name)
+    headers = [str(h).strip() for h in ws.row_values(1)]
+    if not headers: return
+    last_col = rowcol_to_a1(1, len(headers))[:-1] # "I1" -> "I"
+
+    row = 2
+    while True:
+        values = ws.get(f"A{row}:{last_col}{row + chunk_rows - 1}")
+        if not values:
+            if row == 2: yield pd.DataFrame(columns=headers) # גיליון ללא נתונים - רק כותרות
+            break
+        # גוגל חותך תאים ריקים בסוף שורה - משלימים לאורך הכותרות
+        values = [list(r) + [""] * (len(headers) - len(r)) for r in values]
+        yield pd.DataFrame(values, columns=headers)
+        if len(values) < chunk_rows: break
+        row += chunk_rows
+
+def filter_export_chunk(df, date_from=None, date_to=None, statuses=None, apt=None):
+    import pandas as pd
+    mask = pd.Series(True, index=df.index)
+    if 'Date' in df.columns:
+        # תאריכים בפורמט ISO - השוואת מחרוזות מספיקה
+        if date_from: mask &= df['Date'] >= date_from.strftime(DATE_FMT)
+        if date_to: mask &= df['Date'] <= date_to.strftime(DATE_FMT)
+    if statuses and 'Status' in df.columns:
+        mask &= df['Status'].isin(statuses)
+    if apt and 'Apt' in df.columns:
+        mask &= df['Apt'].astype(str).str.strip() == str(apt).strip()
+    return df.loc[mask, [c for c in df.columns if c not in EXPORT_EXCLUDE_COLS]]
+
+def export_sheet(sheet_name, fmt, date_from=None, date_to=None, statuses=None, apt=None):
+    # כותב את הנתונים המסוננים לקובץ זמני חלק אחרי חלק. מחזיר (נתיב, מספר שורות) - הקורא מוחק את הקובץ.
+    # אם הייצוא נכשל באמצע הקובץ נמחק כאן
+    with tempfile.NamedTemporaryFile(prefix=f"{sheet_name}_", suffix=f".{fmt}", delete=False) as tmp:
+        path = tmp.name
+    try:
+        return path, _write_export(path, sheet_name, fmt, date_from, date_to, statuses, apt)
+    except BaseException:
+        os.remove(path)
+        raise
+
+def _write_export(path, sheet_name, fmt, date_from, date_to, statuses, apt):
+    chunks = (filter_export_chunk(c, date_from, date_to, statuses, apt) for c in iter_sheet_chunks(sheet_name))
+    total = 0
+
+    if fmt == "csv":
+        # utf-8-sig כדי שאקסל יציג עברית כמו שצריך
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, header=(i == 0), index=False)
+                total += len(chunk)
+        return total
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for chunk in chunks:
+            # כל העמודות בגיליון הן טקסט - סכמה קבועה גם לחלקים ריקים
+            schema = pa.schema([(c, pa.string()) for c in chunk.columns])
+            if writer is None:
+                # נפתח כבר בחלק הראשון, גם כשהוא ריק - גיליון עם כותרות בלבד נותן קובץ עם העמודות
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            if not chunk.empty:
+                writer.write_table(pa.Table.from_pandas(chunk.astype(str), schema=schema, preserve_index=False))
+                total += len(chunk)
+    finally:
+        if writer is not None: writer.close()
+    if writer is None:
+        # גיליון בלי כותרות - בכל זאת קובץ Parquet תקין (טבלה ריקה), לא קובץ של 0 בתים
+        pq.write_table(pa.table({}), path)
+    return total
@@ -0,0 +1,226 @@
+# --- פיד iCalendar (.ics) של השיריונים המאושרים והחגים ---
+# לוח השנה בטלפון נרשם לכתובת קבועה ומושך ממנה מדי פעם - בלי להריץ את Streamlit ובלי לקרוא מגוגל
+# בכל פעם. הפיד נבנה מהמטמון (או מהעותק שעל הדיסק) ונבנה מחדש רק כשגיליון השיריונים משתנה.
+# כל פיד מוגן בטוקן חתום: לדירה אחת, או לכל הבניין.
+# הפיד פועל רק כשמוגדרים גם ical_base_url וגם session_secret: בלי כתובת ציבורית הטלפון לא יגיע לשרת,
+# ובלי מפתח קבוע הקישורים היו מפסיקים לעבוד בכל הפעלה מחדש.
+#   [general]
+#   ical_port = 8502                                   # הפורט של שרת הפיד
+#   ical_host = "127.0.0.1"                            # הכתובת שהשרת מאזין לה
+#   ical_base_url = "https://calendar.example.org"     # הכתובת הציבורית שמפנה לפורט הזה
+#   ical_feed_version = 1                              # העלאה במספר מבטלת את כל הקישורים שחולקו
+import hashlib
+import logging
+import threading
+import time as tm
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+from . import config
+from .config import DATE_FMT, STATUS_APPROVED, TIME_FMT, TIMEZONE
+from .session import secret_configured, sign, unsign
+from .sheets import derived
+from .tenants import current_tenant, get_tenant, use_tenant
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8502
+DEFAULT_HOST = "127.0.0.1" # מאחורי ה-proxy של ical_base_url
+FEED_PATH = "/calendar.ics"
+ALL_APTS = "*"
+TZID = TIMEZONE
+CACHE_MAX_AGE = 300 # כמו DATA_TTL - אין טעם למשוך לפני שהמטמון מתחלף
+
+_feeds = {}  # (slug, apt) -> (etag, body, last_modified) - כדי שה-ETag לא ישתנה כשהתוכן זהה
+_feeds_lock = threading.Lock()
+_server = None
+
+
+# --- טוקן לפיד ---
+def feeds_enabled():
+    return bool(config.get_secret("general", "ical_base_url")) and secret_configured()
+
+def _feed_version():
+    return str(config.get_secret("general", "ical_feed_version", 1))
+
+def feed_token(apt=None):
+    # בלי תאריך תפוגה: לוחות שנה נרשמים לכתובת לתמיד. העלאת ical_feed_version (או החלפת
+    # session_secret) מבטלת את כל הקישורים. בלי session_secret קבוע לא מנפיקים טוקן - None
+    if not secret_configured(): return None
+    return sign({"tid": current_tenant(), "feed": str(apt) if apt else ALL_APTS, "v": _feed_version()})
+
+def verify_feed_token(token):
+    # מחזיר (בניין, דירה או None לכל הבניין), או None אם הטוקן לא תקין
+    if not secret_configured(): return None
+    payload = unsign(token) if token else None
+    if not payload or "feed" not in payload or str(payload.get("v")) != _feed_version(): return None
+    apt = payload["feed"]
+    return payload.get("tid"), (None if apt == ALL_APTS else apt)
+
+def feed_url(apt=None):
+    # None כשהפיד לא מוגדר - קישור ל-localhost לא נפתח בטלפון
+    if not feeds_enabled(): return None
+    base = config.get_secret("general", "ical_base_url")
+    return f"{str(base).rstrip('/')}{FEED_PATH}?t={feed_token(apt)}"
+
+
+# --- בניית הקובץ ---
+def _escape(text):
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def _fold(line):
+    # שורות ארוכות מ-75 בתים נשברות (RFC 5545), בלי לחתוך תו עברי באמצע
+    out, cur = [], ""
+    for ch in line:
+        if len((cur + ch).encode("utf-8")) > (75 if not out else 74):
+            out.append(cur)
+            cur = ""
+        cur += ch
+    out.append(cur)
+    return "\r\n ".join(out)
+
+def _utc(date_str, time_str):
+    # שעון ישראל מהגיליון -> UTC עם Z. בלי רכיב VTIMEZONE, TZID לבד לא מחייב את הלקוח (RFC 5545),
+    # וחלק מהלוחות היו מציגים את השיריון בשעון המכשיר
+    local = datetime.strptime(f"{date_str} {time_str}", f"{DATE_FMT} {TIME_FMT}").replace(tzinfo=ZoneInfo(TIMEZONE))
+    return local.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+def _events(df, apt, slug):
+    from .bookings import resource_label, with_resource
+    lines = []
+    if not df.empty:
+        df = with_resource(df)
+        approved = df[df['Status'] == STATUS_APPROVED]
+        if apt: approved = approved[approved['Apt'].astype(str).str.strip() == str(apt)]
+        for row in approved.sort_values(['Date', 'Start Time']).to_dict('records'):
+            try:
+                start, end = _utc(row['Date'], row['Start Time']), _utc(row['Date'], row['End Time'])
+            except (TypeError, ValueError):
+                continue # שורה עם תאריך/שעה לא תקינים
+            summary = f"{resource_label(row['Resource'])} - דירה {row.get('Apt', '?')}"
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{row['Booking ID']}@{slug}.buildingapp",
+                f"DTSTART:{start}",
+                f"DTEND:{end}",
+                f"SUMMARY:{_escape(summary)}",
+                "END:VEVENT",
+            ]
+
+    try:
+        import holidays # ייבוא עצל - כמו בלוח השנה שבאפליקציה
+        year = datetime.now().year
+        for day, name in sorted(holidays.IL(years=[year, year + 1]).items()):
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:holiday-{day:%Y%m%d}@{slug}.buildingapp",
+                f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+                f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+                f"SUMMARY:{_escape(f'🇮🇱 {name}')}",
+                "TRANSP:TRANSPARENT",
+                "END:VEVENT",
+            ]
+    except Exception: pass
+    return lines
+
+def _build_feed(df, apt):
+    slug = current_tenant()
+    events = _events(df, apt, slug)
+    etag = '"' + hashlib.sha256("\n".join(events).encode("utf-8")).hexdigest()[:32] + '"'
+    with _feeds_lock:
+        prev = _feeds.get((slug, apt))
+    if prev and prev[0] == etag:
+        return prev # הגיליון נטען מחדש אבל השיריונים לא השתנו - אותו ETag ואותו Last-Modified
+
+    now = tm.time()
+    stamp = tm.strftime("%Y%m%dT%H%M%SZ", tm.gmtime(now))
+    name = get_tenant()['name'] + (f" - דירה {apt}" if apt else "")
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//BuildingApp//Bookings//HE", "CALSCALE:GREGORIAN",
+             "METHOD:PUBLISH", f"X-WR-CALNAME:{_escape(name)}", f"X-WR-TIMEZONE:{TZID}",
+             "REFRESH-INTERVAL;VALUE=DURATION:PT1H"]
+    for line in events:
+        lines.append(line)
+        if line.startswith("UID:"): lines.append(f"DTSTAMP:{stamp}")
+    lines.append("END:VCALENDAR")
+    body = ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode("utf-8")
+
+    feed = (etag, body, now)
+    with _feeds_lock:
+        _feeds[(slug, apt)] = feed
+    return feed
+
+def get_feed(apt=None):
+    # (etag, תוכן, זמן שינוי אחרון). נבנה מחדש רק כשגרסת גיליון השיריונים עולה
+    apt = str(apt).strip() if apt else None
+    return derived("Bookings", ("ics", apt), lambda df: _build_feed(df, apt))
+
+
+# --- שרת HTTP קטן לפיד ---
+class _FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != FEED_PATH:
+            return self.send_error(404)
+        target = verify_feed_token(parse_qs(url.query).get("t", [""])[0])
+        if not target or not use_tenant(target[0]):
+            return self.send_error(403)
+
+        try:
+            etag, body, last_modified = get_feed(target[1])
+        except Exception as e:
+            log.warning("ical feed failed: %s", e)
+            return self.send_error(503)
+
+        if self._not_modified(etag, last_modified):
+            self.send_response(304)
+            self._headers(etag, last_modified)
+            return self.end_headers()
+        self.send_response(200)
+        self._headers(etag, last_modified)
+        self.send_header("Content-Type", "text/calendar; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag, last_modified):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+        since = self.headers.get("If-Modified-Since")
+        if since:
+            try:
+                return int(last_modified) <= parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _headers(self, etag, last_modified):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(last_modified, usegmt=True))
+        self.send_header("Cache-Control", f"private, max-age={CACHE_MAX_AGE}")
+
+    def log_message(self, fmt, *args):
+        log.debug("ical %s - " + fmt, self.address_string(), *args)
+
+def start_feed_server(port=None, host=None):
+    # מופעל פעם אחת לתהליך (מהאפליקציה דרך st.cache_resource). מחזיר את השרת, או None אם הפורט תפוס
+    # או שהפיד לא מוגדר
+    global _server
+    if _server is None:
+        if not feeds_enabled():
+            log.info("ical feed server not started: ical_base_url and session_secret are required")
+            return None
+        port = int(port or config.get_secret("general", "ical_port", DEFAULT_PORT))
+        host = host or config.get_secret("general", "ical_host", DEFAULT_HOST)
+        try:
+            _server = ThreadingHTTPServer((host, port), _FeedHandler)
+        except OSError as e:
+            log.warning("ical feed server not started on port %s: %s", port, e)
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="ical-feed", daemon=True).start()
+    return _server
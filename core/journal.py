@@ -0,0 +1,335 @@
+# --- יומן כתיבה מקומי (write-behind) ---
+# כל שינוי נרשם קודם לקובץ JSONL מקומי (append + fsync) ורק אחר כך נשלח לגוגל ברקע.
+# המשתמש מקבל אישור מיד, וכל הקריאות רואות את השינויים שעדיין לא נשלחו (שכבה מעל הגיליון).
+# ת'רד רקע אוסף את הרשומות הממתינות לכל גיליון ל-append_rows אחד ו-batch_update אחד.
+# הפעולות מזוהות לפי מזהה (Booking ID / טלפון) ולא לפי מספר שורה, כך שהרצה חוזרת אחרי
+# קריסה (מהמיקום שנשמר בקובץ offset) לא מכפילה שורות.
+# המנעול של היומן שייך לתהליך אחד. כשכמה תהליכים (שרתים) כותבים לאותו גיליון, כל אחד עם יומן משלו,
+# בדיקה שנרשמה ב-register_check רצה מול הגיליון העדכני אחרי כל שליחה ומתקנת את מה שהפסיד.
+import json
+import logging
+import os
+import threading
+import time as tm
+
+from .tenants import current_tenant, use_tenant
+
+log = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.environ.get("BUILDINGAPP_JOURNAL", ".journal")
+FLUSH_INTERVAL = 2   # שניות - מאגדים את מה שהצטבר בחלון הזה לכתיבה אחת
+MAX_BACKOFF = 60     # בתקלה בגוגל: ניסיון חוזר אחרי 2, 4, 8... עד 60 שניות
+
+OP_APPEND = "append"
+OP_SET = "set"
+OP_DELETE = "delete"
+
+_states = {}
+_states_lock = threading.Lock()
+_checks = {}  # sheet_name -> בדיקה אחרי שליחה (register_check)
+_wake = threading.Condition()
+_flusher = None
+
+
+def _key(value):
+    # טלפונים נשמרים לפעמים עם גרש בתחילתם
+    return str(value).strip().lstrip("'")
+
+def _cell(value, user_entered):
+    # ב-USER_ENTERED גוגל מסיר את הגרש שמסמן "טקסט" - השכבה המקומית מתנהגת אותו דבר
+    value = str(value)
+    return value[1:] if user_entered and value.startswith("'") else value
+
+def _paths(slug):
+    base = os.path.join(JOURNAL_DIR, slug)
+    return os.path.join(base, "journal.jsonl"), os.path.join(base, "journal.offset")
+
+
+class _TenantJournal:
+    # היומן של בניין אחד: הרשומות שעדיין לא נשלחו לגוגל והמיקום בקובץ עד אליו הכל נשלח
+    def __init__(self, slug):
+        self.slug = slug
+        self.path, self.offset_path = _paths(slug)
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock() # שליחה אחת בכל פעם (ת'רד הרקע או קריאה ידנית)
+        self.pending = []   # [(מיקום סוף הרשומה בקובץ, רשומה)]
+        self.committed = 0
+        self.failures = 0
+        self.retry_at = 0
+        self._load()
+
+    def _load(self):
+        # שחזור אחרי הפעלה מחדש: כל מה שאחרי ה-offset עוד לא הגיע לגוגל
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            with open(self.offset_path, encoding="utf-8") as f:
+                self.committed = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self.committed = 0
+        if not os.path.exists(self.path): return
+        with open(self.path, "rb") as f:
+            if self.committed > os.path.getsize(self.path): self.committed = 0
+            f.seek(self.committed)
+            pos = self.committed
+            for line in f:
+                if not line.endswith(b"\n"): break # שורה חלקית מקריסה באמצע כתיבה
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                pos += len(line)
+                self.pending.append((pos, entry))
+        if os.path.getsize(self.path) > pos:
+            with open(self.path, "r+b") as f:
+                f.truncate(pos)
+
+    def append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self.lock:
+            with open(self.path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                end = f.tell()
+            self.pending.append((end, entry))
+
+    def commit(self, count):
+        # count הרשומות הראשונות נשלחו לגוגל - מקדמים את ה-offset (ומאפסים את הקובץ כשאין יותר ממתינות)
+        with self.lock:
+            end = self.pending[count - 1][0]
+            del self.pending[:count]
+            if not self.pending:
+                with open(self.path, "r+b") as f:
+                    f.truncate(0)
+                end = 0
+            tmp = self.offset_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(str(end))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.offset_path)
+            self.committed = end
+
+
+def _state(slug=None):
+    slug = slug or current_tenant()
+    state = _states.get(slug)
+    if state is None:
+        with _states_lock:
+            state = _states.get(slug)
+            if state is None:
+                state = _states[slug] = _TenantJournal(slug)
+                if state.pending: start_flusher() # נשארו רשומות מלפני הפעלה מחדש
+    return state
+
+def tenant_lock(slug=None):
+    # כל בדיקת זמינות + רישום נעשים תחת המנעול הזה, כך ששני דיירים לא יתפסו את אותו זמן.
+    # המנעול הוא בתוך התהליך בלבד - בין תהליכים מגינה הבדיקה שאחרי השליחה (register_check)
+    return _state(slug).lock
+
+def register_check(sheet_name, check):
+    # check(values, ids) נקרא אחרי ששורות חדשות נשלחו לגיליון: values הוא תוכן הגיליון העדכני
+    # (כולל כותרות), ids המזהים של השורות שהיומן הזה הוסיף. מחזיר [(מזהה, {מספר עמודה: ערך})]
+    # של תיקונים - הם נכתבים מיד ונרשמים ביומן השינויים
+    _checks[sheet_name] = check
+
+def pending_count(slug=None):
+    return len(_state(slug).pending)
+
+
+def record(sheet_name, op, key_col, **fields):
+    # רישום פעולה ביומן. המטמון הנגזר (אינדקסים) נבנה מחדש כי מספר הגרסה של הגיליון עולה
+    from . import audit
+    from .sheets import get_partition
+    slug = current_tenant()
+    entry = dict(fields, sheet=sheet_name, op=op, key_col=key_col, ts=tm.time())
+    audit.record_entry(sheet_name, entry, slug) # לפני שהשינוי נכנס לשכבה המקומית - בשביל ערכי ה"לפני"
+    _state(slug).append(entry)
+    get_partition(slug).bump(sheet_name)
+    start_flusher()
+
+def append_rows(sheet_name, rows, key_col=1, **opts):
+    record(sheet_name, OP_APPEND, key_col, rows=[list(r) for r in rows], opts=opts)
+
+def set_cells(sheet_name, updates, key_col=1):
+    # updates: [(מזהה, {מספר עמודה: ערך}), ...] - נכתב ב-batch_update אחד
+    record(sheet_name, OP_SET, key_col,
+           updates=[[str(item_id), [[int(c), v] for c, v in cells.items()]] for item_id, cells in updates])
+
+def delete_rows(sheet_name, ids, key_col=1):
+    # מוחק את כל השורות שהמזהה שלהן (בעמודה key_col) ברשימה
+    record(sheet_name, OP_DELETE, key_col, ids=[str(i) for i in ids])
+
+
+def apply_pending(sheet_name, df, slug=None):
+    # מחזיר עותק של הגיליון עם כל השינויים שעוד לא נשלחו לגוגל
+    state = _state(slug)
+    with state.lock:
+        entries = [e for _, e in state.pending if e["sheet"] == sheet_name]
+    if not entries or df.columns.empty:
+        return df.copy()
+
+    import pandas as pd
+    columns = list(df.columns)
+    rows = [list(r) for r in df.itertuples(index=False, name=None)]
+    for e in entries:
+        k = e["key_col"] - 1
+        if e["op"] == OP_APPEND:
+            user_entered = (e.get("opts") or {}).get("value_input_option") == "USER_ENTERED"
+            existing = {_key(r[k]) for r in rows}
+            for row in e["rows"]:
+                if _key(row[k]) in existing: continue # כבר הגיע לגיליון
+                row = [_cell(v, user_entered) for v in row[:len(columns)]]
+                rows.append(row + [""] * (len(columns) - len(row)))
+        elif e["op"] == OP_SET:
+            for item_id, cells in e["updates"]:
+                for r in rows:
+                    if _key(r[k]) != _key(item_id): continue
+                    for c, v in cells:
+                        if c <= len(columns): r[c - 1] = _cell(v, True)
+        elif e["op"] == OP_DELETE:
+            ids = {_key(i) for i in e["ids"]}
+            rows = [r for r in rows if _key(r[k]) not in ids]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def _flush_sheet(sheet_name, entries):
+    from .sheets import get_worksheet
+
+    ws = get_worksheet(sheet_name)
+
+    # הרשומות נשלחות בסדר שבו נרשמו - רק רצף של פעולות מאותו סוג מאוחד לקריאה אחת. כך מחיקה של
+    # דייר ואחריה הרשמה מחדש עם אותו טלפון (או העברת טלפון ואחריה הרשמה עם הישן) לא מתהפכות
+    runs = []
+    for e in entries:
+        if runs and runs[-1][0] == e["op"]: runs[-1][1].append(e)
+        else: runs.append((e["op"], [e]))
+    for op, run in runs:
+        if op == OP_APPEND: _flush_appends(ws, run)
+        else: _flush_updates(ws, run)
+
+    # בדיקה מול הגיליון כפי שהוא עכשיו - תהליך אחר עם יומן משלו יכול היה להוסיף שורה מתנגשת
+    appends = [e for e in entries if e["op"] == OP_APPEND]
+    if sheet_name in _checks and appends:
+        _check_sheet(ws, sheet_name, appends)
+
+def _flush_appends(ws, entries):
+    # שורות חדשות - רק כאלה שעוד לא בגיליון (הרצה חוזרת אחרי קריסה)
+    existing, groups = {}, {}
+    for e in entries:
+        k = e["key_col"]
+        if k not in existing:
+            existing[k] = {_key(v) for v in ws.col_values(k)}
+        opts = json.dumps(e.get("opts") or {}, sort_keys=True)
+        for row in e["rows"]:
+            if _key(row[k - 1]) in existing[k]: continue
+            existing[k].add(_key(row[k - 1]))
+            groups.setdefault(opts, []).append(row)
+    for opts, rows in groups.items():
+        ws.append_rows(rows, **json.loads(opts))
+
+def _flush_updates(ws, entries):
+    # עדכוני תאים או מחיקות לפי מזהה - מספרי השורות נקבעים מקריאה טרייה של עמודת המזהה
+    from gspread.utils import rowcol_to_a1
+    row_maps = {} # עמודת מזהה -> {מזהה: [מספרי שורות]}
+    def rows_of(k):
+        if k not in row_maps:
+            row_maps[k] = {}
+            for i, v in enumerate(ws.col_values(k)[1:], start=2):
+                row_maps[k].setdefault(_key(v), []).append(i)
+        return row_maps[k]
+
+    cells, doomed = {}, set()
+    for e in entries:
+        if e["op"] == OP_SET:
+            row_of = rows_of(e["key_col"])
+            for item_id, updates in e["updates"]:
+                rows = list(row_of.get(_key(item_id), []))
+                for c, v in updates:
+                    for r in rows:
+                        cells[(r, c)] = v
+                    if c in row_maps and rows: # המזהה עצמו השתנה (למשל טלפון)
+                        for ids in row_maps[c].values():
+                            ids[:] = [r for r in ids if r not in rows]
+                        row_maps[c].setdefault(_key(v), []).extend(rows)
+        elif e["op"] == OP_DELETE:
+            row_of = rows_of(e["key_col"])
+            for item_id in e["ids"]:
+                doomed.update(row_of.get(_key(item_id), []))
+
+    if cells:
+        ws.batch_update([{'range': rowcol_to_a1(r, c), 'values': [[v]]} for (r, c), v in cells.items()],
+                        value_input_option='USER_ENTERED')
+    # מחיקה מלמטה למעלה, רצף שורות בקריאה אחת, כדי שמספרי השורות לא יזוזו תוך כדי
+    doomed = sorted(doomed, reverse=True)
+    while doomed:
+        end = start = doomed.pop(0)
+        while doomed and doomed[0] == start - 1:
+            start = doomed.pop(0)
+        ws.delete_rows(start, end)
+
+def _check_sheet(ws, sheet_name, appends):
+    from gspread.utils import rowcol_to_a1
+    from . import audit
+    k = appends[0]["key_col"]
+    ids = {_key(row[k - 1]) for e in appends for row in e["rows"]}
+    values = ws.get_all_values()
+    fixes = _checks[sheet_name](values, ids)
+    if not fixes: return
+    row_of = {_key(r[k - 1]): i for i, r in enumerate(values[1:], start=2) if len(r) >= k}
+    fixes = [(item_id, cells) for item_id, cells in fixes if _key(item_id) in row_of]
+    if not fixes: return
+    log.warning("journal check for %s/%s changed %d rows", current_tenant(), sheet_name, len(fixes))
+    audit.record_entry(sheet_name, {"op": OP_SET, "key_col": k, "ts": tm.time(),
+                                    "updates": [[str(i), [[int(c), v] for c, v in cells.items()]] for i, cells in fixes]})
+    ws.batch_update([{'range': rowcol_to_a1(row_of[_key(item_id)], c), 'values': [[v]]}
+                     for item_id, cells in fixes for c, v in cells.items()], value_input_option='USER_ENTERED')
+
+def flush(slug=None):
+    # שולח לגוגל את כל מה שממתין ביומן של הבניין. מחזיר True אם הכל נשלח
+    state = _state(slug)
+    with state.flush_lock:
+        return _flush_locked(state)
+
+def _flush_locked(state):
+    with state.lock:
+        batch = [e for _, e in state.pending]
+    if not batch: return True
+
+    from .sheets import refresh
+    use_tenant(state.slug)
+    sheets = list(dict.fromkeys(e["sheet"] for e in batch))
+    try:
+        for sheet_name in sheets:
+            _flush_sheet(sheet_name, [e for e in batch if e["sheet"] == sheet_name])
+        # קוראים מחדש את הגיליונות שהשתנו, ורק אז מסמנים את הרשומות כנשלחו - כך אין רגע
+        # שבו השינוי לא מופיע לא במטמון ולא ביומן
+        for sheet_name in sheets:
+            refresh(sheet_name)
+    except Exception as e:
+        state.failures += 1
+        state.retry_at = tm.monotonic() + min(MAX_BACKOFF, FLUSH_INTERVAL * 2 ** state.failures)
+        log.warning("journal flush failed for %s (%d pending): %s", state.slug, len(batch), e)
+        return False
+
+    state.commit(len(batch))
+    state.failures, state.retry_at = 0, 0
+    return True
+
+
+def _flush_loop():
+    while True:
+        with _wake:
+            _wake.wait(FLUSH_INTERVAL)
+        tm.sleep(FLUSH_INTERVAL / 4) # עוד רגע קצר כדי לאגד פעולות שהגיעו יחד
+        for state in list(_states.values()):
+            if state.pending and tm.monotonic() >= state.retry_at:
+                flush(state.slug)
+
+def start_flusher():
+    global _flusher
+    with _wake:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="journal-flusher", daemon=True)
+            _flusher.start()
+        _wake.notify()
@@ -0,0 +1,245 @@
+# --- בדיקת עומס: הרבה דיירים מנסים לשריין את אותו ערב בו-זמנית ---
+# מריצים מול גיליון מדומה בזיכרון (עם השהייה מלאכותית כמו של גוגל), לא מול הגיליון האמיתי:
+#   python -m core.loadtest --sessions 50 --attempts 4 --latency-ms 300 --servers 3
+# הדיירים מתחלקים בין כמה "שרתים" - לכל אחד יומן, מנעול ומטמון משלו (כמו תהליכים נפרדים),
+# וכולם כותבים לאותו גיליון. כך שיריון כפול נמנע רק בזכות הבדיקה שאחרי השליחה, לא בזכות המנעול.
+# בסוף מודפסים זמני תגובה (p50/p95/p99), תפוקה, מספר שיריונים כפולים וכמה קריאות לגוגל נדרשו.
+import argparse
+import random
+import statistics
+import tempfile
+import threading
+import time as tm
+from collections import Counter
+from datetime import date, time, timedelta
+
+from . import audit, config, journal, snapshots
+from .config import DEFAULT_RESOURCE, STATUS_APPROVED, STATUS_PENDING, STATUS_REJECTED
+from .sheets import READ_ONLY_MSG, get_partition, install_worksheet
+from .tenants import use_tenant
+
+LOADTEST_TENANT = "loadtest"
+BOOKINGS_HEADERS = ['Booking ID', 'Phone', 'Name', 'Date', 'Start Time', 'End Time', 'Status', 'Apt',
+                    'LinkedID', 'Resource']
+USERS_HEADERS = ['Full Name', 'Phone', 'Apt', 'Type', 'Password', 'Status', 'Role', 'Is_New']
+
+
+class FakeWorksheet:
+    # גיליון בזיכרון עם אותו ממשק של gspread, השהייה לכל קריאה ושגיאות אקראיות (כמו 429 של גוגל)
+    def __init__(self, headers, latency_ms=300, jitter=0.5, error_rate=0.0, rng=None):
+        self.rows = [list(headers)]
+        self.latency = latency_ms / 1000
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+        self.calls = Counter()
+        self.call_times = []
+        self.lock = threading.Lock()
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+            self.call_times.append(tm.monotonic())
+            delay = self.latency * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+            fail = self.rng.random() < self.error_rate
+        tm.sleep(max(0.0, delay))
+        if fail: raise RuntimeError("simulated quota error (429)")
+
+    @staticmethod
+    def _value(v, user_entered):
+        v = str(v)
+        return v[1:] if user_entered and v.startswith("'") else v
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        with self.lock:
+            width = len(self.rows[0])
+            return [list(r) + [""] * (width - len(r)) for r in self.rows]
+
+    def col_values(self, col):
+        self._call("col_values")
+        with self.lock:
+            return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    def append_rows(self, rows, value_input_option="RAW", **kwargs):
+        self._call("append_rows")
+        with self.lock:
+            self.rows.extend([self._value(v, value_input_option == "USER_ENTERED") for v in r] for r in rows)
+
+    def append_row(self, row, **kwargs):
+        self.append_rows([row], **kwargs)
+
+    def batch_update(self, data, value_input_option="RAW", **kwargs):
+        from gspread.utils import a1_to_rowcol
+        self._call("batch_update")
+        with self.lock:
+            for item in data:
+                r, c = a1_to_rowcol(item['range'].split(":")[0])
+                row = self.rows[r - 1]
+                row.extend([""] * (c - len(row)))
+                row[c - 1] = self._value(item['values'][0][0], value_input_option == "USER_ENTERED")
+
+    def update_cell(self, row, col, value):
+        from gspread.utils import rowcol_to_a1
+        self.batch_update([{'range': rowcol_to_a1(row, col), 'values': [[value]]}], value_input_option="USER_ENTERED")
+
+    def delete_rows(self, start, end=None):
+        self._call("delete_rows")
+        with self.lock:
+            del self.rows[start - 1:(end or start)]
+
+
+def count_double_bookings(rows):
+    # זוגות של שיריונים פעילים (מאושר/ממתין) שחופפים באותו משאב ובאותו יום
+    by_slot = {}
+    headers = rows[0]
+    for r in rows[1:]:
+        b = dict(zip(headers, r))
+        if b.get('Status') not in (STATUS_APPROVED, STATUS_PENDING): continue
+        key = (b.get('Resource') or DEFAULT_RESOURCE, b.get('Date'))
+        by_slot.setdefault(key, []).append((b['Start Time'], b['End Time']))
+    pairs = 0
+    for intervals in by_slot.values():
+        intervals.sort()
+        for i, (s1, e1) in enumerate(intervals):
+            for s2, _ in intervals[i + 1:]:
+                if s2 >= e1: break
+                pairs += 1
+    return pairs
+
+def _percentile(sorted_values, q):
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+def _peak_per_minute(times):
+    # מספר הקריאות המקסימלי בחלון של 60 שניות
+    times, peak, lo = sorted(times), 0, 0
+    for hi, t in enumerate(times):
+        while t - times[lo] > 60: lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+
+def run_load_test(sessions=50, attempts=4, latency_ms=300, jitter=0.5, error_rate=0.0, hot_ratio=0.8,
+                  quota_per_minute=55, seed=None, servers=3):
+    # מחזיר מילון עם התוצאות. כל "דייר" הוא ת'רד שמנסה attempts שיריונים, רובם לאותה שעה.
+    # כל שרת מדומה הוא בניין נפרד בליבה (יומן, מנעול ומטמון משלו) שמחובר לאותם גיליונות מדומים
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="buildingapp-loadtest-")
+    # לא נוגעים ביומן, בעותקים וביומן השינויים של האפליקציה
+    journal.JOURNAL_DIR = snapshots.SNAPSHOT_DIR = audit.AUDIT_DIR = workdir
+    slugs = [f"{LOADTEST_TENANT}-{n}" for n in range(max(1, servers))]
+    config.configure(secrets={"general": {"quota_per_minute": quota_per_minute}, "tenants": {
+        slug: {"name": "בדיקת עומס", "quota_per_minute": quota_per_minute} for slug in slugs}})
+
+    bookings = FakeWorksheet(BOOKINGS_HEADERS, latency_ms, jitter, error_rate, random.Random(rng.random()))
+    users = FakeWorksheet(USERS_HEADERS, latency_ms, jitter, 0.0, random.Random(rng.random()))
+    for slug in slugs:
+        install_worksheet("Bookings", bookings, slug)
+        install_worksheet("Users", users, slug)
+
+    from .bookings import add_booking
+
+    evening = date.today() + timedelta(days=7)
+    latencies, outcomes = [], Counter()
+    lock = threading.Lock()
+    start_gate = threading.Barrier(sessions)
+
+    def session(i):
+        use_tenant(slugs[i % len(slugs)])
+        user = {'Full Name': f"דייר {i}", 'Phone': f"050{i:07d}", 'Apt': str(i % 49 + 1)}
+        srng = random.Random(rng.random())
+        start_gate.wait() # כולם מתחילים יחד, כמו אחרי הודעה בקבוצת הבניין
+        for _ in range(attempts):
+            if srng.random() < hot_ratio:
+                day, hour = evening, 20
+            else:
+                day, hour = evening + timedelta(days=srng.randint(0, 6)), srng.randint(8, 21)
+            t0 = tm.perf_counter()
+            try:
+                ok, msg = add_booking(user, day, time(hour), time(hour + 1))
+                result = "booked" if ok else "read_only" if msg == READ_ONLY_MSG else "busy"
+            except Exception:
+                result = "error"
+            with lock:
+                latencies.append(tm.perf_counter() - t0)
+                outcomes[result] += 1
+
+    t_start = tm.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = tm.perf_counter() - t_start
+
+    # מחכים שהיומנים יישלחו לגיליון המדומה - כל שרת במקביל (עם ניסיונות חוזרים אם הוזרקו שגיאות)
+    def drain(slug):
+        deadline = tm.monotonic() + 120
+        while journal.pending_count(slug) and tm.monotonic() < deadline:
+            if not journal.flush(slug): tm.sleep(0.5)
+
+    t_flush = tm.perf_counter()
+    flushers = [threading.Thread(target=drain, args=(slug,), daemon=True) for slug in slugs]
+    for t in flushers: t.start()
+    for t in flushers: t.join()
+    flush_time = tm.perf_counter() - t_flush
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    usages = [get_partition(slug).usage() for slug in slugs]
+    return {
+        "sessions": sessions,
+        "servers": len(slugs),
+        "requests": len(latencies),
+        "booked": outcomes["booked"],
+        "busy": outcomes["busy"],
+        "read_only": outcomes["read_only"],
+        "errors": outcomes["error"],
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(ms, 50),
+        "p95_ms": _percentile(ms, 95),
+        "p99_ms": _percentile(ms, 99),
+        "mean_ms": statistics.fmean(ms) if ms else 0.0,
+        "flush_s": flush_time,
+        "unflushed": sum(journal.pending_count(slug) for slug in slugs),
+        "double_bookings": count_double_bookings(bookings.rows),
+        "rejected_on_flush": sum(r[6] == STATUS_REJECTED for r in bookings.rows[1:]),
+        "rows_in_sheet": len(bookings.rows) - 1,
+        "sheets_calls": dict(bookings.calls + users.calls),
+        "sheets_reads": sum(u["reads"] for u in usages),
+        "sheets_writes": sum(u["writes"] for u in usages),
+        "peak_calls_per_minute": _peak_per_minute(bookings.call_times + users.call_times),
+        "quota_per_minute": quota_per_minute,
+        "workdir": workdir,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="בדיקת עומס לתהליך השיריון מול גיליון מדומה")
+    parser.add_argument("--sessions", type=int, default=50, help="מספר דיירים במקביל")
+    parser.add_argument("--attempts", type=int, default=4, help="ניסיונות שיריון לכל דייר")
+    parser.add_argument("--latency-ms", type=float, default=300, help="השהייה ממוצעת לכל קריאה לגוגל")
+    parser.add_argument("--jitter", type=float, default=0.5, help="פיזור ההשהייה (0-1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="שיעור קריאות שנכשלות (0-1)")
+    parser.add_argument("--hot-ratio", type=float, default=0.8, help="כמה מהניסיונות הם לאותה שעה")
+    parser.add_argument("--quota", type=int, default=55, help="מכסת קריאות לדקה")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--servers", type=int, default=3, help="שרתים מדומים, כל אחד עם יומן ומנעול משלו")
+    args = parser.parse_args(argv)
+
+    r = run_load_test(args.sessions, args.attempts, args.latency_ms, args.jitter, args.error_rate,
+                      args.hot_ratio, args.quota, args.seed, args.servers)
+    print(f"servers={r['servers']} sessions={r['sessions']} requests={r['requests']} booked={r['booked']} busy={r['busy']}"
+          f" read_only={r['read_only']} errors={r['errors']}")
+    print(f"latency ms: p50={r['p50_ms']:.1f} p95={r['p95_ms']:.1f} p99={r['p99_ms']:.1f} mean={r['mean_ms']:.1f}")
+    print(f"throughput: {r['throughput_rps']:.1f} req/s over {r['elapsed_s']:.2f}s, flush {r['flush_s']:.2f}s"
+          f" (unflushed {r['unflushed']})")
+    print(f"double bookings: {r['double_bookings']} (rows in sheet: {r['rows_in_sheet']},"
+          f" rejected on flush: {r['rejected_on_flush']})")
+    print(f"sheets calls: {r['sheets_calls']} | reads={r['sheets_reads']} writes={r['sheets_writes']}"
+          f" | peak/min={r['peak_calls_per_minute']} quota/min={r['quota_per_minute']}")
+    return 0 if r["double_bookings"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
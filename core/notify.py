@@ -0,0 +1,19 @@
+# --- שליחת הודעות לטלגרם ---
+from . import config
+from .tenants import get_tenant
+
+
+def send_telegram(message):
+    try:
+        # בדיקה שהמפתחות קיימים בסודות
+        general = config.get_secret("general")
+        if general:
+            import requests
+            token = general["telegram_token"]
+            # לכל בניין יכולה להיות קבוצת טלגרם משלו
+            chat_id = get_tenant().get("telegram_chat_id") or general["telegram_chat_id"]
+            url = f"https://api.telegram.org/bot{token}/sendMessage"
+            # שליחה עם Timeout כדי שהאפליקציה לא תיתקע אם אין אינטרנט
+            requests.post(url, json={"chat_id": chat_id, "text": message}, timeout=5)
+    except Exception:
+        pass # מונע קריסה של כל האפליקציה אם יש תקלה בטלגרם
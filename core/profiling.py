@@ -0,0 +1,117 @@
+# --- פרופיילינג של ריצה שלמה של הסקריפט (לאדמין בלבד) ---
+# כשמופעל (?profile=1 בכתובת, או בסודות) כל ריצה של האפליקציה מורצת בתוך cProfile, והתוצאה נשמרת
+# כקובץ pstats לכל ריצה, עם קובץ JSON קטן (עמוד, משך, זמן). כך רואים אם הזמן הולך לגוגל, ל-pandas,
+# ללולאות iterrows או לבניית הווידג'טים. את הקובץ אפשר לפתוח גם ב-snakeviz / flameprof כגרף להבה.
+#   [general]
+#   profile = true   # פרופיילינג לכל ריצה של אדמין (בלי הפרמטר בכתובת)
+# cProfile מ-Python 3.12 עובד דרך sys.monitoring, שהוא אחד לכל המפרש: פרופיילר שני במקביל נכשל,
+# והפרופיל כולל גם ת'רדים של משתמשים אחרים שרצו באותו זמן. לכן רק ריצה אחת בכל פעם בכל התהליך -
+# בקשה נוספת בזמן שפרופיילר פעיל רצה כרגיל, בלי פרופיילינג.
+import contextvars
+import json
+import logging
+import os
+import threading
+import time as tm
+
+from . import config
+from .tenants import current_tenant
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("BUILDINGAPP_PROFILES", ".profiles")
+QUERY_PARAM = "profile"
+MAX_PROFILES = 50  # לכל בניין - הישנים נמחקים
+DEFAULT_TOP = 25
+
+_active = contextvars.ContextVar("profiling", default=False)
+_lock = threading.Lock()
+
+
+def profiling_active():
+    return _active.get()
+
+def profiling_requested(query_params, is_admin):
+    if not is_admin: return False
+    if str(query_params.get(QUERY_PARAM, "")).lower() in ("1", "true", "yes"): return True
+    return str(config.get_secret("general", "profile", "")).lower() in ("1", "true", "yes")
+
+
+def run_profiled(script_path, script_globals, slug=None, keep=None):
+    # מריץ את הסקריפט שוב (באותו מרחב שמות) בתוך cProfile. גם st.rerun / st.stop באמצע הריצה
+    # (שעוברים כחריגה) לא מפילים את השמירה. keep() נבדק בסוף הריצה - אם החזיר False הפרופיל לא נשמר.
+    # מחזיר False בלי להריץ כלום אם פרופיילר אחר פעיל כרגע
+    import cProfile
+    if not _lock.acquire(blocking=False):
+        log.info("profiler busy - running without profiling")
+        return False
+    try:
+        with open(script_path, encoding="utf-8") as f:
+            code = compile(f.read(), script_path, "exec")
+        slug = slug or current_tenant()
+        profiler = cProfile.Profile()
+        token = _active.set(True)
+        started = tm.perf_counter()
+        try:
+            profiler.enable()
+            exec(code, script_globals)
+        finally:
+            profiler.disable()
+            _active.reset(token)
+            if keep is None or keep():
+                _save(profiler, slug, script_globals.get('menu') or "כניסה", tm.perf_counter() - started)
+    finally:
+        _lock.release()
+    return True
+
+
+def _dir(slug):
+    return os.path.join(PROFILE_DIR, slug)
+
+def _save(profiler, slug, page, seconds):
+    try:
+        base = _dir(slug)
+        os.makedirs(base, exist_ok=True)
+        now = tm.time()
+        name = tm.strftime("%Y%m%d-%H%M%S", tm.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        profiler.dump_stats(os.path.join(base, name + ".pstats"))
+        with open(os.path.join(base, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump({"page": str(page), "seconds": seconds, "ts": now}, f, ensure_ascii=False)
+        for old in list_profiles(slug)[MAX_PROFILES:]:
+            for path in (old["path"], old["path"][:-len(".pstats")] + ".json"):
+                try: os.remove(path)
+                except OSError: pass
+    except Exception as e:
+        log.warning("failed to save profile for %s: %s", slug, e)
+
+
+def list_profiles(slug=None):
+    # [{path, page, seconds, ts}] - החדש ראשון
+    base = _dir(slug or current_tenant())
+    if not os.path.isdir(base): return []
+    out = []
+    for name in os.listdir(base):
+        if not name.endswith(".json"): continue
+        path = os.path.join(base, name[:-len(".json")] + ".pstats")
+        try:
+            with open(os.path.join(base, name), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if os.path.exists(path):
+            out.append(dict(meta, path=path))
+    return sorted(out, key=lambda m: m.get("ts", 0), reverse=True)
+
+def hot_spots(path, sort="cumulative", limit=DEFAULT_TOP):
+    # הפונקציות הכבדות בקובץ pstats - לפי זמן מצטבר (cumulative) או זמן עצמי (tottime)
+    import pandas as pd
+    import pstats
+    stats = pstats.Stats(path).stats
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.items():
+        where = "built-in" if filename == "~" else f"{os.path.basename(filename)}:{line}"
+        rows.append({"function": func, "where": where, "calls": nc, "tottime": tt, "cumtime": ct,
+                     "module": filename})
+    df = pd.DataFrame(rows, columns=["function", "where", "calls", "tottime", "cumtime", "module"])
+    key = "tottime" if sort == "tottime" else "cumtime"
+    return df.sort_values(key, ascending=False).head(limit).reset_index(drop=True)
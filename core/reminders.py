@@ -0,0 +1,143 @@
+# --- תזכורות לפני שיריון (טלגרם) ---
+# ערימה (min-heap) של השיריונים המאושרים הבאים לפי זמן התזכורת. ת'רד אחד ישן עד התזכורת הקרובה,
+# כך שבזמן שקט אין שום עבודה - לא משנה כמה היסטוריה יש בגיליון.
+# הגיליון נסרק פעם אחת לכל בניין בהפעלה; אחר כך כל אישור/עריכה/ביטול מעדכן את הערימה בלבד.
+# שיריון שבוטל לא נמחק מהערימה - הרשומה שלו פשוט מסומנת כלא בתוקף ומדולגת כשהיא מגיעה לראש.
+#   [general]
+#   reminder_minutes = 60   # כמה דקות לפני תחילת השיריון לשלוח תזכורת
+import heapq
+import itertools
+import logging
+import threading
+import time as tm
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+from . import config
+from .config import DATE_FMT, STATUS_APPROVED, TIME_FMT, TIMEZONE
+from .notify import send_telegram
+from .tenants import current_tenant, use_tenant
+
+log = logging.getLogger(__name__)
+
+DEFAULT_REMIND_MINUTES = 60
+
+_heap = []      # (זמן תזכורת, מספר סידורי, בניין, מזהה שיריון)
+_live = {}      # (בניין, מזהה שיריון) -> (זמן תזכורת, מספר סידורי) של הרשומה התקפה בערימה
+_loaded = set() # בניינים שכבר נסרקו
+_seq = itertools.count()
+_cv = threading.Condition()
+_thread = None
+
+
+def remind_before():
+    return int(config.get_secret("general", "reminder_minutes", DEFAULT_REMIND_MINUTES)) * 60
+
+def _start_ts(booking):
+    # זמן תחילת השיריון (שעון ישראל) כ-epoch, או None אם התאריך/השעה לא תקינים
+    try:
+        start = datetime.strptime(f"{booking['Date']} {booking['Start Time']}", f"{DATE_FMT} {TIME_FMT}")
+    except (KeyError, TypeError, ValueError):
+        return None
+    return start.replace(tzinfo=ZoneInfo(TIMEZONE)).timestamp()
+
+def _push(slug, booking_id, due):
+    # נקרא כש-_cv תפוס
+    seq = next(_seq)
+    _live[(slug, booking_id)] = (due, seq)
+    heapq.heappush(_heap, (due, seq, slug, booking_id))
+    if _heap[0][1] == seq:
+        _cv.notify() # התזכורת החדשה היא הקרובה ביותר - מעירים את הת'רד שיחשב מחדש כמה לישון
+
+
+def schedule(booking, slug=None, now=None):
+    # מוסיף/מעדכן תזכורת לשיריון מאושר. שיריון שכבר התחיל (או לא מאושר) מבוטל
+    slug = slug or current_tenant()
+    booking_id = str(booking['Booking ID'])
+    start = _start_ts(booking)
+    now = now or tm.time()
+    with _cv:
+        if booking.get('Status') != STATUS_APPROVED or start is None or start <= now:
+            _live.pop((slug, booking_id), None)
+            return False
+        _push(slug, booking_id, max(now, start - remind_before()))
+    return True
+
+def cancel(booking_id, slug=None):
+    with _cv:
+        _live.pop((slug or current_tenant(), str(booking_id)), None)
+
+def booking_changed(booking_id, slug=None):
+    # נקרא אחרי אישור, עריכה או ביטול - קורא את השיריון מהמצב המקומי ומעדכן את הערימה
+    if _thread is None: return # המתזמן לא הופעל (למשל בסקריפט)
+    from .bookings import get_booking
+    booking = get_booking(booking_id)
+    if booking: schedule(booking, slug)
+    else: cancel(booking_id, slug)
+
+def pending_reminders():
+    with _cv:
+        return len(_live)
+
+
+def load_tenant(slug=None):
+    # סריקה אחת בהפעלה: רק שיריונים מאושרים מהיום והלאה שהתזכורת שלהם עוד לא עברה
+    from .bookings import with_resource
+    from .sheets import get_data
+    slug = slug or current_tenant()
+    if slug in _loaded: return 0
+    df = get_data("Bookings")
+    _loaded.add(slug)
+    if df.empty: return 0
+    df = with_resource(df)
+    upcoming = df[(df['Status'] == STATUS_APPROVED) & (df['Date'] >= date.today().strftime(DATE_FMT))]
+    now, before, count = tm.time(), remind_before(), 0
+    with _cv:
+        for booking in upcoming.to_dict('records'):
+            start = _start_ts(booking)
+            if start is None or start - before < now: continue # אחרי הפעלה מחדש לא שולחים שוב תזכורות שעברו
+            _push(slug, str(booking['Booking ID']), start - before)
+            count += 1
+    return count
+
+
+def _send(slug, booking_id):
+    from .bookings import get_booking, resource_label
+    use_tenant(slug)
+    booking = get_booking(booking_id)
+    if not booking or booking.get('Status') != STATUS_APPROVED:
+        return # השתנה בגיליון עצמו מאז שנכנס לערימה
+    send_telegram(f"⏰ *תזכורת*\n{resource_label(booking['Resource'])} - {booking['Date']} "
+                  f"{booking['Start Time']}-{booking['End Time']}\nדירה {booking.get('Apt', '?')} ({booking.get('Name', '')})")
+
+def _run():
+    while True:
+        with _cv:
+            while True:
+                if not _heap:
+                    _cv.wait()
+                    continue
+                due, seq, slug, booking_id = _heap[0]
+                if _live.get((slug, booking_id)) != (due, seq):
+                    heapq.heappop(_heap) # רשומה שבוטלה או הוחלפה
+                    continue
+                wait = due - tm.time()
+                if wait > 0:
+                    _cv.wait(wait)
+                    continue
+                heapq.heappop(_heap)
+                del _live[(slug, booking_id)]
+                break
+        try:
+            _send(slug, booking_id)
+        except Exception as e:
+            log.warning("reminder for %s/%s failed: %s", slug, booking_id, e)
+
+def start_reminders(slug=None):
+    # מפעיל את ת'רד התזכורות (פעם אחת לתהליך) וטוען את השיריונים של הבניין
+    global _thread
+    with _cv:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="reminders", daemon=True)
+            _thread.start()
+    return load_tenant(slug)
@@ -0,0 +1,79 @@
+# --- חיפוש דיירים (לבחירת דייר במסכי הניהול) ---
+# אינדקס אחד לכל טעינה של גיליון המשתמשים: רשימה ממוינת של מילים לחיפוש תחילית (bisect),
+# ומיפוי של כל רצף של 3 תווים (trigram) לדיירים שמכילים אותו - לחיפוש תת-מחרוזת בלי לסרוק את כולם.
+# מחפשים בשם, בטלפון ובמספר הדירה. התוצאות: קודם התאמות תחילית, אחר כך התאמות באמצע.
+from bisect import bisect_left
+
+from .sheets import derived
+from .users import clean_phone, get_user_index
+
+DEFAULT_LIMIT = 20
+
+
+def _norm(text):
+    return " ".join(str(text).lower().replace("'", "").split())
+
+def _tokens(user):
+    # המילים שחיפוש תחילית יכול להתחיל מהן: השם המלא, כל מילה בשם, הטלפון (גם בלי 0 ובלי קידומת) והדירה
+    name = _norm(user.get('Full Name', ''))
+    phone = clean_phone(user.get('Phone', ''))
+    tokens = {name, phone, phone.lstrip("0"), phone[3:], f"דירה {_norm(user.get('Apt', ''))}",
+              _norm(user.get('Apt', ''))}
+    tokens.update(name.split())
+    return {t for t in tokens if t}
+
+def _build_search_index(df):
+    phones, prefix, trigrams, texts = [], [], {}, []
+    if df.empty or 'Phone' not in df.columns:
+        return {"phones": phones, "prefix": prefix, "trigrams": trigrams, "texts": texts}
+    for i, user in enumerate(df.to_dict('records')):
+        phones.append(clean_phone(user['Phone']))
+        prefix.extend((t, i) for t in _tokens(user))
+        text = " | ".join([_norm(user.get('Full Name', '')), phones[-1], _norm(user.get('Apt', ''))])
+        texts.append(text)
+        for j in range(len(text) - 2):
+            trigrams.setdefault(text[j:j + 3], set()).add(i)
+    prefix.sort()
+    return {"phones": phones, "prefix": prefix, "trigrams": trigrams, "texts": texts}
+
+def get_search_index():
+    return derived("Users", "search", _build_search_index)
+
+
+def search_users(query, limit=DEFAULT_LIMIT):
+    # מחזיר עד limit טלפונים (נקיים) של דיירים שמתאימים לחיפוש. חיפוש ריק - הדיירים הראשונים בגיליון
+    index = get_search_index()
+    phones = index["phones"]
+    q = _norm(query)
+    if q.replace("-", "").replace(" ", "").isdigit() and len(q) > 3:
+        q = q.replace("-", "").replace(" ", "") # טלפון שהוקלד עם מקפים/רווחים
+
+    found = []
+    def add(i):
+        if phones[i] not in found: found.append(phones[i])
+        return len(found) >= limit
+
+    if not q:
+        for i in range(len(phones)):
+            if add(i): break
+        return found
+
+    # 1. תחילית של אחת המילים - טווח רציף ברשימה הממוינת, עוצרים אחרי limit תוצאות
+    prefix = index["prefix"]
+    pos = bisect_left(prefix, (q,))
+    while pos < len(prefix) and prefix[pos][0].startswith(q):
+        if add(prefix[pos][1]): return found
+        pos += 1
+
+    # 2. תת-מחרוזת באמצע: חיתוך הקבוצות של כל ה-trigrams בחיפוש, ואימות על המועמדים בלבד
+    if len(q) >= 3:
+        grams = [q[j:j + 3] for j in range(len(q) - 2)]
+        groups = sorted((index["trigrams"].get(g, set()) for g in grams), key=len)
+        candidates = set.intersection(*groups) if groups else set()
+        for i in sorted(candidates):
+            if q in index["texts"][i] and add(i): return found
+    return found
+
+def lookup_user(phone):
+    # שורת הדייר לפי הטלפון (המזהה), או None
+    return get_user_index().get(clean_phone(phone))
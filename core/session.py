@@ -0,0 +1,98 @@
+# --- טוקן התחברות חתום (במקום מספר טלפון גלוי בעוגייה) ---
+# הטוקן נושא את פרטי המשתמש הדרושים לתצוגה, כך שהתחברות אוטומטית לא סורקת את גיליון
+# המשתמשים. אחת ל-REVALIDATE_EVERY מוודאים מול אינדקס המשתמשים שהוא עדיין פעיל.
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time as tm
+
+from . import config
+from .config import STATUS_ACTIVE
+from .sheets import fetch_failed, read_only
+from .tenants import DEFAULT_TENANT, current_tenant
+from .users import clean_phone, get_user_index
+
+SESSION_COOKIE = "session_token"
+TOKEN_TTL = 7 * 24 * 3600     # שבוע, כמו העוגייה
+REVALIDATE_EVERY = 15 * 60    # בדיקה חוזרת מול גיליון המשתמשים
+
+# בלי session_secret בסודות - מפתח אקראי לכל תהליך (הטוקנים יפוגו בהפעלה מחדש)
+_fallback_secret = os.urandom(32)
+
+
+def _secret():
+    secret = config.get_secret("general", "session_secret")
+    return str(secret).encode() if secret else _fallback_secret
+
+def secret_configured():
+    # טוקנים ארוכי טווח (קישור ללוח שנה) דורשים מפתח קבוע - המפתח האקראי מתחלף בכל הפעלה
+    return bool(config.get_secret("general", "session_secret"))
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def sign(payload):
+    body = _b64(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode())
+    sig = hmac.new(_secret(), body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64(sig)}"
+
+def unsign(token):
+    # מחזיר את התוכן אם החתימה תקינה, אחרת None
+    try:
+        body, sig = str(token).split(".", 1)
+        expected = hmac.new(_secret(), body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _unb64(sig)): return None
+        return json.loads(_unb64(body))
+    except (ValueError, TypeError):
+        return None
+
+
+def session_cookie_name():
+    # עוגייה נפרדת לכל בניין, כדי שאפשר יהיה להיות מחובר לכמה בניינים באותו דפדפן
+    slug = current_tenant()
+    return SESSION_COOKIE if slug == DEFAULT_TENANT else f"{SESSION_COOKIE}_{slug}"
+
+def issue_token(user_data, now=None):
+    now = int(now or tm.time())
+    return sign({
+        "tid": current_tenant(),
+        "uid": clean_phone(user_data.get('Phone', '')),
+        "name": str(user_data.get('Full Name', '')),
+        "role": str(user_data.get('Role', 'user')),
+        "apt": str(user_data.get('Apt', '0')),
+        "status": str(user_data.get('Status', '')),
+        "exp": now + TOKEN_TTL,
+        "chk": now, # מתי נבדק לאחרונה מול הגיליון
+    })
+
+def verify_token(token, now=None):
+    payload = unsign(token) if token else None
+    if not payload or payload.get("exp", 0) < (now or tm.time()): return None
+    if payload.get("status") != STATUS_ACTIVE: return None
+    if payload.get("tid", DEFAULT_TENANT) != current_tenant(): return None # טוקן של בניין אחר
+    return payload
+
+def needs_revalidation(payload, now=None):
+    return (now or tm.time()) - payload.get("chk", 0) > REVALIDATE_EVERY
+
+def user_from_token(payload):
+    return {
+        'Full Name': payload["name"], 'Phone': payload["uid"], 'Apt': payload["apt"],
+        'Role': payload["role"], 'Status': payload["status"],
+    }
+
+def revalidate_session(payload):
+    # בדיקה מול אינדקס המשתמשים (לא סריקה של הטבלה). מחזיר (משתמש, טוקן חדש) או (None, None).
+    # כשגוגל לא זמין אי אפשר לדעת - ממשיכים עם הטוקן הנוכחי (טוקן None) ובודקים שוב בריצה הבאה
+    row = get_user_index().get(payload.get("uid"))
+    if fetch_failed("Users") or read_only():
+        return user_from_token(payload), None
+    if not row or row.get('Status') != STATUS_ACTIVE:
+        return None, None
+    token = issue_token(row)
+    return user_from_token(verify_token(token)), token
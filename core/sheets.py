@@ -0,0 +1,381 @@
+# --- חיבור לגוגל שיטס ומטמון נתונים (מחיצה נפרדת לכל בניין) ---
+import contextvars
+import logging
+import threading
+import time as tm
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from . import config
+from .config import RESOURCE_COL
+from . import journal
+from .journal import apply_pending
+from .snapshots import load_snapshot, save_snapshot
+from .tenants import DEFAULT_QUOTA_PER_MINUTE, current_tenant, get_tenant
+
+log = logging.getLogger(__name__)
+
+DATA_TTL = 300 # גוגל ייקרא רק פעם ב-5 דקות לכל גיליון
+RETRY_AFTER = 30 # בזמן תקלה בגוגל - ניסיון חוזר לכל היותר פעם ב-30 שניות
+READ_ONLY_MSG = "⚠️ אין כרגע חיבור לגוגל שיטס - המערכת במצב קריאה בלבד. נסה שוב בעוד כמה דקות."
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+_client = None
+_client_lock = threading.Lock()
+_cached_only = contextvars.ContextVar("cached_only", default=False) # בתוך write_lock - בלי פנייה לגוגל
+
+# המכסה של גוגל נספרת לחשבון השירות - כל הבניינים בשרת חולקים אותה
+_account_calls = deque()
+_account_lock = threading.Lock()
+
+def account_quota():
+    return int(config.get_secret("general", "quota_per_minute", DEFAULT_QUOTA_PER_MINUTE))
+
+def _account_window(now, record=False):
+    with _account_lock:
+        if record: _account_calls.append(now)
+        while _account_calls and now - _account_calls[0] > 60:
+            _account_calls.popleft()
+        return len(_account_calls)
+
+
+class CachePartition:
+    # המטמון של בניין אחד: LRU עם מגבלת זיכרון ומספר גיליונות, וספירת קריאות לגוגל
+    # (החלק של הבניין במכסה, בנוסף למכסה המשותפת של חשבון השירות)
+    READ_CALLS = {"get_all_values", "get", "row_values", "col_values", "find", "findall", "worksheet"}
+    WRITE_CALLS = {"append_row", "append_rows", "update_cell", "update", "batch_update", "delete_rows"}
+
+    def __init__(self, tenant):
+        self.slug = tenant["slug"]
+        self.max_bytes = int(float(tenant["cache_max_mb"]) * 1024 * 1024)
+        self.max_entries = int(tenant["cache_max_entries"])
+        self.quota_per_minute = int(tenant["quota_per_minute"])
+        self.frames = OrderedDict() # sheet_name -> (זמן טעינה, DataFrame, גודל בבתים)
+        self.nbytes = 0
+        self.versions = {}          # sheet_name -> מונה טעינות (לחישובים נגזרים)
+        self.derived = {}           # (sheet_name, key) -> (גרסה, ערך)
+        self.overlays = {}          # sheet_name -> ((גרסה, רשומות ממתינות), הגיליון עם השינויים המקומיים)
+        self.failed = set()         # גיליונות שהטעינה האחרונה שלהם נכשלה ואין להם שום עותק
+        self.stale = set()          # גיליונות שמוגשים מעותק ישן כי גוגל לא זמין
+        self.saved_at = {}          # sheet_name -> מתי הנתונים נקראו מגוגל (זמן שעון)
+        self.retry_at = {}          # sheet_name -> לא לפנות לגוגל לפני (monotonic)
+        self.warmed = set()         # גיליונות שכבר נטענו מהעותק שעל הדיסק (רק פעם אחת)
+        self.fetching = {}          # sheet_name -> מנעול: קריאה אחת לגוגל בכל פעם לכל גיליון
+        self.calls = deque()        # זמני קריאות לגוגל בדקה האחרונה
+        self.totals = {"read": 0, "write": 0}
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def get(self, sheet_name):
+        with self.lock:
+            hit = self.frames.get(sheet_name)
+            if hit: self.frames.move_to_end(sheet_name)
+            return hit
+
+    def put(self, sheet_name, df, fetched_at=None, saved_at=None):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self.lock:
+            self.drop(sheet_name, keep_derived=True)
+            self.frames[sheet_name] = (fetched_at or tm.monotonic(), df, nbytes)
+            self.nbytes += nbytes
+            self.versions[sheet_name] = self.versions.get(sheet_name, 0) + 1
+            self.saved_at[sheet_name] = saved_at or tm.time()
+            self.failed.discard(sheet_name)
+            self.stale.discard(sheet_name)
+            self.retry_at.pop(sheet_name, None)
+            # פינוי הגיליונות שלא נקראו הכי הרבה זמן (לא את זה שהרגע נטען)
+            while len(self.frames) > 1 and (self.nbytes > self.max_bytes or len(self.frames) > self.max_entries):
+                self.drop(next(iter(self.frames)))
+                self.evictions += 1
+
+    def drop(self, sheet_name, keep_derived=False):
+        with self.lock:
+            old = self.frames.pop(sheet_name, None)
+            if old: self.nbytes -= old[2]
+            self.overlays.pop(sheet_name, None)
+            if not keep_derived:
+                for key in [k for k in self.derived if k[0] == sheet_name]:
+                    del self.derived[key]
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.derived.clear()
+            self.overlays.clear()
+            self.nbytes = 0
+
+    def record_call(self, kind):
+        now = tm.monotonic()
+        with self.lock:
+            self.totals[kind] += 1
+            self.calls.append(now)
+            while self.calls and now - self.calls[0] > 60:
+                self.calls.popleft()
+        _account_window(now, record=True)
+
+    def over_quota(self):
+        now = tm.monotonic()
+        if _account_window(now) >= account_quota(): return True
+        with self.lock:
+            while self.calls and now - self.calls[0] > 60:
+                self.calls.popleft()
+            return len(self.calls) >= self.quota_per_minute
+
+    def fetch_lock(self, sheet_name):
+        with self.lock:
+            return self.fetching.setdefault(sheet_name, threading.Lock())
+
+    def bump(self, sheet_name):
+        # שינוי מקומי (יומן הכתיבה) - החישובים הנגזרים ייבנו מחדש
+        with self.lock:
+            self.versions[sheet_name] = self.versions.get(sheet_name, 0) + 1
+
+    def mark_unavailable(self, sheet_name, has_copy):
+        with self.lock:
+            (self.stale if has_copy else self.failed).add(sheet_name)
+            self.retry_at[sheet_name] = tm.monotonic() + RETRY_AFTER
+
+    def usage(self):
+        with self.lock:
+            return {
+                "calls_last_minute": len(self.calls), "quota_per_minute": self.quota_per_minute,
+                "account_calls_last_minute": _account_window(tm.monotonic()), "account_quota_per_minute": account_quota(),
+                "reads": self.totals["read"], "writes": self.totals["write"],
+                "cached_sheets": len(self.frames), "cache_bytes": self.nbytes,
+                "cache_max_bytes": self.max_bytes, "evictions": self.evictions,
+            }
+
+
+class CountingWorksheet:
+    # עטיפה שקופה ל-Worksheet של gspread שסופרת כל קריאה לגוגל במכסה של הבניין
+    def __init__(self, ws, partition):
+        self._ws = ws
+        self._partition = partition
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if name in CachePartition.READ_CALLS: kind = "read"
+        elif name in CachePartition.WRITE_CALLS: kind = "write"
+        else: return attr
+
+        def call(*args, **kwargs):
+            self._partition.record_call(kind)
+            return attr(*args, **kwargs)
+        return call
+
+
+_partitions = {}  # slug -> CachePartition
+_handles = {}     # (slug, sheet_name) -> Worksheet
+_partitions_lock = threading.Lock()
+
+def get_partition(slug=None):
+    slug = slug or current_tenant()
+    part = _partitions.get(slug)
+    if part is None:
+        with _partitions_lock:
+            part = _partitions.get(slug)
+            if part is None:
+                part = _partitions[slug] = CachePartition(get_tenant(slug))
+    return part
+
+def tenant_usage(slug=None):
+    return get_partition(slug).usage()
+
+
+def get_gspread_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # ייבוא עצל - gspread ו-oauth2client נטענים רק כשבאמת פונים לגוגל
+                import gspread
+                from oauth2client.service_account import ServiceAccountCredentials
+
+                creds_dict = config.get_secret("gcp_service_account")
+                if creds_dict:
+                    creds_dict = dict(creds_dict)
+                    # מבטיח שהמפתח הפרטי יפורמט נכון ב-Streamlit Cloud
+                    if "private_key" in creds_dict:
+                        creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
+                    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+                else:
+                    creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", SCOPE)
+                _client = gspread.authorize(creds)
+    return _client
+
+def get_worksheet(name):
+    # ה-handle נשמר לכל בניין - open_by_key ו-worksheet לא נקראים מחדש בכל פעולה
+    slug = current_tenant()
+    ws = _handles.get((slug, name))
+    if ws is None:
+        part = get_partition(slug)
+        part.record_call("read")
+        sh = get_gspread_client().open_by_key(get_tenant(slug)["sheet_id"])
+        ws = _handles[(slug, name)] = CountingWorksheet(sh.worksheet(name), part)
+    return ws
+
+def install_worksheet(name, ws, slug=None):
+    # מחליף את הגיליון של בניין באובייקט אחר עם אותו ממשק (למשל גיליון מדומה לבדיקות עומס)
+    slug = slug or current_tenant()
+    _handles[(slug, name)] = CountingWorksheet(ws, get_partition(slug))
+
+
+def _warm_from_snapshot(part, sheet_name):
+    # אחרי הפעלה מחדש טוענים את העותק מהדיסק עם הגיל האמיתי שלו (ובתקלה - כגיבוי)
+    with part.lock:
+        part.warmed.add(sheet_name)
+    snap = load_snapshot(current_tenant(), sheet_name)
+    if snap is None: return None
+    df, saved_at = snap
+    age = max(0.0, tm.time() - saved_at)
+    part.put(sheet_name, df, fetched_at=tm.monotonic() - age, saved_at=saved_at)
+    return part.get(sheet_name)
+
+def _fetch(part, sheet_name):
+    # קריאה מגוגל, שמירה במטמון ובעותק שעל הדיסק. זורק חריגה אם גוגל לא זמין
+    import pandas as pd
+    ws = get_worksheet(sheet_name)
+    # שימוש ב-values כדי להתגבר על בעיות כותרות/הקפאה
+    all_values = ws.get_all_values()
+
+    if all_values:
+        # ניקוי רווחים מהכותרות בשורה הראשונה
+        headers = [str(h).strip() for h in all_values[0]]
+        rows = all_values[1:]
+        if sheet_name == "Bookings":
+            headers, rows = _resource_column(headers, rows)
+        df = pd.DataFrame(rows, columns=headers)
+    else:
+        df = pd.DataFrame()
+
+    part.put(sheet_name, df)
+    save_snapshot(current_tenant(), sheet_name, df)
+    return df
+
+def _resource_column(headers, rows):
+    # עמודה J היא תמיד המשאב, גם אם לא הוסיפו לה כותרת בגיליון - אחרת שיריונים של חדר הכושר או הגג
+    # היו נקראים כחדר הדיירים, חוסמים אותו ולא חוסמים את המשאב שלהם
+    if "Resource" in headers: return headers, rows
+    k = RESOURCE_COL - 1
+    if len(headers) > k and headers[k]:
+        log.warning("Bookings column %d is %r, not Resource - all bookings count as %s",
+                    RESOURCE_COL, headers[k], config.DEFAULT_RESOURCE)
+        return headers, rows
+    # שורות יכולות להיות רחבות מהכותרות, ואם אין עמודה J בכלל משלימים עמודה ריקה (הכל חדר הדיירים)
+    width = max([len(headers), k + 1] + [len(r) for r in rows])
+    headers = headers + [""] * (width - len(headers))
+    rows = [list(r) + [""] * (width - len(r)) for r in rows]
+    log.warning("Bookings column %d has no header - reading it as Resource", RESOURCE_COL)
+    return headers[:k] + ["Resource"] + headers[k + 1:], rows
+
+def _load(sheet_name):
+    # הגיליון כפי שנקרא מגוגל (מהמטמון כל עוד לא התיישן), בלי השכבה המקומית. None אם אין שום עותק
+    part = get_partition()
+    hit = part.get(sheet_name)
+    if hit is None and sheet_name not in part.warmed:
+        hit = _warm_from_snapshot(part, sheet_name)
+    if _usable(part, sheet_name, hit):
+        return part, hit[1]
+
+    # כשהמטמון מתיישן כל הסשנים מגיעים לכאן יחד - רק אחד קורא מגוגל, והשאר מחכים ומקבלים את מה שנקרא
+    with part.fetch_lock(sheet_name):
+        hit = part.get(sheet_name) or hit
+        if _usable(part, sheet_name, hit):
+            return part, hit[1]
+        if hit is None and tm.monotonic() < part.retry_at.get(sheet_name, 0):
+            return part, None # הקריאה שהרגע נכשלה - לא מנסים שוב מיד
+        try:
+            return part, _fetch(part, sheet_name)
+        except Exception as e:
+            # אם יש חסימה מגוגל לא קורסים - מגישים את העותק האחרון (קריאה בלבד), ואם אין - טבלה ריקה
+            log.warning("failed to load %s/%s: %s", current_tenant(), sheet_name, e)
+            hit = hit or _warm_from_snapshot(part, sheet_name)
+            part.mark_unavailable(sheet_name, has_copy=hit is not None)
+            return part, hit[1] if hit else None
+
+def _usable(part, sheet_name, hit):
+    # בחריגה ממכסת הקריאות, או בהמתנה לניסיון חוזר אחרי תקלה, מגישים את העותק הקיים גם אם התיישן
+    return bool(hit) and (_cached_only.get() or tm.monotonic() - hit[0] < DATA_TTL or part.over_quota()
+                          or tm.monotonic() < part.retry_at.get(sheet_name, 0))
+
+def _with_pending(part, sheet_name, df):
+    # שינויים שעוד ממתינים ביומן הכתיבה מוצגים מעל מה שנקרא מגוגל. השכבה נבנית פעם אחת לכל גרסה של
+    # הגיליון ומספר רשומות ממתינות (ולא בכל קריאה), וכל קורא מקבל עותק משלו
+    import pandas as pd
+    if df is None: return pd.DataFrame()
+    pending = journal.pending_count(part.slug)
+    with part.lock:
+        current = part.frames.get(sheet_name)
+        cached = current is not None and current[1] is df # לא עותק שכבר הוחלף בטעינה חדשה
+        key = (part.versions.get(sheet_name, 0), pending)
+        hit = part.overlays.get(sheet_name) if cached else None
+    if hit is None or hit[0] != key:
+        hit = (key, apply_pending(sheet_name, df, part.slug))
+        if cached:
+            with part.lock: part.overlays[sheet_name] = hit
+    return hit[1].copy()
+
+def get_data(sheet_name):
+    part, df = _load(sheet_name)
+    return _with_pending(part, sheet_name, df)
+
+def refresh(sheet_name):
+    # קריאה מחודשת מיידית (אחרי שליחת היומן לגוגל). זורק חריגה אם גוגל לא זמין
+    return _fetch(get_partition(), sheet_name)
+
+@contextmanager
+def write_lock(*sheet_names):
+    # בדיקה + רישום ביומן תחת המנעול של הבניין. הגיליונות נקראים מגוגל (אם צריך) לפני שלוקחים את
+    # המנעול, ובתוכו מוגש מה שבמטמון - כך שקריאה איטית לגוגל לא עוצרת את כל הכתיבות של הבניין
+    for sheet_name in sheet_names:
+        get_data(sheet_name)
+    token = _cached_only.set(True)
+    try:
+        with journal.tenant_lock():
+            yield
+    finally:
+        _cached_only.reset(token)
+
+def fetch_failed(sheet_name):
+    return sheet_name in get_partition().failed
+
+def read_only():
+    # בזמן תקלה בגוגל הנתונים מגיעים מעותק ישן - לא מאפשרים שינויים שנבדקו מולו
+    part = get_partition()
+    return bool(part.failed or part.stale)
+
+def stale_since():
+    # זמן הטעינה של העותק הישן ביותר שמוצג כרגע, או None אם הכל עדכני
+    part = get_partition()
+    with part.lock:
+        times = [part.saved_at[s] for s in part.stale if s in part.saved_at]
+    return min(times) if times else None
+
+def derived(sheet_name, key, builder):
+    # ערך שמחושב מהגיליון (אינדקס, רשימה ממוינת...) ונבנה מחדש רק כשהגיליון נטען מחדש
+    part, df = _load(sheet_name) # רענון מגוגל אם צריך - השכבה המקומית נבנית רק אם הערך התיישן
+    version = part.versions.get(sheet_name, 0)
+    with part.lock:
+        hit = part.derived.get((sheet_name, key))
+    if hit and hit[0] == version:
+        return hit[1]
+    value = builder(_with_pending(part, sheet_name, df))
+    with part.lock:
+        part.derived[(sheet_name, key)] = (version, value)
+    return value
+
+def clear_cache():
+    # מנקה רק את המטמון של הבניין הנוכחי
+    get_partition().clear()
+
+
+def update_status_safe(sheet_name, id_col, item_id, status_col_idx, new_status):
+    df = get_data(sheet_name)
+    # השוואה בלי הגרש שגוגל מוסיף לפעמים לטלפונים
+    if id_col not in df.columns or not (df[id_col].astype(str).str.strip().str.lstrip("'") == str(item_id).strip().lstrip("'")).any():
+        return False
+    if read_only(): return False # החיפוש נעשה מול עותק ישן
+    # נרשם ביומן הכתיבה ונשלח לגוגל ברקע
+    journal.set_cells(sheet_name, [(item_id, {status_col_idx: new_status})],
+                      key_col=df.columns.get_loc(id_col) + 1)
+    return True
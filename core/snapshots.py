@@ -0,0 +1,58 @@
+# --- עותק אחרון תקין של כל גיליון על הדיסק ---
+# כל טעינה מוצלחת מגוגל נשמרת כקובץ Arrow (feather, דחוס ב-zstd) ליד קובץ JSON קטן עם זמן הטעינה.
+# אחרי הפעלה מחדש האפליקציה מתחילה מהעותק הזה, ובזמן תקלה בגוגל מוצגים ממנו הנתונים (קריאה בלבד).
+import json
+import logging
+import os
+import tempfile
+import time as tm
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get("BUILDINGAPP_SNAPSHOTS", ".snapshots")
+
+
+def _paths(slug, sheet_name):
+    base = os.path.join(SNAPSHOT_DIR, slug, sheet_name)
+    return base + ".arrow", base + ".json"
+
+def _temp_for(path):
+    # שם זמני ייחודי באותה תיקייה - שני שומרים במקביל לא כותבים לאותו קובץ זמני
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    return tmp
+
+def save_snapshot(slug, sheet_name, df, saved_at=None):
+    # כתיבה לקובץ זמני והחלפה - קובץ חצי כתוב לעולם לא יחליף עותק תקין
+    data_path, meta_path = _paths(slug, sheet_name)
+    temps = []
+    try:
+        from pyarrow import feather
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        data_tmp, meta_tmp = _temp_for(data_path), _temp_for(meta_path)
+        temps = [data_tmp, meta_tmp]
+        feather.write_feather(df, data_tmp, compression="zstd")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": saved_at or tm.time(), "rows": len(df)}, f)
+        os.replace(data_tmp, data_path)
+        os.replace(meta_tmp, meta_path)
+        return True
+    except Exception as e:
+        log.warning("failed to save snapshot %s/%s: %s", slug, sheet_name, e)
+        for tmp in temps:
+            try: os.remove(tmp)
+            except OSError: pass
+        return False
+
+def load_snapshot(slug, sheet_name):
+    # מחזיר (DataFrame, זמן שמירה) או None אם אין עותק
+    data_path, meta_path = _paths(slug, sheet_name)
+    if not os.path.exists(data_path): return None
+    try:
+        from pyarrow import feather
+        with open(meta_path, encoding="utf-8") as f:
+            saved_at = float(json.load(f)["saved_at"])
+        return feather.read_feather(data_path), saved_at
+    except Exception as e:
+        log.warning("failed to load snapshot %s/%s: %s", slug, sheet_name, e)
+        return None
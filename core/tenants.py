@@ -0,0 +1,65 @@
+# --- ריבוי בניינים (tenants) בשרת אחד ---
+# כל בניין מוגדר בסודות תחת [tenants.<slug>], למשל:
+#   [tenants.lachish129]
+#   name = "שדרות לכיש 129"
+#   sheet_id = "..."
+#   cache_max_mb = 64          # מגבלת זיכרון למטמון של הבניין
+#   cache_max_entries = 16     # מספר גיליונות מקסימלי במטמון
+#   quota_per_minute = 50      # החלק של הבניין במכסה - מעבר לזה מוגשים נתונים מהמטמון גם אם התיישנו
+# בלי הגדרה כזו יש בניין אחד ("default") עם SHEET_ID הרגיל - כמו קודם.
+# המכסה של גוגל היא לחשבון השירות, כלומר משותפת לכל הבניינים: [general] quota_per_minute
+import contextvars
+import logging
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+DEFAULT_CACHE_MAX_MB = 64
+DEFAULT_CACHE_MAX_ENTRIES = 16
+DEFAULT_QUOTA_PER_MINUTE = 55 # גוגל מגביל ל-60 קריאות בדקה
+
+# כל ריצה של הסקריפט (ת'רד של Streamlit) קובעת את הבניין שלה בתחילת הריצה
+_current = contextvars.ContextVar("tenant", default=None)
+
+
+def _with_defaults(slug, conf):
+    tenant = {
+        "slug": slug,
+        "name": "בניין שדרות לכיש 129",
+        "sheet_id": config.SHEET_ID,
+        "cache_max_mb": DEFAULT_CACHE_MAX_MB,
+        "cache_max_entries": DEFAULT_CACHE_MAX_ENTRIES,
+        "quota_per_minute": DEFAULT_QUOTA_PER_MINUTE,
+    }
+    tenant.update(dict(conf))
+    return tenant
+
+def get_tenants():
+    configured = config.get_secret("tenants")
+    if not configured:
+        return {DEFAULT_TENANT: _with_defaults(DEFAULT_TENANT, {})}
+    return {slug: _with_defaults(slug, conf) for slug, conf in configured.items()}
+
+def current_tenant():
+    slug = _current.get()
+    if slug is None:
+        tenants = get_tenants()
+        if len(tenants) > 1:
+            # אסור לנחש: קריאה שלא קבעה בניין הייתה כותבת לגיליון של בניין אחר
+            log.error("no tenant selected in this context", stack_info=True)
+            raise RuntimeError("no tenant selected - call use_tenant() first")
+        slug = next(iter(tenants))
+    return slug
+
+def get_tenant(slug=None):
+    tenants = get_tenants()
+    return tenants.get(slug or current_tenant()) or next(iter(tenants.values()))
+
+def use_tenant(slug):
+    # קובע את הבניין לריצה הנוכחית. מחזיר False אם אין בניין כזה
+    if slug not in get_tenants():
+        return False
+    _current.set(slug)
+    return True
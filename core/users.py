@@ -0,0 +1,117 @@
+# --- לוגיקת משתמשים (הרשמה, התחברות, ניהול) ---
+from . import journal
+from .config import STATUS_ACTIVE
+from .notify import send_telegram
+from .sheets import READ_ONLY_MSG, derived, get_data, read_only, write_lock
+
+USERS_KEY_COL = 2 # עמודת הטלפון - המזהה של שורת משתמש ביומן הכתיבה
+
+
+# --- אבטחה (השוואת טקסט רגיל) ---
+def verify_password(input_pass, stored_pass):
+    # הפיכה לסטרינג מונעת את השגיאה שקיבלת (AttributeError על encode)
+    return str(input_pass).strip() == str(stored_pass).strip()
+
+def clean_phone(phone):
+    return str(phone).strip().replace("'", "").replace("-", "").replace(" ", "")
+
+def _build_user_index(df):
+    if df.empty or 'Phone' not in df.columns: return {}
+    return {clean_phone(row['Phone']): row for row in df.to_dict('records')}
+
+def get_user_index():
+    # טלפון נקי -> שורת המשתמש. נבנה פעם אחת לכל טעינה של הגיליון
+    return derived("Users", "by_phone", _build_user_index)
+
+def login_user(phone, password):
+    users = get_data("Users")
+    if users.empty: return None
+    
+    clean_input = str(phone).strip().replace("-", "").replace(" ", "")
+    users['CleanPhone'] = users['Phone'].astype(str).str.replace("'", "").str.replace("-", "").str.replace(" ", "")
+    
+    user_row = users[users['CleanPhone'] == clean_input]
+    
+    if user_row.empty: return None
+    
+    # שליפת הסיסמה מהשיטס (עמודה Password)
+    stored_password = user_row.iloc[0]['Password']
+    
+    # כאן מתבצעת הקריאה לפונקציה שתיקנו למעלה
+    if verify_password(password, stored_password):
+        return user_row.iloc[0].to_dict()
+    return None
+
+def register_user(full_name, phone, apt, role, password):
+    try:
+        # בדיקת הכפילות והרישום ביומן תחת אותו מנעול - שתי הרשמות במקביל לא יעברו שתיהן
+        with write_lock("Users"):
+            users = get_data("Users")
+            if read_only(): return False, READ_ONLY_MSG # בלי הגיליון העדכני אי אפשר לבדוק כפילות
+            clean_phone = str(phone).strip().replace("-", "").replace(" ", "").replace("'", "")
+            
+            # 1. בדיקת כפילות משודרגת
+            if not users.empty:
+                users['CleanCheck'] = users['Phone'].astype(str).str.replace("'", "").str.replace("-", "").str.replace(" ", "")
+                if clean_phone in users['CleanCheck'].values:
+                    # ההודעה מוצגת למשתמש ע"י ה-UI
+                    return False, "⚠️ מספר הטלפון הזה כבר רשום במערכת. יש ליצור קשר עם ועד הבית לקבלת הסיסמה או לצורך איפוס המשתמש."
+
+            # 2. הוספת השורה (כולל עמודת Is_New החדשה להתראה לאדמין)
+            # שם, טלפון, דירה, סוג, סיסמה, סטטוס, תפקיד, Is_New
+            new_row = [full_name, f"'{clean_phone}", str(apt), role, password, STATUS_ACTIVE, "user", "TRUE"]
+            
+            # שימוש ב-table_range='A1' מבטיח שהנתון יתווסף בדיוק בסוף הרשימה הקיימת
+            journal.append_rows("Users", [new_row], key_col=USERS_KEY_COL,
+                                value_input_option='USER_ENTERED', table_range='A1')
+        
+        # 3. עדכון אדמין
+        send_telegram(f"🔔 דייר חדש נרשם בשיטס: {full_name}\nדירה: {apt}")
+        
+        return True, "נרשמת בהצלחה! ניתן להתחבר כעת."
+        
+    except Exception as e:
+        return False, f"שגיאה טכנית בשמירת הנתונים: {e}"
+
+def reset_new_users_notifications():
+    if read_only(): return False
+    try:
+        df = get_data("Users")
+        if 'Is_New' in df.columns:
+            # כל המשתמשים שבהם Is_New הוא TRUE - בעדכון אחד (עמודה 8 היא Is_New)
+            new_users = df[df['Is_New'].astype(str).str.upper() == 'TRUE']
+            if not new_users.empty:
+                journal.set_cells("Users", [(p, {8: "FALSE"}) for p in new_users['Phone']], key_col=USERS_KEY_COL)
+            return True
+    except: return False
+
+
+# --- פונקציה חדשה: עדכון פרטי דייר ---
+# --- פונקציה מעודכנת: עדכון פרטי דייר כולל סיסמה ---
+def update_user_details_admin(original_phone, new_name, new_phone, new_apt, new_type, new_password):
+    if clean_phone(original_phone) not in get_user_index(): # חיפוש לפי הטלפון הישן
+        return False
+    if read_only(): return False # החיפוש נעשה מול עותק ישן
+    # עדכון תאים לפי הסדר (שם, טלפון, דירה, סוג, סיסמה) - עמודה 5 היא הסיסמה
+    journal.set_cells("Users", [(original_phone, {
+        1: new_name, 2: f"'{new_phone}", 3: str(new_apt), 4: new_type, 5: new_password,
+    })], key_col=USERS_KEY_COL)
+    return True
+
+# --- פונקציה חדשה: מחיקת משתמש וכל השיריונים שלו ---
+def delete_user_fully_admin(phone_to_delete):
+    try:
+        # 1. מחיקת המשתמש
+        if clean_phone(phone_to_delete) not in get_user_index():
+            return False, "משתמש לא נמצא"
+        if read_only(): return False, READ_ONLY_MSG # החיפוש נעשה מול עותק ישן
+
+        # 2. מחיקת המשתמש וכל השיריונים שלו (עמודה 2 בשני הגיליונות היא הטלפון)
+        # המחיקה נעשית ברקע לפי הטלפון, מלמטה למעלה, בלי לחפש שורה-שורה
+        with write_lock("Users", "Bookings"):
+            journal.delete_rows("Users", [phone_to_delete], key_col=USERS_KEY_COL)
+            journal.delete_rows("Bookings", [phone_to_delete], key_col=2)
+        return True, "המשתמש וכל השיריונים שלו נמחקו בהצלחה"
+        
+    except Exception as e:
+        return False, f"שגיאה במחיקה: {str(e)}"
@@ -0,0 +1,36 @@
+# --- סביבת בדיקה: בניין אחד מול גיליונות מדומים בזיכרון, וכל הקבצים בתיקייה זמנית ---
+import pytest
+
+from core import audit, config, journal, sheets, snapshots
+from core.loadtest import BOOKINGS_HEADERS, USERS_HEADERS, FakeWorksheet
+from core.tenants import use_tenant
+
+TENANT = "test"
+
+
+def _reset():
+    for conn, _ in audit._conns.values():
+        conn.close()
+    for registry in (journal._states, sheets._partitions, sheets._handles, audit._conns, sheets._account_calls):
+        registry.clear()
+
+
+@pytest.fixture
+def tenant(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "JOURNAL_DIR", str(tmp_path / "journal"))
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(audit, "AUDIT_DIR", str(tmp_path / "audit"))
+    monkeypatch.setattr(journal, "start_flusher", lambda: None) # שולחים ידנית עם journal.flush
+    _reset()
+    config.configure(secrets={"tenants": {TENANT: {"name": "בניין בדיקה"}}})
+    use_tenant(TENANT)
+    yield TENANT
+    _reset()
+
+
+@pytest.fixture
+def bookings_ws(tenant):
+    ws = FakeWorksheet(BOOKINGS_HEADERS, latency_ms=0)
+    sheets.install_worksheet("Bookings", ws)
+    sheets.install_worksheet("Users", FakeWorksheet(USERS_HEADERS, latency_ms=0))
+    return ws
@@ -0,0 +1,140 @@
+# --- שיריונים: זמנים פנויים, מועדים חוזרים, שיריון של כמה תאריכים בבת אחת ומפת הניצולת ---
+from datetime import date, datetime, time, timedelta
+
+from core import bookings, journal
+from core.bookings import (MAX_OCCURRENCES, RECUR_DATES, RECUR_RANGE, RECUR_WEEKLY, WEEKDAYS_HE,
+                           add_bookings_batch, expand_recurrence, find_free_slots, get_utilization_heatmap)
+
+USER = {"Full Name": "דייר", "Phone": "0501234567", "Apt": "3"}
+DAY = date(2030, 1, 1)
+
+
+def booked(ws, start, end, status="approved", day=DAY, resource=""):
+    ws.rows.append([f"B{len(ws.rows)}", "050", "דייר", day.isoformat(), start, end, status, "3", "", resource])
+
+
+def frozen_now(monkeypatch, now):
+    class Frozen(datetime):
+        @classmethod
+        def now(cls, tz=None): return now
+    monkeypatch.setattr(bookings, "datetime", Frozen)
+
+
+def free(*args, **kwargs):
+    return [(d, s.strftime("%H:%M"), e.strftime("%H:%M")) for d, s, e in find_free_slots(*args, **kwargs)]
+
+
+def test_batch_rejects_past_dates_per_occurrence(bookings_ws, monkeypatch):
+    monkeypatch.setattr(bookings, "send_telegram", lambda *a, **k: None)
+    today = date.today()
+    ok, msg, results = add_bookings_batch(USER, [today - timedelta(days=1), today + timedelta(days=1)],
+                                          time(18), time(20))
+    assert ok
+    assert [(r["date"], r["ok"]) for r in results] == [(today - timedelta(days=1), False),
+                                                       (today + timedelta(days=1), True)]
+    assert results[0]["msg"] == "התאריך כבר עבר"
+    journal.flush()
+    assert [r[3] for r in bookings_ws.rows[1:]] == [(today + timedelta(days=1)).isoformat()]
+
+    ok, msg, results = add_bookings_batch(USER, [today - timedelta(days=2)], time(18), time(20))
+    assert not ok and not results[0]["ok"]
+
+
+def test_expand_recurrence_kinds():
+    # 2030-01-01 הוא יום שלישי (weekday 1)
+    dates, truncated = expand_recurrence({"type": RECUR_RANGE, "start": DAY, "until": DAY + timedelta(days=2)})
+    assert dates == [DAY, DAY + timedelta(days=1), DAY + timedelta(days=2)] and not truncated
+
+    dates, _ = expand_recurrence({"type": RECUR_WEEKLY, "start": DAY, "until": DAY + timedelta(days=13),
+                                  "weekdays": [6, 1]}) # ראשון ושלישי
+    assert dates == [DAY, DAY + timedelta(days=5), DAY + timedelta(days=7), DAY + timedelta(days=12)]
+
+    dates, _ = expand_recurrence({"type": RECUR_WEEKLY, "start": DAY, "until": DAY + timedelta(days=20)})
+    assert dates == [DAY, DAY + timedelta(days=7), DAY + timedelta(days=14)] # בלי ימים - היום של ההתחלה
+
+    dates, _ = expand_recurrence({"type": RECUR_DATES, "dates": [DAY + timedelta(days=3), DAY, DAY]})
+    assert dates == [DAY, DAY + timedelta(days=3)] # ממוין ובלי כפילויות
+
+    assert expand_recurrence({"type": RECUR_RANGE, "start": DAY}) == ([DAY], False) # בלי until - יום אחד
+    assert expand_recurrence({"type": RECUR_RANGE, "start": DAY, "until": DAY - timedelta(days=1)}) == ([], False)
+
+
+def test_expand_recurrence_reports_truncation():
+    start = date(2030, 1, 1)
+    dates, truncated = expand_recurrence({"type": RECUR_RANGE, "start": start,
+                                          "until": start + timedelta(days=MAX_OCCURRENCES - 1)})
+    assert len(dates) == MAX_OCCURRENCES and not truncated
+
+    dates, truncated = expand_recurrence({"type": RECUR_RANGE, "start": start,
+                                          "until": start + timedelta(days=MAX_OCCURRENCES)})
+    assert len(dates) == MAX_OCCURRENCES and truncated
+    assert dates[-1] == start + timedelta(days=MAX_OCCURRENCES - 1)
+
+    many = [start + timedelta(days=i) for i in range(MAX_OCCURRENCES + 5)]
+    dates, truncated = expand_recurrence({"type": RECUR_DATES, "dates": many[::-1]})
+    assert dates == many[:MAX_OCCURRENCES] and truncated
+
+
+def test_free_slots_between_bookings_inside_the_window(bookings_ws):
+    booked(bookings_ws, "08:00", "09:30")  # חוצה את תחילת החלון
+    booked(bookings_ws, "11:00", "12:00")
+    booked(bookings_ws, "13:00", "14:00", status="pending") # ממתין חוסם גם הוא
+    booked(bookings_ws, "14:00", "15:00", status="cancelled")
+    booked(bookings_ws, "15:30", "18:00")  # חוצה את סוף החלון
+    slots = free(DAY, DAY, 60, window_start=time(9), window_end=time(16))
+    assert [(s, e) for _, s, e in slots] == [("09:30", "11:00"), ("12:00", "13:00"), ("14:00", "15:30")]
+
+
+def test_free_slots_edges(bookings_ws):
+    booked(bookings_ws, "09:00", "10:00")  # מתחיל בדיוק בתחילת החלון - אין חלון באורך 0
+    booked(bookings_ws, "11:00", "16:00")  # נגמר בדיוק בסוף החלון
+    booked(bookings_ws, "09:00", "16:00", resource="gym") # משאב אחר לא חוסם
+    assert free(DAY, DAY, 60, window_start=time(9), window_end=time(16)) == \
+        [(DAY, "10:00", "11:00")] # חלון באורך המינימום בדיוק נכלל
+    assert free(DAY, DAY, 61, window_start=time(9), window_end=time(16)) == []
+    assert free(DAY, DAY + timedelta(days=2), 60, window_start=time(9), window_end=time(16),
+                resource="gym") == [(DAY + timedelta(days=d), "09:00", "16:00") for d in (1, 2)]
+
+
+def test_free_slots_today_start_at_the_next_quarter_hour(bookings_ws, monkeypatch):
+    frozen_now(monkeypatch, datetime(2030, 1, 1, 10, 7))
+    assert free(DAY, DAY, 30, window_start=time(9), window_end=time(12)) == [(DAY, "10:15", "12:00")]
+    frozen_now(monkeypatch, datetime(2030, 1, 1, 10, 15))
+    assert free(DAY, DAY, 30, window_start=time(9), window_end=time(12)) == [(DAY, "10:15", "12:00")]
+    frozen_now(monkeypatch, datetime(2030, 1, 1, 11, 46))
+    assert free(DAY, DAY, 15, window_start=time(9), window_end=time(12)) == []
+    # מחר לא מושפע מהשעה עכשיו
+    assert free(DAY + timedelta(days=1), DAY + timedelta(days=1), 30, window_start=time(9),
+                window_end=time(12)) == [(DAY + timedelta(days=1), "09:00", "12:00")]
+
+
+def cell(heatmap, weekday, hour):
+    row = heatmap[(heatmap['יום'] == WEEKDAYS_HE[weekday]) & (heatmap['שעה'] == f"{hour:02d}:00")]
+    return int(row['דקות'].iloc[0]), float(row['תפוסה %'].iloc[0])
+
+
+def test_utilization_counts_partial_hours(bookings_ws):
+    booked(bookings_ws, "18:30", "20:15")
+    booked(bookings_ws, "20:15", "21:00", status="pending") # רק מאושרים נספרים
+    heatmap = get_utilization_heatmap()
+    assert len(heatmap) == 7 * 24
+    assert [cell(heatmap, DAY.weekday(), h)[0] for h in (17, 18, 19, 20, 21)] == [0, 30, 60, 15, 0]
+    assert heatmap['דקות'].sum() == 105
+
+
+def test_utilization_percent_per_weekday_and_resource(bookings_ws):
+    week = DAY + timedelta(days=7) # שני ימי שלישי ויום רביעי אחד בתקופה
+    booked(bookings_ws, "19:00", "20:00")
+    booked(bookings_ws, "10:00", "11:00", day=week)
+    booked(bookings_ws, "19:30", "20:00", resource="gym")
+    tuesday, wednesday = DAY.weekday(), (DAY + timedelta(days=1)).weekday()
+
+    room = get_utilization_heatmap("room")
+    assert cell(room, tuesday, 19) == (60, 50.0)     # 60 דקות מתוך שני ימי שלישי
+    assert cell(room, tuesday, 10) == (60, 50.0)
+    assert cell(room, wednesday, 19) == (0, 0.0)
+    assert cell(get_utilization_heatmap("gym"), tuesday, 19) == (30, 50.0) # רק יום שלישי אחד עם נתונים
+    assert cell(get_utilization_heatmap("parking"), tuesday, 19) == (0, 0.0)
+
+    everything = get_utilization_heatmap()
+    assert cell(everything, tuesday, 19) == (90, 37.5) # 90 דקות מתוך 2 ימים * 2 משאבים
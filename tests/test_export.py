@@ -0,0 +1,68 @@
+# --- ייצוא לקובץ: גם גיליון ריק נותן קובץ תקין ---
+import os
+
+import pandas as pd
+import pytest
+
+from core import sheets
+from core.export import export_sheet
+
+
+class RangeWorksheet:
+    # רק מה שהייצוא צריך: שורת הכותרות וקריאה של טווח שורות ("A2:C100")
+    def __init__(self, rows):
+        self.rows = rows
+
+    def row_values(self, row):
+        return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
+    def get(self, a1):
+        first, last = (int("".join(ch for ch in part if ch.isdigit())) for part in a1.split(":"))
+        return [list(r) for r in self.rows[first - 1:last]]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+def test_header_only_sheet_exports_the_columns(tenant, fmt):
+    sheets.install_worksheet("Bookings", RangeWorksheet([["Booking ID", "Date", "Status"]]))
+    path, total = export_sheet("Bookings", fmt)
+    try:
+        df = pd.read_parquet(path) if fmt == "parquet" else pd.read_csv(path, encoding="utf-8-sig")
+        assert total == 0 and df.empty and list(df.columns) == ["Booking ID", "Date", "Status"]
+    finally:
+        os.remove(path)
+
+
+def test_empty_sheet_is_still_a_valid_parquet_file(tenant):
+    sheets.install_worksheet("Bookings", RangeWorksheet([]))
+    path, total = export_sheet("Bookings", "parquet")
+    try:
+        assert total == 0 and os.path.getsize(path) > 0
+        assert pd.read_parquet(path).empty
+    finally:
+        os.remove(path)
+
+
+def test_rows_are_filtered_and_passwords_dropped(tenant):
+    rows = [["Full Name", "Phone", "Apt", "Password", "Status"]] + \
+           [[f"דייר {i}", f"050{i}", str(i % 3), "secret", "active"] for i in range(10)]
+    sheets.install_worksheet("Users", RangeWorksheet(rows))
+    path, total = export_sheet("Users", "parquet", apt="1")
+    try:
+        df = pd.read_parquet(path)
+        assert total == 3 and df["Apt"].tolist() == ["1"] * 3 and "Password" not in df.columns
+    finally:
+        os.remove(path)
+
+
+def test_failed_export_leaves_no_temp_file(tenant, tmp_path, monkeypatch):
+    import tempfile
+    tmp_dir = tmp_path / "tmp"
+    tmp_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_dir))
+    class Broken(RangeWorksheet):
+        def get(self, a1):
+            raise RuntimeError("simulated quota error (429)")
+    sheets.install_worksheet("Users", Broken([["Full Name", "Phone"]]))
+    with pytest.raises(RuntimeError):
+        export_sheet("Users", "csv")
+    assert os.listdir(tmp_dir) == []
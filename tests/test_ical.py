@@ -0,0 +1,43 @@
+# --- פיד ה-iCalendar: קישורים רק עם כתובת ציבורית ומפתח קבוע ---
+from core import config, ical
+
+
+def configure(tenant, **general):
+    config.configure(secrets={"general": general, "tenants": {tenant: {"name": "בניין בדיקה"}}})
+
+
+def test_no_links_or_server_without_base_url_and_secret(tenant):
+    configure(tenant)
+    assert not ical.feeds_enabled()
+    assert ical.feed_token("3") is None and ical.feed_url("3") is None
+    assert ical.start_feed_server() is None
+
+    configure(tenant, ical_base_url="https://cal.example.org") # בלי session_secret
+    assert ical.feed_url("3") is None
+
+    configure(tenant, session_secret="s3cret") # בלי כתובת ציבורית - אין קישור ל-localhost
+    assert ical.feed_token("3") and ical.feed_url("3") is None
+
+
+def test_feed_token_round_trip_and_revocation(tenant):
+    configure(tenant, session_secret="s3cret", ical_base_url="https://cal.example.org/")
+    url = ical.feed_url("3")
+    assert url.startswith("https://cal.example.org/calendar.ics?t=")
+    token = url.split("t=", 1)[1]
+    assert ical.verify_feed_token(token) == (tenant, "3")
+    assert ical.verify_feed_token(ical.feed_token()) == (tenant, None)
+
+    configure(tenant, session_secret="s3cret", ical_base_url="https://cal.example.org/", ical_feed_version=2)
+    assert ical.verify_feed_token(token) is None
+
+    configure(tenant, ical_base_url="https://cal.example.org/")
+    assert ical.verify_feed_token(token) is None # המפתח האקראי של התהליך לא מאמת טוקנים של פיד
+
+
+def test_event_times_are_utc(bookings_ws):
+    bookings_ws.rows += [['B1', '050', 'דייר', '2030-07-01', '18:00', '20:00', 'approved', '3', '', ''],
+                         ['B2', '050', 'דייר', '2030-01-01', '18:00', '20:00', 'approved', '3', '', 'gym']]
+    body = ical.get_feed("3")[1].decode("utf-8")
+    assert "TZID" not in body.replace("X-WR-TIMEZONE", "")
+    assert "DTSTART:20300701T150000Z" in body and "DTEND:20300701T170000Z" in body # שעון קיץ
+    assert "DTSTART:20300101T160000Z" in body and "DTEND:20300101T180000Z" in body # שעון חורף
@@ -0,0 +1,157 @@
+# --- יומן הכתיבה: הרצה חוזרת, השכבה המקומית, מחיקות ובדיקה מול הגיליון אחרי שליחה ---
+from datetime import date, time, timedelta
+
+import pandas as pd
+
+from core import journal
+from core.bookings import add_booking
+from core.config import STATUS_APPROVED, STATUS_PENDING, STATUS_REJECTED
+from core.sheets import get_data
+
+DAY = (date.today() + timedelta(days=7)).strftime("%Y-%m-%d")
+RAN = {'Full Name': "רן", 'Phone': "0501111111", 'Apt': "3"}
+DANA = {'Full Name': "דנה", 'Phone': "0502222222", 'Apt': "4"}
+
+
+def booking(b_id, start="20:00", end="21:00", status=STATUS_PENDING, phone="0501111111"):
+    return [b_id, phone, "דייר", DAY, start, end, status, "3", "", "room"]
+
+def ids(ws):
+    return [r[0] for r in ws.rows[1:]]
+
+
+def test_replay_after_crash_does_not_duplicate(bookings_ws, tenant):
+    journal.append_rows("Bookings", [booking("b1"), booking("b2", "10:00", "11:00")])
+    journal.set_cells("Bookings", [("b1", {7: STATUS_APPROVED})])
+    # קריסה אחרי שהכל הגיע לגיליון אבל לפני שה-offset התקדם
+    journal._flush_sheet("Bookings", [e for _, e in journal._state().pending])
+    journal._states.clear()
+    assert journal.pending_count() == 2 # נטען מחדש מהקובץ
+
+    assert journal.flush()
+    assert ids(bookings_ws) == ["b1", "b2"]
+    assert bookings_ws.rows[1][6] == STATUS_APPROVED
+    assert journal.pending_count() == 0
+
+    journal._states.clear()
+    assert journal.pending_count() == 0 # ה-offset נשמר - אין מה לשלוח שוב
+
+
+def test_replay_of_partial_line_is_dropped(bookings_ws, tenant):
+    journal.append_rows("Bookings", [booking("b1")])
+    state = journal._state()
+    with open(state.path, "ab") as f:
+        f.write(b'{"sheet":"Bookings","op":"append"') # שורה חלקית מקריסה באמצע כתיבה
+    journal._states.clear()
+    assert journal.pending_count() == 1
+    assert journal.flush()
+    assert ids(bookings_ws) == ["b1"]
+
+
+def test_apply_pending_overlay(tenant):
+    df = pd.DataFrame([["a", "'050", "20:00"], ["b", "051", "21:00"], ["c", "052", "22:00"]],
+                      columns=["ID", "Phone", "Start"])
+    journal.append_rows("S", [["a", "050", "09:00"], ["d", "'053", "23:00"]], value_input_option="USER_ENTERED")
+    journal.set_cells("S", [("b", {3: "21:30"}), ("d", {2: "'054"}), ("zz", {3: "00:00"})])
+    journal.delete_rows("S", ["c"])
+
+    out = journal.apply_pending("S", df)
+    assert out.values.tolist() == [["a", "'050", "20:00"], ["b", "051", "21:30"], ["d", "054", "23:00"]]
+    assert df["Start"].tolist() == ["20:00", "21:00", "22:00"] # המקור לא משתנה
+    assert journal.apply_pending("Other", df).equals(df)
+
+
+def test_deletes_run_bottom_up(bookings_ws, tenant):
+    bookings_ws.rows.extend(booking(b, phone=p) for b, p in
+                            [("b1", "050"), ("b2", "051"), ("b3", "051"), ("b4", "052"), ("b5", "051")])
+    calls = []
+    delete = bookings_ws.delete_rows
+    bookings_ws.delete_rows = lambda start, end=None: (calls.append((start, end)), delete(start, end))
+
+    journal.delete_rows("Bookings", ["051"], key_col=2)
+    assert journal.flush()
+    assert ids(bookings_ws) == ["b1", "b4"]
+    assert calls == [(6, 6), (3, 4)] # רצף שורות בקריאה אחת, מלמטה למעלה
+
+
+def test_flush_rejects_overlap_written_by_another_process(bookings_ws, tenant):
+    assert get_data("Bookings").empty # המטמון נטען לפני שהתהליך האחר כתב
+    bookings_ws.rows.append(booking("other", "20:00", "21:30", phone="0509999999"))
+
+    ok, _ = add_booking(RAN, date.fromisoformat(DAY), time(20), time(21))
+    assert ok # המצב המקומי לא ראה את השיריון האחר
+    assert journal.flush()
+
+    statuses = {r[0]: r[6] for r in bookings_ws.rows[1:]}
+    assert statuses.pop("other") == STATUS_PENDING
+    assert list(statuses.values()) == [STATUS_REJECTED]
+    # הרצה חוזרת של הבדיקה לא משנה יותר כלום
+    assert journal._checks["Bookings"](bookings_ws.get_all_values(), set(statuses)) == []
+
+
+def test_flush_keeps_bookings_without_overlap(bookings_ws, tenant):
+    ok, _ = add_booking(RAN, date.fromisoformat(DAY), time(20), time(21))
+    assert ok
+    ok, _ = add_booking(DANA, date.fromisoformat(DAY), time(20), time(21))
+    assert not ok # אותו תהליך - נחסם כבר מול המצב המקומי
+    ok, _ = add_booking(DANA, date.fromisoformat(DAY), time(21), time(22))
+    assert ok
+    assert journal.flush()
+    assert [r[6] for r in bookings_ws.rows[1:]] == [STATUS_PENDING, STATUS_PENDING]
+
+
+def test_no_sheets_reads_while_holding_the_lock(bookings_ws, tenant, monkeypatch):
+    from core import sheets
+    monkeypatch.setattr(sheets, "DATA_TTL", 0) # כל get_data היה פונה לגוגל
+    held = []
+    read = bookings_ws.get_all_values
+    bookings_ws.get_all_values = lambda: (held.append(journal.tenant_lock()._is_owned()), read())[1]
+
+    ok, _ = add_booking(RAN, date.fromisoformat(DAY), time(20), time(21))
+    assert ok and held and not any(held)
+
+
+def users_ws():
+    from core import sheets
+    return sheets.get_worksheet("Users")._ws
+
+def test_delete_then_register_same_phone_keeps_the_new_user(bookings_ws, tenant):
+    from core.users import delete_user_fully_admin, register_user
+    users = users_ws()
+    users.rows.append(["ישן", "0501111111", "3", "בעל דירה", "pw", "active", "user", "FALSE"])
+    assert delete_user_fully_admin("0501111111")[0]
+    assert register_user("חדש", "0501111111", "3", "שוכר", "pw2")[0]
+    assert get_data("Users")["Full Name"].tolist() == ["חדש"]
+
+    assert journal.flush()
+    assert [r[0] for r in users.rows[1:]] == ["חדש"]
+    assert get_data("Users")["Full Name"].tolist() == ["חדש"]
+
+
+def test_phone_change_then_register_old_phone(bookings_ws, tenant):
+    users = users_ws()
+    users.rows.append(["רן", "0501111111", "3", "בעל דירה", "pw", "active", "user", "FALSE"])
+    journal.set_cells("Users", [("0501111111", {2: "0509999999"})], key_col=2)
+    journal.append_rows("Users", [["דנה", "0501111111", "4", "שוכר", "pw", "active", "user", "TRUE"]], key_col=2)
+    assert journal.flush()
+    assert [(r[0], r[1]) for r in users.rows[1:]] == [("רן", "0509999999"), ("דנה", "0501111111")]
+
+
+def test_overlay_is_built_once_per_version(bookings_ws, tenant, monkeypatch):
+    from core import sheets
+    from core.bookings import check_overlap
+    calls = []
+    real = journal.apply_pending
+    monkeypatch.setattr(sheets, "apply_pending", lambda *a, **k: (calls.append(a[0]), real(*a, **k))[1])
+
+    ok, _ = add_booking(RAN, date.fromisoformat(DAY), time(20), time(21))
+    calls.clear()
+    for _ in range(5):
+        assert check_overlap(DAY, "20:30", "21:30")
+        df = get_data("Bookings")
+        df["Status"] = "changed" # כל קורא מקבל עותק משלו
+    assert calls == ["Bookings"]
+    assert get_data("Bookings")["Status"].tolist() == [STATUS_PENDING]
+
+    ok, _ = add_booking(DANA, date.fromisoformat(DAY), time(21), time(22))
+    assert ok and check_overlap(DAY, "21:00", "21:30") and len(calls) == 2
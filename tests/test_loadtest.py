@@ -0,0 +1,12 @@
+# --- בדיקת העומס עצמה: כמה שרתים עם יומנים נפרדים מול אותו גיליון ---
+from core.loadtest import run_load_test
+
+
+def test_servers_with_separate_journals_never_double_book(tenant):
+    # בלי ת'רד השליחה ברקע אף שרת לא רואה את השיריונים של האחרים - כל אחד קולט את אותה שעה,
+    # ורק הבדיקה שאחרי השליחה משאירה שיריון אחד
+    r = run_load_test(sessions=6, attempts=2, latency_ms=1, hot_ratio=1.0, seed=1, servers=3)
+    assert r["unflushed"] == 0
+    assert r["booked"] == 3
+    assert r["rejected_on_flush"] == 2
+    assert r["double_bookings"] == 0
@@ -0,0 +1,31 @@
+# --- פרופיילינג: ריצה אחת בכל פעם, ושמירה רק כשמותר ---
+from core import profiling
+
+
+def script(tmp_path):
+    path = tmp_path / "script.py"
+    path.write_text("menu = 'בדיקה'\ntotal = sum(range(1000))\n", encoding="utf-8")
+    return str(path)
+
+
+def test_profile_is_saved(tenant, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    env = {}
+    assert profiling.run_profiled(script(tmp_path), env)
+    assert env["total"] == 499500
+    assert [p["page"] for p in profiling.list_profiles()] == ["בדיקה"]
+    assert not profiling.profiling_active()
+
+
+def test_profile_is_dropped_when_keep_says_no(tenant, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    assert profiling.run_profiled(script(tmp_path), {}, keep=lambda: False)
+    assert profiling.list_profiles() == []
+
+
+def test_busy_profiler_runs_nothing(tenant, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    env = {}
+    with profiling._lock: # פרופיילר של ריצה אחרת פעיל
+        assert not profiling.run_profiled(script(tmp_path), env)
+    assert env == {} and profiling.list_profiles() == []
@@ -0,0 +1,40 @@
+# --- חיפוש דיירים: קודם תחילית, אחר כך תת-מחרוזת ---
+import pytest
+
+from core import sheets
+from core.loadtest import USERS_HEADERS, FakeWorksheet
+from core.search import search_users
+
+USERS = [("שי ברלוי", "0545556666", "4"), ("דנה כהן", "0501234567", "3"), ("יוסי לוי", "052-987-6543", "12"),
+         ("אבי כהנא", "0541112222", "7"), ("מיכל דנציגר", "'0533334444", "30")]
+
+
+@pytest.fixture
+def users(tenant):
+    ws = FakeWorksheet(USERS_HEADERS, latency_ms=0)
+    ws.rows += [[name, phone, apt, "בעל דירה", "pw", "active", "user", "FALSE"] for name, phone, apt in USERS]
+    sheets.install_worksheet("Users", ws)
+
+
+def test_prefix_matches_come_before_substring_matches(users):
+    # "לוי" הוא מילה בשם של יוסי, ורק באמצע השם של שי - שמופיע קודם בגיליון
+    assert search_users("לוי") == ["0529876543", "0545556666"]
+    assert search_users("כה") == ["0501234567", "0541112222"] # "כהן" ו"כהנא"
+    assert search_users("ציג") == ["0533334444"]
+    assert search_users("דנ") == ["0501234567", "0533334444"] # קצר מ-3 תווים - רק תחילית
+
+
+def test_phone_with_dashes_or_spaces(users):
+    assert search_users("052-987-6543") == ["0529876543"]
+    assert search_users("052 987 6543") == ["0529876543"]
+    assert search_users("987-6543") == ["0529876543"]   # בלי הקידומת
+    assert search_users("876") == ["0529876543"]        # באמצע הטלפון
+    assert search_users("533334444") == ["0533334444"]  # בלי 0, ובלי הגרש שגוגל מוסיף
+
+
+def test_apartment_empty_query_and_limit(users):
+    assert search_users("דירה 3") == ["0501234567", "0533334444"] # גם דירה 30 מתחילה ב"דירה 3"
+    assert search_users("") == ["0545556666", "0501234567", "0529876543", "0541112222", "0533334444"]
+    assert search_users("", limit=2) == ["0545556666", "0501234567"]
+    assert len(search_users("05", limit=3)) == 3
+    assert search_users("אין כזה") == []
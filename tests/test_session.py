@@ -0,0 +1,34 @@
+# --- בדיקה חוזרת של עוגיית ההתחברות מול גיליון המשתמשים ---
+from core import session, sheets
+from core.config import STATUS_ACTIVE
+from core.loadtest import USERS_HEADERS, FakeWorksheet
+
+RAN = {'Full Name': "רן", 'Phone': "0501111111", 'Apt': "3", 'Role': "user", 'Status': STATUS_ACTIVE}
+
+
+def users_sheet(rows=(), error_rate=0.0):
+    ws = FakeWorksheet(USERS_HEADERS, latency_ms=0, error_rate=error_rate)
+    ws.rows.extend(rows)
+    sheets.install_worksheet("Users", ws)
+    return ws
+
+def payload():
+    return session.verify_token(session.issue_token(RAN))
+
+
+def test_active_user_gets_a_fresh_token(tenant):
+    users_sheet([["רן", "'0501111111", "3", "בעל דירה", "pw", STATUS_ACTIVE, "user", "FALSE"]])
+    user, token = session.revalidate_session(payload())
+    assert user['Phone'] == "0501111111" and token
+    assert not session.needs_revalidation(session.verify_token(token))
+
+
+def test_missing_or_inactive_user_is_logged_out(tenant):
+    users_sheet([["רן", "'0501111111", "3", "בעל דירה", "pw", "blocked", "user", "FALSE"]])
+    assert session.revalidate_session(payload()) == (None, None)
+
+
+def test_sheets_outage_keeps_the_current_session(tenant):
+    users_sheet(error_rate=1.0) # כל קריאה לגוגל נכשלת ואין עותק
+    user, token = session.revalidate_session(payload())
+    assert user['Phone'] == "0501111111" and token is None
@@ -0,0 +1,53 @@
+# --- מטמון הגיליונות: קריאה אחת לגוגל גם כשהרבה סשנים מבקשים יחד ---
+import threading
+import time as tm
+
+from core import sheets
+from core.loadtest import BOOKINGS_HEADERS, FakeWorksheet
+from core.tenants import use_tenant
+
+
+def test_expired_sheet_is_fetched_once_for_concurrent_readers(tenant):
+    ws = FakeWorksheet(BOOKINGS_HEADERS, latency_ms=50, jitter=0)
+    sheets.install_worksheet("Bookings", ws)
+    sheets.get_data("Bookings")
+    part = sheets.get_partition()
+    fetched_at, df, _ = part.get("Bookings")
+    part.put("Bookings", df, fetched_at=fetched_at - sheets.DATA_TTL - 1) # התיישן
+
+    gate = threading.Barrier(10)
+    def read():
+        use_tenant(tenant)
+        gate.wait()
+        sheets.get_data("Bookings")
+    threads = [threading.Thread(target=read) for _ in range(10)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert ws.calls["get_all_values"] == 2 # הטעינה הראשונה + אחת אחרי שהתיישן
+
+
+def test_failed_fetch_is_not_retried_by_every_waiting_reader(tenant):
+    ws = FakeWorksheet(BOOKINGS_HEADERS, latency_ms=20, jitter=0, error_rate=1.0)
+    sheets.install_worksheet("Bookings", ws)
+    gate = threading.Barrier(5)
+    def read():
+        use_tenant(tenant)
+        gate.wait()
+        assert sheets.get_data("Bookings").empty
+    threads = [threading.Thread(target=read) for _ in range(5)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert ws.calls["get_all_values"] == 1
+    assert sheets.fetch_failed("Bookings") and sheets.read_only()
+    assert tm.monotonic() < sheets.get_partition().retry_at["Bookings"]
+
+
+def test_bookings_column_j_is_resource_without_header(tenant):
+    ws = FakeWorksheet(BOOKINGS_HEADERS[:9], latency_ms=0) # שכחו את הכותרת Resource
+    ws.rows.append(['B1', '0501234567', 'דייר', '2030-01-01', '18:00', '20:00', 'approved', '1', '', 'gym'])
+    sheets.install_worksheet("Bookings", ws)
+    assert sheets.get_data("Bookings")["Resource"].tolist() == ["gym"]
+
+    from core.bookings import check_overlap
+    assert check_overlap("2030-01-01", "19:00", "21:00", resource="gym")
+    assert not check_overlap("2030-01-01", "19:00", "21:00", resource="room")
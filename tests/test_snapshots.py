@@ -0,0 +1,26 @@
+# --- העותק שעל הדיסק: שמירות במקביל לא משאירות קובץ שבור ---
+import os
+import threading
+
+import pandas as pd
+
+from core import snapshots
+from core.snapshots import load_snapshot, save_snapshot
+
+
+def test_concurrent_saves_leave_a_valid_snapshot(tenant):
+    frames = [pd.DataFrame({"ID": [str(i)] * (i + 1), "Name": ["x" * i] * (i + 1)}) for i in range(8)]
+    results = []
+    gate = threading.Barrier(len(frames))
+    def save(df):
+        gate.wait()
+        results.append(save_snapshot(tenant, "Bookings", df))
+    threads = [threading.Thread(target=save, args=(df,)) for df in frames]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert all(results)
+    df, _ = load_snapshot(tenant, "Bookings")
+    assert any(df.equals(f) for f in frames)
+    folder = os.path.join(snapshots.SNAPSHOT_DIR, tenant)
+    assert sorted(os.listdir(folder)) == ["Bookings.arrow", "Bookings.json"] # לא נשארו קבצים זמניים
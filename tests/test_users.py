@@ -0,0 +1,22 @@
+# --- משתמשים: שינויים של מנהל לא נכתבים מול עותק ישן ---
+import time as tm
+
+import pandas as pd
+
+from core import journal, sheets
+from core.loadtest import USERS_HEADERS, FakeWorksheet
+from core.sheets import READ_ONLY_MSG, update_status_safe
+from core.snapshots import save_snapshot
+from core.users import delete_user_fully_admin, update_user_details_admin
+
+
+def test_admin_changes_are_refused_when_the_lookup_hit_a_stale_copy(tenant):
+    # גוגל לא זמין - הדייר נמצא רק בעותק שעל הדיסק, ורק החיפוש עצמו מגלה את זה
+    row = ["דייר", "0501234567", "3", "בעל דירה", "pw", "active", "user", "FALSE"]
+    save_snapshot(tenant, "Users", pd.DataFrame([row], columns=USERS_HEADERS), saved_at=tm.time() - 3600)
+    sheets.install_worksheet("Users", FakeWorksheet(USERS_HEADERS, latency_ms=0, error_rate=1.0))
+
+    assert update_user_details_admin("0501234567", "דייר", "0501234567", "4", "שוכר", "pw") is False
+    assert delete_user_fully_admin("0501234567") == (False, READ_ONLY_MSG)
+    assert update_status_safe("Users", "Phone", "0501234567", 6, "inactive") is False
+    assert journal.pending_count() == 0